@@ -1,7 +1,11 @@
+import time
 import numpy as np
 import tqdm
 
 from config import MIN_P_AC, HEURISTIC_NEG_PREF_AC
+from borne import borne_atteinte, texte_ecart
+from planning import DTYPE_PLANNING
+import profilage
 
 """
 ACO
@@ -20,7 +24,7 @@ avec un rho plus grand, l'algo est lent mais plus stable
 alpha=0.1, beta=2 : trouvés empiriquement
 """
 
-def recherche_ant_colony(num_ants, num_iterations, alpha, beta, rho, gplan, eq=None, sol_initiale=None, jours_gras=None):
+def recherche_ant_colony(num_ants, num_iterations, alpha, beta, rho, gplan, eq=None, sol_initiale=None, jours_gras=None, temps_limite=None, afficher=True, trace=None, sol_depart=None, borne=None):
     """
     Paramètres:
     - num_ants: nombre de fourmis
@@ -32,6 +36,13 @@ def recherche_ant_colony(num_ants, num_iterations, alpha, beta, rho, gplan, eq=N
     - eq: numéro de l'équipe (seulement pour l'affichage)
     - sol_initiale: possible solution de départ
     - jours_gras: jours à modifier
+    - temps_limite: instant (time.time()) après lequel on arrête la recherche
+    - afficher: affiche ou non la barre de progression
+    - trace: fonction appelée à chaque itération (cf traces.py)
+    - sol_depart: planning complet (qui respecte les contraintes) qui sert à amorcer la recherche (cf construction.py) :
+      on double le niveau de phéromone sur ses chemins, et il est renvoyé si aucune fourmi ne fait mieux.
+      (contrairement à sol_initiale, ses cases ne sont pas fixées)
+    - borne: borne inférieure du critère (cf borne.py), on s'arrête dès que la meilleure solution en est assez proche
     """
 
     N = gplan.N  # Number of doctors
@@ -51,43 +62,33 @@ def recherche_ant_colony(num_ants, num_iterations, alpha, beta, rho, gplan, eq=N
             if planning_astreintes[t] != -1:
                 pheromone[planning_astreintes[t], t, 1] *= 2
 
-    # init des heuristiques η[m][t][s]
-    heuristic_garde = np.zeros((N, D))
-    for i in range(N):
-        for t in range(D):
-            pref = gplan.preferences[i][t]
-            if pref >= 0:
-                heuristic_garde[i][t] = pref + 1
-            else:
-                heuristic_garde[i][t] = HEURISTIC_NEG_PREF_AC # environ 0, petite valeure positive (pour éviter les NaN...)
+    # idem pour la solution de départ
+    if sol_depart is not None:
+        pheromone[sol_depart[:D], np.arange(D), 0] *= 2
+        pheromone[sol_depart[D:], np.arange(D), 1] *= 2
 
-    # pour les jours en gras, on réduit l'heuristique pour les médecins actuellement affectés
-    if sol_initiale is not None and jours_gras is not None:
-        for t in jours_gras['garde']:
-            if sol_initiale[t] != -1:
-                heuristic_garde[sol_initiale[t], t] *= HEURISTIC_NEG_PREF_AC # environ 0, petite valeure positive (pour éviter les NaN...)
-        for t in jours_gras['astreinte']:
-            if sol_initiale[D + t] != -1:
-                heuristic_garde[sol_initiale[D + t], t] *= HEURISTIC_NEG_PREF_AC # environ 0
-
-    # pour les astreintes, on ne prend pas en compte les préférences
-    heuristic_astreinte = np.ones((N, D))
-
-    heuristic = np.stack((heuristic_garde, heuristic_astreinte), axis=2)
+    heuristic = heuristique_ant_colony(gplan, sol_initiale, jours_gras)
 
     best_planning = None
     best_score = float('inf')
+    if sol_depart is not None:
+        best_planning = np.array(sol_depart).copy()
+        best_score = gplan.calcule_critere(best_planning)
     scores = []
 
-    pbar = tqdm.tqdm(range(num_iterations))
+    pbar = tqdm.tqdm(range(num_iterations), disable=not afficher)
 
     # lancement de la recherche
-    for _ in pbar:
+    for iteration in pbar:
+        if borne_atteinte(best_score, borne): # (la solution de départ peut déjà suffire)
+            break
+
         all_solutions = []
+        score_avant = best_score
 
         # chaque fourmi=une solution
         for _ in range(num_ants):
-            planning = construct_solution(pheromone, heuristic, gplan, alpha, beta, sol_initiale, jours_gras)
+            planning = construct_solution(pheromone, heuristic, gplan, alpha, beta, sol_initiale, jours_gras, gplan.candidats)
             planning = gplan.forcer_contrainte(planning)
             score = gplan.calcule_critere(planning)
             all_solutions.append((planning, score))
@@ -95,6 +96,9 @@ def recherche_ant_colony(num_ants, num_iterations, alpha, beta, rho, gplan, eq=N
                 best_planning = planning.copy()
                 best_score = score
 
+        if profilage.ACTIF:
+            profilage.compter('aco.fourmis', num_ants)
+
         # calcul des phéromones
         pheromone = pheromone * (1 - rho)  # Evaporation
 
@@ -110,25 +114,63 @@ def recherche_ant_colony(num_ants, num_iterations, alpha, beta, rho, gplan, eq=N
             pheromone[i_astreinte, t, 1] += delta_tau
 
         scores.append(best_score)
-        pbar.set_description(f"\033[1m\033[35m[GARDIEN]\033[0m [\033[34mÉquipe {eq}\033[0m \033[1m\033[35m1/2\033[0m] \033[32mmeilleur score: \033[1m{best_score:.0f}\033[0m")
+        if trace is not None:
+            ameliorations = sum(score < score_avant for _, score in all_solutions)
+            trace('aco', iteration, best_ant_score, best_score, ameliorations / num_ants, (iteration + 1) * num_ants)
+        pbar.set_description(f"\033[1m\033[35m[GARDIEN]\033[0m [\033[34mÉquipe {eq}\033[0m \033[1m\033[35m1/2\033[0m] \033[32mmeilleur score: \033[1m{best_score:.0f}\033[0m{texte_ecart(best_score, borne)}")
+
+        if temps_limite is not None and time.time() >= temps_limite:
+            break
     pbar.close()
     
     return best_planning, best_score, scores
 
-def construct_solution(pheromone, heuristic, gplan, alpha, beta, sol_initiale=None, jours_gras=None):
+def heuristique_ant_colony(gplan, sol_initiale=None, jours_gras=None):
+    """
+    Heuristiques η[m][t][s] (cf commentaire en haut du fichier), de taille (N, D, 2).
+    """
+
+    N = gplan.N
+    D = gplan.D
+
+    # init des heuristiques η[m][t][s]
+    heuristic_garde = np.zeros((N, D))
+    for i in range(N):
+        for t in range(D):
+            pref = gplan.preferences[i][t]
+            if pref >= 0:
+                heuristic_garde[i][t] = pref + 1
+            else:
+                heuristic_garde[i][t] = HEURISTIC_NEG_PREF_AC # environ 0, petite valeure positive (pour éviter les NaN...)
+
+    # pour les jours en gras, on réduit l'heuristique pour les médecins actuellement affectés
+    if sol_initiale is not None and jours_gras is not None:
+        for t in jours_gras['garde']:
+            if sol_initiale[t] != -1:
+                heuristic_garde[sol_initiale[t], t] *= HEURISTIC_NEG_PREF_AC # environ 0, petite valeure positive (pour éviter les NaN...)
+        for t in jours_gras['astreinte']:
+            if sol_initiale[D + t] != -1:
+                heuristic_garde[sol_initiale[D + t], t] *= HEURISTIC_NEG_PREF_AC # environ 0
+
+    # pour les astreintes, on ne prend pas en compte les préférences
+    heuristic_astreinte = np.ones((N, D))
+
+    return np.stack((heuristic_garde, heuristic_astreinte), axis=2)
+
+def construct_solution(pheromone, heuristic, gplan, alpha, beta, sol_initiale=None, jours_gras=None, candidats=None):
     """
     fonction annexe qui construit une solution à partir des phéronomones et des heuristiques
+    candidats: si donné (ListesCandidats, cf candidats.py), chaque créneau est tiré parmi ses candidats plutôt que parmi tous les médecins
     """
 
     N = gplan.N
     D = gplan.D
-    planning_gardes = np.zeros(D, dtype=int)
-    planning_astreintes = np.zeros(D, dtype=int)
 
     # si on a une solution initiale, on part de celle-ci
-    if sol_initiale is not None:
-        planning_gardes = sol_initiale[:D].copy()
-        planning_astreintes = sol_initiale[D:].copy()
+    # (un seul tampon, les gardes et les astreintes sont des vues dessus)
+    planning = np.zeros(2 * D, dtype=DTYPE_PLANNING) if sol_initiale is None else np.array(sol_initiale, dtype=DTYPE_PLANNING)
+    planning_gardes = planning[:D]
+    planning_astreintes = planning[D:]
 
     for t in range(D):
         if sol_initiale is not None:
@@ -143,7 +185,10 @@ def construct_solution(pheromone, heuristic, gplan, alpha, beta, sol_initiale=No
         if jours_gras is not None and t in jours_gras['garde'] and sol_initiale is not None:
             unavailable_doctors_garde.add(sol_initiale[t])
 
-        available_doctors_garde = set(range(N)) - unavailable_doctors_garde
+        if candidats is not None:
+            available_doctors_garde = candidats.disponibles(t, 0, unavailable_doctors_garde)
+        else:
+            available_doctors_garde = set(range(N)) - unavailable_doctors_garde
 
         # calcul des probabilités pour les médecins disponibles
         probs_garde = []
@@ -178,7 +223,10 @@ def construct_solution(pheromone, heuristic, gplan, alpha, beta, sol_initiale=No
         if jours_gras is not None and t in jours_gras['astreinte'] and sol_initiale is not None:
             unavailable_doctors_astreinte.add(sol_initiale[D + t])
 
-        available_doctors_astreinte = set(range(N)) - unavailable_doctors_astreinte
+        if candidats is not None:
+            available_doctors_astreinte = candidats.disponibles(t, 1, unavailable_doctors_astreinte)
+        else:
+            available_doctors_astreinte = set(range(N)) - unavailable_doctors_astreinte
 
         probs_astreinte = []
         doctors_astreinte = []
@@ -199,4 +247,4 @@ def construct_solution(pheromone, heuristic, gplan, alpha, beta, sol_initiale=No
         selected_doctor_astreinte = np.random.choice(doctors_astreinte, p=probs_astreinte)
         planning_astreintes[t] = selected_doctor_astreinte
 
-    return np.concatenate((planning_gardes, planning_astreintes))
+    return planning
@@ -1,9 +1,14 @@
+import time
+import queue
 import random
+import multiprocessing as mp
 import numpy as np
+import tqdm
 
-"""
-[NON UTILISE PAR GARDIEN]
+from borne import borne_atteinte, texte_ecart
+from planning import DTYPE_PLANNING
 
+"""
 Plusieurs choix ont été faits:
 
 - codage du génotype: même codage que le planning, ie une liste qui accole les gardes et les astreintes.
@@ -12,140 +17,286 @@ Par exemple, [3, 4, 5, 6, 1, 3] signifie qu'il y a 3 paires (garde, astreinte) 
 et que le mdc 3 fait la première garde tandis que 6 fait la première astreinte.
 4 seconde garde, 1 seconde astreinte, etc.
 
-- fitness: cf fonction calcule_critere dans definitions.py. Cette fitness doit être minimisée.
+- population: un tableau numpy (P, 2D) d'entiers 16 bits (cf planning.py), un individu par ligne. Toutes les opérations (sélection, croisements,
+mutations, réparation, fitness) se font sur toute la population à la fois, sans boucle sur les individus.
+
+- fitness: cf fonction calcule_critere dans definitions.py (ici calcule_critere_lot, sa version par lots).
+Cette fitness doit être minimisée. Elle est calculée une seule fois par individu.
 
 - sélection: on choisit la sélection par tournoi (on tire au hasard k individus et on sélectionne le meilleur)
 
 - élitisme: on conserve quoi qu'il arrive le meilleur individu pour la génération suivante
 (cela permet de ne pas perdre une potentielle bonne solution)
 
-- croisements: on a implémenté les one-point-crossover et two-point-crossover (pour l'instant)
+- croisements: one-point-crossover et two-point-crossover (chacun pour la moitié des couples de parents en moyenne)
+
+- mutations : mutation par substitution (premier enfant de chaque couple) et par échange (second enfant)
+
+- réparation: les enfants sont rendus "viables" par forcer_contrainte_lot (version par lots de forcer_contrainte)
 
-- mutations : on a implémenté la mutation par substitution et par échange (pour l'instant)
+- modèle en îles (nb_iles > 1, cf recherche_iles): plusieurs populations évoluent en parallèle (un processus chacune)
+et s'échangent leurs meilleurs individus sur un anneau toutes les PERIODE_MIGRATION générations
 
 sources (sélection par tournoi):
 https://perso.liris.cnrs.fr/alain.mille/enseignements/master_ia/rapports_2006/Programmation%20Genetique_4p.pdf
 """
 
+TAILLE_TOURNOI = 3
+PERIODE_MIGRATION = 10 # modèle en îles : nombre de générations entre deux migrations
+NB_MIGRANTS = 2 # modèle en îles : nombre d'individus envoyés à l'île suivante à chaque migration
+
+# sélection
+
+def selection_tournoi(fitness, nb_selections, k=TAILLE_TOURNOI):
+    """
+    Indices de nb_selections individus, chacun étant le meilleur de k individus tirés au hasard.
+    """
+
+    tournois = np.random.randint(0, len(fitness), size=(nb_selections, k))
+    return tournois[np.arange(nb_selections), np.argmin(fitness[tournois], axis=1)]
+
 # croisements
 
-def one_point_crossover(parent1, parent2):
-    crossover_point = np.random.randint(1, len(parent1))
-    enfant1 = np.concatenate((parent1[:crossover_point], parent2[crossover_point:]))
-    enfant2 = np.concatenate((parent2[:crossover_point], parent1[crossover_point:]))
-    return enfant1, enfant2
-
-def two_point_crossover(parent1, parent2):
-    crossover_points = sorted(np.random.choice(range(1, 2*len(parent1)), size=2, replace=False))
-    
-    mask = np.ones(len(parent1), dtype=bool)
-    mask[crossover_points[0]:crossover_points[1]] = False
-    
-    enfant1 = np.where(mask, parent1, parent2)
-    enfant2 = np.where(mask, parent2, parent1)
-    return enfant1, enfant2
+def one_point_crossover(parents1, parents2):
+    """
+    Croisement en un point de chaque couple (parents1[i], parents2[i]) (tableaux (nb_couples, L)).
+    """
+
+    nb_couples, L = parents1.shape
+    points = np.random.randint(1, L, size=(nb_couples, 1))
+    masque = np.arange(L) < points
+    return np.where(masque, parents1, parents2), np.where(masque, parents2, parents1)
+
+def two_point_crossover(parents1, parents2):
+    """
+    Croisement en deux points de chaque couple (parents1[i], parents2[i]) (tableaux (nb_couples, L)).
+    """
+
+    nb_couples, L = parents1.shape
+    points = np.sort(np.random.randint(1, L, size=(nb_couples, 2)), axis=1)
+    colonnes = np.arange(L)
+    masque = (colonnes < points[:, :1]) | (colonnes >= points[:, 1:])
+    return np.where(masque, parents1, parents2), np.where(masque, parents2, parents1)
 
 # mutations
 
-def mutation_substitution(individu, gplan):
-    # indice + valeur
-    indice_a_muter = np.random.randint(0, len(individu))
-    nouvelle_valeur = gplan.random_mdc()
+def mutation_substitution(individus, gplan):
+    """
+    Remplace le médecin d'un créneau au hasard de chaque individu (tableau (n, L), modifié sur place).
+    """
+
+    n, L = individus.shape
+    individus[np.arange(n), np.random.randint(0, L, size=n)] = np.random.randint(0, gplan.N, size=n)
+    return individus
 
-    # construction de l'individu muté
-    individu_mute = individu.copy()
-    individu_mute[indice_a_muter] = nouvelle_valeur
-    return individu_mute
+def mutation_echange(individus):
+    """
+    Échange deux créneaux au hasard de chaque individu (tableau (n, L), modifié sur place).
+    """
 
-def mutation_echange(individu):
-    # les deux indices à échanger
-    indices = np.random.choice(len(individu), size=2, replace=False)
+    n, L = individus.shape
+    lignes = np.arange(n)
+    i = np.random.randint(0, L, size=n)
+    j = (i + np.random.randint(1, L, size=n)) % L # j != i
+    individus[lignes, i], individus[lignes, j] = individus[lignes, j], individus[lignes, i]
+    return individus
+
+def _population_initiale(gplan, P, sol=None):
+    """
+    Population initiale (P, 2D) : aléatoire, ou construite autour de sol (elle-même + des mutations), et réparée.
+    """
 
-    individu_mute = individu.copy()
-    individu_mute[indices[0]], individu_mute[indices[1]] = individu_mute[indices[1]], individu_mute[indices[0]]
-    return individu_mute
+    L = 2 * gplan.D
+    if sol is None:
+        return gplan.forcer_contrainte_lot(np.random.randint(0, gplan.N, size=(P, L)))
+    sol = np.asarray(sol, dtype=DTYPE_PLANNING)
+    mutants = mutation_substitution(np.tile(sol, (P - 1, 1)), gplan)
+    return np.vstack((sol, gplan.forcer_contrainte_lot(mutants)))
 
-def recherche_algo_genetique(taille_population, nb_generations, taux_mutation, gplan, verbose=False):
+def _generation(population, fitness, taux_mutation, gplan):
+    """
+    Une génération : sélection, croisements, mutations et réparation des enfants, élitisme.
+    Renvoie la nouvelle population, sa fitness, et le taux d'enfants meilleurs que la médiane de la génération précédente.
+    """
+
+    P = len(population)
+    nb_couples = P // 2 # P-1 enfants (au moins), le meilleur individu complète la génération
+
+    # élitisme : on conserve le meilleur individu
+    meilleur_index = np.argmin(fitness)
+
+    # sélection des parents par tournoi
+    parents = population[selection_tournoi(fitness, 2 * nb_couples)]
+    parents1, parents2 = parents[:nb_couples], parents[nb_couples:]
+
+    # croisements (un point ou deux points, au hasard pour chaque couple)
+    un_point = np.random.random(nb_couples) < 0.5
+    enfants1, enfants2 = two_point_crossover(parents1, parents2)
+    enfants1_un_point, enfants2_un_point = one_point_crossover(parents1[un_point], parents2[un_point])
+    enfants1[un_point], enfants2[un_point] = enfants1_un_point, enfants2_un_point
+
+    # mutations
+    mutes1 = np.random.random(nb_couples) < taux_mutation
+    mutes2 = np.random.random(nb_couples) < taux_mutation
+    enfants1[mutes1] = mutation_substitution(enfants1[mutes1], gplan)
+    enfants2[mutes2] = mutation_echange(enfants2[mutes2])
+
+    # les enfants doivent être "viables"
+    enfants = gplan.forcer_contrainte_lot(np.vstack((enfants1, enfants2)))[:P - 1]
+    fitness_enfants = gplan.calcule_critere_lot(enfants)
+    taux = np.mean(fitness_enfants < np.median(fitness)) if len(enfants) else 0.0 # (sans l'élite)
+
+    population = np.vstack((population[meilleur_index], enfants))
+    fitness = np.concatenate(([fitness[meilleur_index]], fitness_enfants))
+    return population, fitness, taux
+
+def recherche_algo_genetique(taille_population, nb_generations, taux_mutation, gplan, verbose=False, sol=None, temps_limite=None, trace=None, borne=None, eq=None, afficher=False, nb_iles=1, periode_migration=PERIODE_MIGRATION, nb_migrants=NB_MIGRANTS):
     """
     Recherche un planning qui minimise le critère défini dans definition.py par algorithme génétique.
     Renvoie le meilleur individu trouvé pendant toute la recherche, et la liste des critères obtenus au fil de la recherche.
+
+    sol: si donnée, la population initiale est construite autour de cette solution (elle-même + des mutations)
+    temps_limite: instant (time.time()) après lequel on arrête la recherche
+    trace: fonction appelée à chaque génération (cf traces.py)
+    borne: borne inférieure du critère (cf borne.py), on s'arrête dès que le meilleur individu en est assez proche
+    eq: numéro de l'équipe (seulement pour l'affichage)
+    afficher: affiche ou non la barre de progression
+    nb_iles: si > 1, modèle en îles (cf recherche_iles) : nb_iles populations de taille_population individus,
+    chacune dans son processus (trace et verbose sont alors ignorés)
     """
 
-    # meilleur fitness trackée à chaque génération
-    scores = []
+    if nb_iles > 1:
+        return recherche_iles(nb_iles, taille_population, nb_generations, taux_mutation, gplan, periode_migration, nb_migrants, sol=sol, temps_limite=temps_limite, borne=borne, eq=eq, afficher=afficher)
+
+    P = taille_population
 
     # init population
-    population = [gplan.forcer_contrainte(gplan.solution_initiale()) for _ in range(taille_population)]
-    #population = [gplan.forcer_contrainte(gplan.solution_manuel()) for _ in range(taille_population)]
+    population = _population_initiale(gplan, P, sol)
+    fitness = gplan.calcule_critere_lot(population)
 
-    meilleur_score = min(gplan.calcule_critere(ind) for ind in population)
-    scores.append(meilleur_score)
+    # meilleur fitness trackée à chaque génération
+    scores = [float(fitness.min())]
+    evaluations = P
 
     if verbose:
-        print(f"Génération 0: Meilleur score = {meilleur_score}")
+        print(f"Génération 0: Meilleur score = {scores[0]}")
 
-    for generation in range(nb_generations):
-        fitness = [gplan.calcule_critere(individu) for individu in population]
-        
-        # sélection des parents par tournoi
-        def selection_tournoi(k=3):
-            indices_tournoi = random.sample(range(taille_population), k)
-            return population[min(indices_tournoi, key=lambda i: fitness[i])]
-
-        # sélection des parents par roulette (après plusieurs tests, les tournois sont meilleurs)
-        def selection_roulette():
-            somme_fitness = sum(fitness)
-            
-            rand = random.uniform(0, somme_fitness)
-            
-            somme_courante = 0
-            for i, f in enumerate(fitness):
-                somme_courante += f
-                if somme_courante > rand:
-                    return population[i]
-            
-            # (au cas ou)
-            return population[-1]
-        
-        nouvelle_population = []
-        
-        # élitisme : on conserve le meilleur individu
-        meilleur_index = fitness.index(min(fitness))
-        nouvelle_population.append(population[meilleur_index])
-        
-        # nouvelle génération
-        while len(nouvelle_population) < taille_population:
-            parent1 = selection_tournoi()
-            parent2 = selection_tournoi()
-            #parent1 = selection_roulette() # la selection par roulette ne donne pas de bons resultats
-            #parent2 = selection_roulette()
-            
-            # croisements
-            if random.random() < 0.5:
-                enfant1, enfant2 = one_point_crossover(parent1, parent2)
-            else:
-                enfant1, enfant2 = two_point_crossover(parent1, parent2)
-            
-            # mutations
-            if random.random() < taux_mutation:
-                enfant1 = mutation_substitution(enfant1, gplan)
-            if random.random() < taux_mutation:
-                enfant2 = mutation_echange(enfant2)
-            
-            # les enfants doivent être "viables"
-            enfant1 = gplan.forcer_contrainte(enfant1)
-            enfant2 = gplan.forcer_contrainte(enfant2)
-            
-            nouvelle_population.extend([enfant1, enfant2])
-    
-        population = nouvelle_population[:taille_population]
-    
-        meilleur_score = min(gplan.calcule_critere(ind) for ind in population)
-        scores.append(meilleur_score)
+    pbar = tqdm.tqdm(range(nb_generations), disable=not afficher)
+
+    for generation in pbar:
+        population, fitness, taux = _generation(population, fitness, taux_mutation, gplan)
+        evaluations += P - 1
+        scores.append(float(fitness.min()))
+
+        if trace is not None:
+            trace('genetique', generation + 1, scores[-1], min(scores), taux, evaluations)
 
         if verbose:
-            print(f"Génération {generation + 1}: Meilleur score = {meilleur_score}")
+            print(f"Génération {generation + 1}: Meilleur score = {scores[-1]}")
+        pbar.set_description(f"\033[1m\033[35m[GARDIEN]\033[0m [\033[34mÉquipe {eq}\033[0m \033[1m\033[35mgénétique\033[0m] \033[32mmeilleur score: \033[1m{min(scores):.0f}\033[0m{texte_ecart(min(scores), borne)}")
+
+        if temps_limite is not None and time.time() >= temps_limite:
+            break
+        if borne_atteinte(min(scores), borne):
+            break
+    pbar.close()
+
+    return np.array(population[np.argmin(fitness)], dtype=int), scores
+
+# modèle en îles
+
+def _worker_ile(ile, nb_iles, taille_population, nb_generations, taux_mutation, gplan, periode_migration, nb_migrants, sol, temps_limite, borne, graine, files_migration, file_resultats, meilleur_score, verrou, arret):
+    """
+    Processus d'une île : fait évoluer sa population, et toutes les periode_migration générations envoie ses nb_migrants
+    meilleurs individus à l'île suivante (anneau) et remplace ses plus mauvais individus par les migrants reçus.
+    Envoie à la fin (meilleur individu, scores) dans file_resultats.
+    """
+
+    random.seed(graine) # (forcer_contrainte, appelée par forcer_contrainte_lot, tire avec le module random)
+    np.random.seed(graine)
+
+    # les migrants encore en attente à la fin ne servent plus : ils ne doivent pas empêcher le processus de se terminer
+    files_migration[(ile + 1) % nb_iles].cancel_join_thread()
+
+    population = _population_initiale(gplan, taille_population, sol)
+    fitness = gplan.calcule_critere_lot(population)
+    scores = [float(fitness.min())]
+
+    for generation in range(nb_generations):
+        population, fitness, _ = _generation(population, fitness, taux_mutation, gplan)
+        scores.append(float(fitness.min()))
+
+        if (generation + 1) % periode_migration == 0:
+            # migration asynchrone : on n'attend pas les autres îles, on prend les migrants déjà arrivés
+            meilleurs = np.argsort(fitness)[:nb_migrants]
+            files_migration[(ile + 1) % nb_iles].put((population[meilleurs], fitness[meilleurs]))
+            while True:
+                try:
+                    migrants, fitness_migrants = files_migration[ile].get_nowait()
+                except queue.Empty:
+                    break
+                pires = np.argsort(fitness)[::-1][:len(migrants)]
+                population[pires], fitness[pires] = migrants, fitness_migrants
+
+            with verrou:
+                meilleur_score.value = min(meilleur_score.value, scores[-1])
+
+        if arret.is_set() or (temps_limite is not None and time.time() >= temps_limite):
+            break
+        if borne_atteinte(scores[-1], borne):
+            arret.set()
+            break
+
+    with verrou:
+        meilleur_score.value = min(meilleur_score.value, min(scores))
+    file_resultats.put((np.array(population[np.argmin(fitness)], dtype=int), min(scores), scores))
+
+def recherche_iles(nb_iles, taille_population, nb_generations, taux_mutation, gplan, periode_migration=PERIODE_MIGRATION, nb_migrants=NB_MIGRANTS, sol=None, temps_limite=None, borne=None, eq=None, afficher=False):
+    """
+    Algorithme génétique en îles : nb_iles populations évoluent chacune dans son processus, et échangent leurs meilleurs
+    individus sur un anneau toutes les periode_migration générations (cf _worker_ile). Les îles gardent plus de diversité
+    qu'une seule population élitiste.
+    Toutes les îles s'arrêtent à temps_limite, ou dès qu'une île est assez proche de la borne inférieure.
+    Même retour que recherche_algo_genetique (scores : à chaque génération, meilleur critère sur toutes les îles).
+    (ne peut pas être appelée depuis un processus démon, par exemple un processus du portfolio)
+    """
+
+    ctx = mp.get_context()
+    files_migration = [ctx.Queue() for _ in range(nb_iles)]
+    file_resultats = ctx.Queue()
+    meilleur_score = ctx.Value('d', float('inf'), lock=False)
+    verrou = ctx.Lock()
+    arret = ctx.Event()
+    graine = np.random.randint(0, 2**31 - 1 - nb_iles)
+
+    processus = []
+    for ile in range(nb_iles):
+        p = ctx.Process(target=_worker_ile, args=(ile, nb_iles, taille_population, nb_generations, taux_mutation, gplan, periode_migration, nb_migrants, sol, temps_limite, borne, graine + ile, files_migration, file_resultats, meilleur_score, verrou, arret), daemon=True)
+        p.start()
+        processus.append(p)
+
+    # on récupère les résultats avant de joindre les processus (un processus ne se termine pas tant que sa file n'est pas vidée)
+    pbar = tqdm.tqdm(total=nb_iles, bar_format="{desc} {bar} {n_fmt}/{total_fmt} îles", disable=not afficher)
+    resultats = []
+    while len(resultats) < nb_iles:
+        try:
+            resultats.append(file_resultats.get(timeout=0.2))
+            pbar.update(1)
+        except queue.Empty:
+            if not any(p.is_alive() for p in processus):
+                break
+        if meilleur_score.value < float('inf'):
+            pbar.set_description(f"\033[1m\033[35m[GARDIEN]\033[0m [\033[34mÉquipe {eq}\033[0m \033[1m\033[35mgénétique ({nb_iles} îles)\033[0m] \033[32mmeilleur score: \033[1m{meilleur_score.value:.0f}\033[0m{texte_ecart(meilleur_score.value, borne)}")
+    pbar.close()
+
+    arret.set()
+    for p in processus:
+        p.join()
 
-    meilleur_individu = min(population, key=lambda ind: gplan.calcule_critere(ind))
+    if not resultats:
+        raise Exception(f"\033[1m\033[31m[ERREUR]\033[0m Aucune île de l'algorithme génétique n'a produit de planning pour l'équipe {eq}.")
 
-    return meilleur_individu, scores
+    meilleur, _, _ = min(resultats, key=lambda resultat: resultat[1])
+    longueur = max(len(scores) for _, _, scores in resultats)
+    scores = np.min([np.pad(scores, (0, longueur - len(scores)), mode='edge') for _, _, scores in resultats], axis=0)
+    return meilleur, [float(score) for score in np.minimum.accumulate(scores)]
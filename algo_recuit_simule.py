@@ -1,94 +1,392 @@
+import math
+import random
+import time
+from bisect import bisect_left, insort
 import numpy as np
+import tqdm
 
 from definition import GestionnairePlanning
+from config import *
+from borne import borne_atteinte, texte_ecart
 
 """
-[NON UTILISE PAR GARDIEN]
-
 Plusieurs choix ont été fait:
 
--pour le voisinage, on choisit de changer une garde ou une astreinte (on change de praticien une garde ou astreinte aléatoire)
-(idem que pour recherche tabou)
+-pour le voisinage, on change de praticien une garde ou une astreinte aléatoire (idem que pour recherche tabou),
+ou (avec une probabilité P_ECHANGE) on échange les médecins de deux gardes (ce qui ne change pas la répartition des gardes).
 
--l'implémentation générale n'a pas nécessité de modification par rapport à la trame proposée dans le cours.
+-évaluation incrémentale : on ne répare pas et on ne recalcule pas le critère de chaque voisin.
+Un voisin qui viole une contrainte (jour off, garde et astreinte le même jour, médecin initial d'un jour en gras,
+distance max_dist au planning initial dépassée) est rejeté avant toute évaluation, et les cases soulignées ne sont jamais modifiées.
+La solution courante respecte donc toujours les contraintes, et la variation du critère d'un voisin (cf EtatRecuit.delta)
+ne dépend que des jours voisins du créneau modifié et des nombres de gardes/astreintes des deux médecins concernés.
 
--la majorité du travail pour cet algorithme a été de comprendre l'influence des paramètres
-et de trouver les bons pour notre problème (T_0 et a notamment)
+-température : la température initiale est calibrée sur des variations de critère tirées au hasard autour de la solution de départ
+(on veut accepter un voisin moins bon avec une probabilité TAUX_ACCEPTATION_INITIAL), puis on refroidit par paliers (T = a*T).
+Le refroidissement est adaptatif : tant que le taux d'acceptation d'un palier est au-dessus de TAUX_ACCEPTATION_HAUT,
+la température est trop haute pour être utile et on refroidit deux fois plus vite.
+Quand la recherche est gelée (taux d'acceptation sous TAUX_ACCEPTATION_MIN et pas d'amélioration depuis PALIERS_RECHAUFFE paliers),
+on réchauffe (T = FACTEUR_RECHAUFFE*T_0) en repartant de la meilleure solution.
 
-Note: comme on manipule des vecteurs numpy (les solutions/plannings), on fait des copies
-pour éviter de mauvaises surprises.
+-arrêt : à temps_limite, après nb_iters_max voisins, ou dès que la meilleure solution est assez proche de la borne inférieure.
 """
 
-def planning_voisin(planning, gplan):
+TAUX_ACCEPTATION_INITIAL = 0.5 # probabilité d'accepter une dégradation moyenne à la température initiale
+NB_ECHANTILLONS_T0 = 200 # nombre de voisins tirés pour calibrer la température initiale
+TAUX_ACCEPTATION_HAUT = 0.5 # au-dessus, on refroidit deux fois plus vite
+TAUX_ACCEPTATION_MIN = 0.01 # en dessous (et sans amélioration depuis PALIERS_RECHAUFFE paliers), on réchauffe
+PALIERS_RECHAUFFE = 10
+FACTEUR_RECHAUFFE = 0.5 # température après réchauffe, relative à la température initiale
+P_ECHANGE = 0.3 # probabilité de tirer un échange de deux gardes (plutôt qu'un changement de médecin)
+NB_ITERS_MAX_RECUIT = 200_000 # nombre maximal de voisins par défaut
+
+def _cout_ecart(ecart):
     """
-    fonction qui retourne une solution voisine
-    (on échange juste le médecin d'une garde aléatoire)
+    Pénalité de l'écart entre deux gardes successives d'un même médecin (cf calcule_soft_critere).
     """
-    voisin = planning.copy()
-    creneau_a_modifier = np.random.randint(0, len(planning))
-    nouveau_mdc = gplan.random_mdc()
-    voisin[creneau_a_modifier] = nouveau_mdc
-    return voisin
 
-def recherche_recuit_simule(nb_iters_cycle, T_0, a, gplan: GestionnairePlanning, sol=None):
+    return PENALITE_CRITERE_ECART / ecart + (PENALITE_CRITERE_PETIT_ECART if ecart < PETIT_ECART else 0)
+
+class EtatRecuit:
+    def __init__(self, gplan: GestionnairePlanning, planning, planning_initial=None, jours_gras=None):
+        """
+        Solution courante du recuit et tout ce qu'il faut pour calculer la variation du critère d'un voisin sans le réparer ni l'évaluer :
+        jours de garde de chaque médecin (triés), nombres de gardes et d'astreintes, distance au planning initial.
+        planning doit respecter les contraintes (cf detecte_contrainte).
+        """
+
+        self.gplan = gplan
+        N, D = gplan.N, gplan.D
+        self.N, self.D = N, D
+        self.planning = np.array(planning, dtype=int)
+        jours_gras = jours_gras if jours_gras is not None else gplan.jours_gras
+
+        # coûts de préférences (comme calcule_critere : pas de coût sur les jours soulignés)
+        preferences = np.asarray(gplan.preferences, dtype=float)
+        cout_gardes = np.select([preferences < 0, preferences == 0], [PENALITE_CRITERE_PREF_NEG * preferences**2, PENALITE_CRITERE_PREF_NULLE], -BONUS_CRITERE_PREF_POS * preferences**2)
+        cout_gardes[:, gplan.jours_soulignes['garde']] = 0
+        cout_astreintes = np.where(preferences < SEUIL_PREF_NEG_ASTREINTE, PENALITE_CRITERE_PREF_NEG * preferences**2, 0.0)
+        cout_astreintes[:, gplan.jours_soulignes['astreinte']] = 0
+        self.couts = (cout_gardes.tolist(), cout_astreintes.tolist()) # listes : plus rapides que numpy élément par élément
+
+        # pénalité d'attributs de chaque couple (mdc de garde, mdc d'astreinte)
+        penalites = np.zeros((N, N))
+        for mdc_avec_attribut in gplan.attributs.values():
+            sans = ~np.asarray(mdc_avec_attribut, dtype=bool)
+            penalites += PENALITE_CRITERE_ATTRIBUT_MANQUANT * np.outer(sans, sans)
+        self.penalites_attributs = penalites.tolist()
+
+        cibles_gardes, cibles_astreintes = gplan.cibles_repartition()
+        self.cibles = (np.asarray(cibles_gardes, dtype=float).tolist(), np.asarray(cibles_astreintes, dtype=float).tolist())
+
+        # créneaux modifiables (pas les cases soulignées), et médecin interdit de chaque créneau (médecin initial d'un jour en gras)
+        self.modifiables = ([t for t in range(D) if t not in gplan.jours_soulignes['garde']], [t for t in range(D) if t not in gplan.jours_soulignes['astreinte']])
+        self.interdits = ({}, {})
+        if planning_initial is not None:
+            planning_initial = np.asarray(planning_initial)
+            for s, type_creneau in enumerate(['garde', 'astreinte']):
+                for t in jours_gras[type_creneau]:
+                    if planning_initial[s * D + t] != -1:
+                        self.interdits[s][t] = int(planning_initial[s * D + t])
+
+        # distance au planning initial (cases remplies du planning initial, comme le tabou)
+        self.initial = planning_initial.tolist() if planning_initial is not None else None
+        self.distance = 0 if planning_initial is None else int(np.sum((self.planning != planning_initial) & (planning_initial != -1)))
+
+        self.synchroniser()
+
+    def synchroniser(self, planning=None):
+        """
+        (Re)calcule les structures incrémentales (et le critère, avec calcule_critere) pour planning (par défaut la solution courante).
+        """
+
+        if planning is not None:
+            self.planning = np.array(planning, dtype=int)
+            if self.initial is not None:
+                initial = np.asarray(self.initial)
+                self.distance = int(np.sum((self.planning != initial) & (initial != -1)))
+        D = self.D
+        self.gardes = self.planning[:D].tolist()
+        self.astreintes = self.planning[D:].tolist()
+        self.jours_gardes = [[] for _ in range(self.N)]
+        for t, mdc in enumerate(self.gardes):
+            self.jours_gardes[mdc].append(t)
+        self.nombres = (np.bincount(self.gardes, minlength=self.N).tolist(), np.bincount(self.astreintes, minlength=self.N).tolist())
+        self.critere = self.gplan.calcule_critere(self.planning)
+
+    def vers_planning(self):
+        return np.array(self.gardes + self.astreintes, dtype=int)
+
+    def faisable(self, s, t, mdc):
+        """
+        True si le médecin mdc peut prendre le créneau (s: 0 garde, 1 astreinte ; jour t), les autres créneaux étant inchangés.
+        """
+
+        gardes = self.gardes
+        if self.interdits[s].get(t) == mdc:
+            return False
+        if s == 0:
+            if mdc == self.astreintes[t]:
+                return False
+            if ENABLE_OFF_AFTER_GARDE:
+                if t > 0 and gardes[t - 1] == mdc:
+                    return False
+                if t + 1 < self.D and (gardes[t + 1] == mdc or self.astreintes[t + 1] == mdc):
+                    return False
+            return True
+        if mdc == gardes[t]:
+            return False
+        return not (ENABLE_OFF_AFTER_GARDE and t > 0 and gardes[t - 1] == mdc)
+
+    def delta_distance(self, s, t, mdc):
+        if self.initial is None:
+            return 0
+        initial = self.initial[s * self.D + t]
+        if initial == -1:
+            return 0
+        ancien = self.gardes[t] if s == 0 else self.astreintes[t]
+        return (mdc != initial) - (ancien != initial)
+
+    def delta(self, s, t, mdc):
+        """
+        Variation du critère si le créneau (s, t) passe à mdc (sans vérifier les contraintes).
+        """
+
+        if s == 0:
+            ancien = self.gardes[t]
+            autre = self.astreintes[t]
+            d = self.couts[0][mdc][t] - self.couts[0][ancien][t]
+            d += self.penalites_attributs[mdc][autre] - self.penalites_attributs[ancien][autre]
+
+            # écarts : on retire t des gardes de l'ancien médecin, on l'ajoute à celles du nouveau
+            jours = self.jours_gardes[ancien]
+            i = bisect_left(jours, t)
+            avant = jours[i - 1] if i > 0 else None
+            apres = jours[i + 1] if i + 1 < len(jours) else None
+            if avant is not None:
+                d -= _cout_ecart(t - avant)
+            if apres is not None:
+                d -= _cout_ecart(apres - t)
+            if avant is not None and apres is not None:
+                d += _cout_ecart(apres - avant)
+
+            jours = self.jours_gardes[mdc]
+            i = bisect_left(jours, t)
+            avant = jours[i - 1] if i > 0 else None
+            apres = jours[i] if i < len(jours) else None
+            if avant is not None:
+                d += _cout_ecart(t - avant)
+            if apres is not None:
+                d += _cout_ecart(apres - t)
+            if avant is not None and apres is not None:
+                d -= _cout_ecart(apres - avant)
+        else:
+            ancien = self.astreintes[t]
+            autre = self.gardes[t]
+            d = self.couts[1][mdc][t] - self.couts[1][ancien][t]
+            d += self.penalites_attributs[autre][mdc] - self.penalites_attributs[autre][ancien]
+
+        # répartition : (cible-(n-1))² - (cible-n)² pour l'ancien médecin, (cible-(n+1))² - (cible-n)² pour le nouveau
+        cibles, nombres = self.cibles[s], self.nombres[s]
+        d += PENALITE_CRITERE_MAUVAISE_REPART * (2 * (cibles[ancien] - nombres[ancien]) + 1 - 2 * (cibles[mdc] - nombres[mdc]) + 1)
+        return d
+
+    def appliquer(self, s, t, mdc, d=0.0):
+        """
+        Le créneau (s, t) passe à mdc (d : variation du critère, cf delta).
+        """
+
+        self.distance += self.delta_distance(s, t, mdc)
+        if s == 0:
+            ancien = self.gardes[t]
+            self.jours_gardes[ancien].remove(t)
+            insort(self.jours_gardes[mdc], t)
+            self.gardes[t] = mdc
+        else:
+            ancien = self.astreintes[t]
+            self.astreintes[t] = mdc
+        self.nombres[s][ancien] -= 1
+        self.nombres[s][mdc] += 1
+        self.critere += d
+
+    def tirer_mdc(self, s, t):
+        """
+        Nouveau médecin pour le créneau (s, t), tiré dans la liste de candidats si gplan en a (différent du médecin actuel).
+        """
+
+        actuel = self.gardes[t] if s == 0 else self.astreintes[t]
+        if self.gplan.candidats is not None:
+            return self.gplan.candidats.tirer(t, s, exclus=(actuel, self.interdits[s].get(t)))
+        mdc = random.randrange(self.N - 1)
+        return mdc + 1 if mdc >= actuel else mdc
+
+def recherche_recuit_simule(nb_iters_cycle, T_0, a, gplan: GestionnairePlanning, sol=None, max_dist=None, planning_initial=None, jours_gras=None, nb_iters_max=NB_ITERS_MAX_RECUIT, eq=None, temps_limite=None, afficher=False, trace=None, borne=None):
     """
     Recherche un planning qui minimise le critère défini dans definition.py par recuit simulé.
-    Renvoie le meilleur individu trouvé pendant toute la recherche, et la liste des critères obtenus au fil de la recherche.
+    Renvoie le meilleur individu trouvé pendant toute la recherche, et la liste des critères obtenus au fil de la recherche
+    (meilleur critère à la fin de chaque palier de température).
+
+    Paramètres:
+    -nb_iters_cycle: nombre de voisins tirés à chaque palier de température
+    -T_0: température initiale (None : calibrée automatiquement, cf commentaire en haut du fichier)
+    -a: facteur de refroidissement entre deux paliers
+    -sol: permet de faire partir la recherche à partir d'une solution donnée (réparée si elle ne respecte pas les contraintes)
+    -max_dist: permet de limiter la recherche de plannings à max_dist du planning initial
+    -planning_initial: couplé à max_dist, permet de limiter la recherche en terme de distance (et interdit le médecin initial des jours en gras)
+    -jours_gras: liste des jours qu'il faut modifier (par défaut ceux de gplan)
+    -nb_iters_max: nombre maximal de voisins tirés (None : pas de limite, il faut alors un temps_limite ou une borne)
+    -eq: numéro de l'équipe (seulement utilisé pour l'affichage)
+    -temps_limite: instant (time.time()) après lequel on arrête la recherche
+    -afficher: affiche ou non la barre de progression
+    -trace: fonction appelée à la fin de chaque palier de température (cf traces.py)
+    -borne: borne inférieure du critère (cf borne.py), on s'arrête dès que la meilleure solution en est assez proche
     """
-    
+
+    if nb_iters_max is None and temps_limite is None and borne is None:
+        raise ValueError("recherche_recuit_simule : il faut au moins un critère d'arrêt (nb_iters_max, temps_limite ou borne)")
+
+    if planning_initial is not None:
+        planning_initial = np.asarray(planning_initial)
+
     # si une sol initiale est passée, on la prend. sinon on la génère aléatoirement
     if sol is None:
         sol = gplan.solution_initiale()
-    else:
-        sol_ref = sol.copy()
-    sol_critere = gplan.calcule_critere(sol)
+    elif gplan.detecte_contrainte(sol):
+        sol = np.array(gplan.forcer_contrainte(np.array(sol)))
+    etat = EtatRecuit(gplan, sol, planning_initial, jours_gras)
+    D = gplan.D
 
-    meilleur_sol = sol.copy()
-    meilleur_critere = sol_critere
+    meilleur_sol = etat.vers_planning()
+    meilleur_critere = etat.critere
 
-    k = 0
-    nouveau_cycle = True
+    creneaux = [(0, t) for t in etat.modifiables[0]] + [(1, t) for t in etat.modifiables[1]]
+    if not creneaux: # tout est souligné
+        return meilleur_sol, [meilleur_critere]
+
+    def voisin():
+        """
+        Tire un voisin faisable : renvoie la liste de ses changements [(s, t, mdc)], ou None s'il viole une contrainte.
+        """
+
+        if random.random() < P_ECHANGE and len(etat.modifiables[0]) > 1:
+            t, u = random.sample(etat.modifiables[0], 2)
+            mdc_t, mdc_u = etat.gardes[t], etat.gardes[u]
+            if mdc_t == mdc_u:
+                return None
+            etat.gardes[t], etat.gardes[u] = mdc_u, mdc_t # (provisoirement, pour tester les contraintes)
+            ok = etat.faisable(0, t, mdc_u) and etat.faisable(0, u, mdc_t)
+            etat.gardes[t], etat.gardes[u] = mdc_t, mdc_u
+            if not ok:
+                return None
+            changements = [(0, t, mdc_u), (0, u, mdc_t)]
+        else:
+            s, t = creneaux[random.randrange(len(creneaux))]
+            mdc = etat.tirer_mdc(s, t)
+            if mdc == (etat.gardes[t] if s == 0 else etat.astreintes[t]) or not etat.faisable(s, t, mdc):
+                return None
+            changements = [(s, t, mdc)]
+
+        if max_dist is not None and etat.initial is not None:
+            if etat.distance + sum(etat.delta_distance(s, t, mdc) for s, t, mdc in changements) > max_dist:
+                return None
+        return changements
+
+    def evaluer(changements):
+        """
+        Variation du critère des changements (appliqués un par un puis annulés, sauf le dernier qui n'est jamais appliqué).
+        """
+
+        d = 0.0
+        annulations = []
+        for s, t, mdc in changements[:-1]:
+            dd = etat.delta(s, t, mdc)
+            annulations.append((s, t, etat.gardes[t] if s == 0 else etat.astreintes[t], dd))
+            etat.appliquer(s, t, mdc, dd)
+            d += dd
+        s, t, mdc = changements[-1]
+        d += etat.delta(s, t, mdc)
+        for s, t, ancien, dd in reversed(annulations):
+            etat.appliquer(s, t, ancien, -dd)
+        return d
+
+    # température initiale : une dégradation moyenne doit être acceptée avec une probabilité TAUX_ACCEPTATION_INITIAL
+    if T_0 is None:
+        degradations = []
+        for _ in range(NB_ECHANTILLONS_T0):
+            changements = voisin()
+            if changements is not None:
+                d = evaluer(changements)
+                if d > 0:
+                    degradations.append(d)
+        T_0 = -np.mean(degradations) / math.log(TAUX_ACCEPTATION_INITIAL) if degradations else 1.0
     T = T_0
+
+    k = 0
+    palier = 0
+    paliers_sans_amelioration = 0
     scores = []
 
-    # on fait plusieurs cycles de température (T_0->0) tant qu'on trouve des amélioration
-    # dans chaque cycle, on fait nb_iters_cycle
-    while nouveau_cycle:
+    pbar = tqdm.tqdm(total=nb_iters_max, disable=not afficher)
+
+    while True:
         nb_iter = 0
-        nouveau_cycle = False
+        nb_acceptes = 0
+        meilleur_avant = meilleur_critere
+        arret = False
 
         while nb_iter < nb_iters_cycle:
+            if (temps_limite is not None and time.time() >= temps_limite) or borne_atteinte(meilleur_critere, borne) or (nb_iters_max is not None and k >= nb_iters_max):
+                arret = True
+                break
+
             k += 1
             nb_iter += 1
 
-            # génération d'un voisin
-            voisin = planning_voisin(sol, gplan)
-            voisin = gplan.forcer_contrainte(voisin)
-            voisin_critere = gplan.calcule_critere(voisin)
+            changements = voisin()
+            if changements is None: # voisin qui viole une contrainte : rejeté sans évaluation
+                continue
 
             # différence de critère entre le voisin et notre sol actuelle
-            df = voisin_critere - sol_critere
-
-            # le voisin est meilleur: on l'accepte
-            if df < 0:
-                sol = voisin
-                sol_critere = voisin_critere
-                nouveau_cycle = True
-            else: # sinon, on l'accepte mais avec une probabilité (qui dépend de df et T)
-                prob = np.exp(-df/T)
-                q = np.random.uniform()
-
-                if q < prob:
-                    sol = voisin
-                    sol_critere = voisin_critere
-                    nouveau_cycle = True
-            
-            if sol_critere < meilleur_critere:
-                meilleur_sol = sol.copy()
-                meilleur_critere = sol_critere
-        
+            df = evaluer(changements)
+
+            # le voisin est meilleur: on l'accepte. sinon, on l'accepte mais avec une probabilité (qui dépend de df et T)
+            if df < 0 or random.random() < math.exp(-df / T):
+                for s, t, mdc in changements:
+                    dd = etat.delta(s, t, mdc)
+                    etat.appliquer(s, t, mdc, dd)
+                nb_acceptes += 1
+
+                if etat.critere < meilleur_critere - 1e-9:
+                    meilleur_sol = etat.vers_planning()
+                    meilleur_critere = etat.critere
+
+        pbar.update(nb_iter)
+        if nb_iter == 0:
+            break
+
+        taux = nb_acceptes / nb_iter
         scores.append(meilleur_critere)
-        
-        T = a * T # on refroidie / baisse la température
+        if trace is not None:
+            trace('recuit', palier, etat.critere, meilleur_critere, taux, k)
+        pbar.set_description(f"\033[1m\033[35m[GARDIEN]\033[0m [\033[34mÉquipe {eq}\033[0m \033[1m\033[35mrecuit\033[0m] \033[32mmeilleur score: \033[1m{meilleur_critere:.0f}\033[0m{texte_ecart(meilleur_critere, borne)}")
+        palier += 1
+
+        if arret:
+            break
+
+        paliers_sans_amelioration = 0 if meilleur_critere < meilleur_avant else paliers_sans_amelioration + 1
+
+        if taux < TAUX_ACCEPTATION_MIN and paliers_sans_amelioration >= PALIERS_RECHAUFFE:
+            # recherche gelée : on réchauffe en repartant de la meilleure solution (et on recale le critère, qui dérive par sommes de deltas)
+            T = FACTEUR_RECHAUFFE * T_0
+            etat.synchroniser(meilleur_sol)
+            meilleur_critere = etat.critere
+            paliers_sans_amelioration = 0
+        elif taux > TAUX_ACCEPTATION_HAUT:
+            T = a * a * T # température trop haute : on refroidit deux fois plus vite
+        else:
+            T = a * T # on refroidie / baisse la température
+
+    pbar.close()
 
     return meilleur_sol, scores
@@ -5,6 +5,9 @@ import time
 
 from definition import GestionnairePlanning
 from config import TENTATIVE_MULT_T
+from borne import borne_atteinte, texte_ecart
+from planning import Planning
+import profilage
 
 """
 Plusieurs choix ont été fait:
@@ -15,11 +18,14 @@ Plusieurs choix ont été fait:
 -pour la liste tabou, on utilise une file (FIFO) de taille maximale max_file (paramètre à choisir).
 on lui donne une taille maximale. on choisit d'y stocker les solutions et non les mouvements*
 
-*chaque solution représente 6mois=30x6=180jours de garde, donc 180 entiers.
-Chacun étant codé sur 32 bits donc 4 octets, une liste "pèse" donc en mémoire <1Ko.
-Pour des tailles de liste tabou <1000, on a donc une empreinte mémoire de 1Mo
+*chaque solution représente 6mois=30x6=180jours de garde et d'astreinte, donc 360 entiers.
+Chacun étant codé sur 16 bits (cf planning.py) donc 2 octets, une solution "pèse" donc en mémoire <1Ko.
+Pour des tailles de liste tabou <1000, on a donc une empreinte mémoire <1Mo
 (10 000 fois moins que la capacité d'ordinateurs grands publics)
 
+La solution courante est un Planning (cf planning.py) : la meilleure solution en est un instantané (copie paresseuse),
+et la liste tabou stocke les octets des plannings (Planning.cle).
+
 Note: comme on manipule des vecteurs numpy (les solutions/plannings), on fait des copies
 pour éviter de mauvaises surprises.
 """
@@ -28,8 +34,9 @@ def planning_voisin(planning, gplan, jours_gras=None):
     """
     Fonction qui retourne une solution voisine en modifiant soit une garde soit une astreinte.
     Si jours_gras est fourni, évite de réutiliser les médecins des jours à modifier.
+    Le nouveau médecin est tiré dans la liste de candidats du créneau (cf candidats.py), si gplan en a.
     """
-    voisin = planning.copy()
+    voisin = Planning.depuis(planning, gplan.D)
     D = gplan.D
     
     # on modifie une garde (0) ou une astreinte (1) ?
@@ -38,16 +45,21 @@ def planning_voisin(planning, gplan, jours_gras=None):
     jour = np.random.randint(0, D)
     # calcule de l'index
     index = jour if type_modif == 0 else jour + D # D premiers jours=gardes, les D suivants=astreintes
+    gras = jours_gras and ((type_modif == 0 and jour in jours_gras['garde']) or (type_modif == 1 and jour in jours_gras['astreinte']))
+
+    if gplan.candidats is not None:
+        voisin.deplacer(type_modif, jour, gplan.candidats.tirer(jour, type_modif, exclus=(voisin[index],) if gras else ()))
+        return voisin
+
     # quels médecins sont disponibles (éviter le médecin actuel si jour en gras)
     medecins_disponibles = list(range(gplan.N))
-    if jours_gras and ((type_modif == 0 and jour in jours_gras['garde']) or 
-                      (type_modif == 1 and jour in jours_gras['astreinte'])):
+    if gras:
         medecins_disponibles.remove(voisin[index])
     # choix au hasard
-    voisin[index] = np.random.choice(medecins_disponibles)
+    voisin.deplacer(type_modif, jour, np.random.choice(medecins_disponibles))
     return voisin
 
-def recherche_tabou(num_iters, num_voisins, max_stagnation, len_tabou, gplan: GestionnairePlanning, sol=None, max_dist=None, planning_initial=None, jours_gras=None, eq=None):
+def recherche_tabou(num_iters, num_voisins, max_stagnation, len_tabou, gplan: GestionnairePlanning, sol=None, max_dist=None, planning_initial=None, jours_gras=None, eq=None, temps_limite=None, afficher=True, trace=None, borne=None):
     """
     Recherche un planning qui minimise le critère défini dans definition.py par méthode tabou.
     L'algorithme arrête sa recherche lorsqu'il "stagne": aucune amélioration sur max_stagnation étapes successives.
@@ -59,41 +71,55 @@ def recherche_tabou(num_iters, num_voisins, max_stagnation, len_tabou, gplan: Ge
     -planning_initial: couplé à max_dist, permet de limiter la recherche en terme de distance
     -jours_gras: liste des jours qu'il faut modifier (utiliser dans planning_voisin)
     -eq: numéro de l'équipe (seulement utilisé pour l'affichage)
+    -temps_limite: instant (time.time()) après lequel on arrête la recherche
+    -afficher: affiche ou non la barre de progression
+    -trace: fonction appelée à chaque itération (cf traces.py)
+    -borne: borne inférieure du critère (cf borne.py), on s'arrête dès que la meilleure solution en est assez proche
     """
 
     tabou = deque(maxlen=len_tabou)
 
     if sol is None: # si pas de sol initiale donnée, on en génère une au hasard
         sol = gplan.solution_initiale()
+    sol = Planning.depuis(sol, gplan.D)
     sol_critere = gplan.calcule_critere(sol)
 
-    meilleur_sol = sol.copy()
+    meilleur_sol = sol.instantane()
     meilleur_critere = sol_critere # pour critère d'aspiration
     stagnation = 0
     scores = []
+    evaluations = 1
 
-    pbar = tqdm.tqdm(range(num_iters))
+    pbar = tqdm.tqdm(range(num_iters), disable=not afficher)
+
+    for iteration in range(num_iters):
+        if temps_limite is not None and time.time() >= temps_limite:
+            break
+        if borne_atteinte(meilleur_critere, borne):
+            break
 
-    for _ in range(num_iters):
         voisin_critere_min = float('inf')
         meilleur_voisin = None
 
         tentatives = 0
         max_tentatives = TENTATIVE_MULT_T*num_voisins
         compteur = 0
+        admissibles = 0 # voisins non tabous (ou acceptés par aspiration)
 
         # cette boucle s'occupe de générer num_voisins
         # il se peut qu'elle soit très lente car on limite la recherche en distance,
         # donc on limite à 3*num_voisins (3=TENTATIVE_MULT_T)
         while tentatives < max_tentatives and compteur < num_voisins:
             voisin = planning_voisin(sol, gplan, jours_gras)
-            voisin = gplan.forcer_contrainte(voisin)
+            voisin = Planning(gplan.D, gplan.forcer_contrainte(voisin)) # (forcer_contrainte renvoie un nouveau tampon)
             tentatives += 1
 
             if planning_initial is not None and max_dist is not None:
                 masque = planning_initial != -1
                 dist = np.sum(voisin[masque] != planning_initial[masque])
                 if dist > max_dist: # distance dépassée, on ignore le voisin trouvé
+                    if profilage.ACTIF:
+                        profilage.compter('tabou.voisins_rejetes_max_dist')
                     continue
             
             compteur += 1
@@ -101,43 +127,56 @@ def recherche_tabou(num_iters, num_voisins, max_stagnation, len_tabou, gplan: Ge
             voisin_critere = gplan.calcule_critere(voisin)
 
             # critère d'aspiration : A(f(s)) prend la valeur de la meilleure solution s*
-            if voisin.tobytes() not in tabou or voisin_critere < meilleur_critere:
+            est_tabou = voisin.cle() in tabou
+            if not est_tabou or voisin_critere < meilleur_critere:
+                admissibles += 1
+                if est_tabou and profilage.ACTIF:
+                    profilage.compter('tabou.aspiration')
                 if voisin_critere < voisin_critere_min:
                     voisin_critere_min = voisin_critere
-                    meilleur_voisin = voisin.copy()
+                    meilleur_voisin = voisin # (nouveau planning à chaque voisin, pas besoin de copie)
         
+        if profilage.ACTIF:
+            profilage.compter('tabou.iterations')
+            profilage.compter('tabou.voisins_evalues', compteur)
+            if compteur < num_voisins: # boucle arrêtée par la limite de TENTATIVE_MULT_T*num_voisins tentatives
+                profilage.compter('tabou.tentatives_epuisees')
+
+        evaluations += compteur
+
         # si on n'a trouvé aucun voisin valide, on saute l'itération
         if meilleur_voisin is None:
             stagnation += 1
             scores.append(sol_critere)
+            if trace is not None:
+                trace('tabou', iteration, sol_critere, meilleur_critere, admissibles / compteur if compteur else 0.0, evaluations)
             continue
         
         # ajout à la liste tabou
-        tabou.append(sol.tobytes())
+        tabou.append(sol.cle())
         sol = meilleur_voisin
         sol_critere = voisin_critere_min
 
         # utilisé pour tracker la stagnation + la meilleure solution trouvée depuis le début (qu'on va renvoyer)
         if sol_critere < meilleur_critere:
-            meilleur_sol = sol.copy()
+            meilleur_sol = sol.instantane()
             meilleur_critere = sol_critere
             stagnation = 0
         else:
             stagnation += 1
 
         scores.append(voisin_critere_min)
+        if trace is not None:
+            trace('tabou', iteration, sol_critere, meilleur_critere, admissibles / compteur, evaluations)
 
-        pbar.set_description(f"\033[1m\033[35m[GARDIEN]\033[0m [\033[34mÉquipe {eq}\033[0m \033[1m\033[35m2/2\033[0m] \033[32mmeilleur score: \033[1m{sol_critere:.0f}\033[0m")
+        pbar.set_description(f"\033[1m\033[35m[GARDIEN]\033[0m [\033[34mÉquipe {eq}\033[0m \033[1m\033[35m2/2\033[0m] \033[32mmeilleur score: \033[1m{sol_critere:.0f}\033[0m{texte_ecart(meilleur_critere, borne)}")
         pbar.update(1)
 
         if stagnation >= max_stagnation:
             #print(f"Arrêt après {_+1} itérations dû à la stagnation.")
             break
 
-    remaining = num_iters - pbar.n
-    for _ in range(remaining):
-        time.sleep(0.005)
-        pbar.update(1)
+    pbar.update(num_iters - pbar.n) # arrêt anticipé (stagnation, borne) : on complète la barre
     pbar.close()
 
-    return meilleur_sol, scores
+    return np.array(meilleur_sol, dtype=int), scores
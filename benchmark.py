@@ -0,0 +1,424 @@
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import datetime
+import numpy as np
+
+from definition import GestionnairePlanning
+from probleme import ProblemeEquipe, completer_implications
+from registre import RegistreMedecins
+from algo_ant_colony import construct_solution, heuristique_ant_colony
+from algo_tabou import planning_voisin, recherche_tabou
+from algo_recuit_simule import recherche_recuit_simule
+from algo_genetique import recherche_algo_genetique
+from solve import resoudre_aco_tabou, _solution_depart, _max_dist, PARAMS_RECUIT_PORTFOLIO, PARAMS_GENETIQUE_PORTFOLIO
+from config import ALPHA, BETA, NUM_ITERS_T, NUM_VOISINS, MAX_STAGNATION, LEN_TABOU
+
+"""
+Benchmarks de Gardien, sur des instances synthétiques (on ne peut pas partager les vrais fichiers des équipes).
+
+generer_instance fabrique, à partir d'une graine, des équipes (ProblemeEquipe) dont on règle la taille,
+le chevauchement entre équipes, les attributs, la distribution des préférences et la densité des jours en gras/soulignés.
+FAMILLES_INSTANCES regroupe quelques jeux de paramètres typiques.
+
+Micro-benchmarks : on mesure le nombre d'appels par seconde des fonctions les plus appelées par les métaheuristiques
+(calcule_critere, forcer_contrainte, detecte_contrainte, construct_solution, planning_voisin).
+Le résultat est écrit en JSON, pour pouvoir comparer les versions entre elles :
+    python benchmark.py micro --familles petite standard --sortie micro.json
+
+Macro-benchmark : on fait tourner les solveurs (ACO+TS de solve_mono, recuit simulé, génétique) sur une instance de chaque famille,
+pour plusieurs graines, et on relève au fil du temps le meilleur critère atteint (planning valide).
+On en déduit le temps pour atteindre des cibles de critère (courbes "time-to-target") et le critère final après différents budgets de temps :
+    python benchmark.py macro --familles petite --graines 0 1 2 --budgets 5 10 20 --sortie macro.json
+"""
+
+FAMILLES_INSTANCES = {
+    'petite': {'nb_mdc': 8, 'nb_jours': 60},
+    'standard': {'nb_mdc': 20, 'nb_jours': 180},
+    'grande': {'nb_mdc': 40, 'nb_jours': 365},
+    'multi': {'nb_mdc': 15, 'nb_jours': 120, 'nb_equipes': 3, 'chevauchement': 0.3, 'densite_attributs': 0.3},
+    'replanification': {'nb_mdc': 20, 'nb_jours': 180, 'densite_gras': 0.05, 'densite_soulignes': 0.2},
+}
+
+def generer_instance(nb_mdc=20, nb_jours=180, nb_equipes=1, chevauchement=0.0, densite_attributs=0.0, distribution_preferences=(0.15, 0.7, 0.15), densite_gras=0.0, densite_soulignes=0.0, graine=0):
+    """
+    Génère une instance synthétique : une liste de ProblemeEquipe (une par équipe).
+
+    - nb_mdc, nb_jours: taille de chaque équipe
+    - chevauchement: proportion des médecins de chaque équipe qui appartiennent à toutes les équipes
+    - densite_attributs: proportion des médecins qui ont l'attribut "A" (0 : pas d'attribut)
+    - distribution_preferences: probabilités d'une préférence (négative, nulle, positive), les valeurs non nulles vont de 1 à 3 en valeur absolue
+    - densite_gras, densite_soulignes: proportion des gardes/astreintes à modifier/fixées.
+      Si l'une des deux est non nulle, chaque équipe part d'un planning initial complet (sinon, planning vide)
+    - graine: même graine et mêmes paramètres = même instance
+    """
+
+    rng = np.random.default_rng(graine)
+    random.seed(graine) # solution_initiale et forcer_contrainte utilisent le module random
+
+    nb_partages = int(round(chevauchement * nb_mdc)) if nb_equipes > 1 else 0
+    partages = [f"P{k:03d}" for k in range(nb_partages)]
+
+    problemes = []
+    for eq in range(nb_equipes):
+        N, D = nb_mdc, nb_jours
+        mdc = partages + [f"E{eq+1}M{k:03d}" for k in range(N - nb_partages)]
+
+        classes = rng.choice(3, size=(N, D), p=distribution_preferences) # 0: négative, 1: nulle, 2: positive
+        valeurs = rng.integers(1, 4, size=(N, D))
+        preferences = np.select([classes == 0, classes == 2], [-valeurs, valeurs], 0).astype(float)
+
+        attributs = {}
+        if densite_attributs > 0:
+            avec_attribut = np.zeros(N, dtype=bool)
+            avec_attribut[rng.choice(N, max(2, int(round(densite_attributs * N))), replace=False)] = True
+            attributs = {'A': avec_attribut.tolist()}
+
+        implications = completer_implications({'gardes': np.full(N, np.nan), 'astreintes': np.full(N, np.nan)}, preferences)
+
+        jours_gras = {'garde': [], 'astreinte': []}
+        jours_soulignes = {'garde': [], 'astreinte': []}
+        if densite_gras > 0 or densite_soulignes > 0:
+            planning_initial = GestionnairePlanning(N, D, preferences).solution_initiale().tolist()
+            tirage = rng.random((2, D))
+            for ligne, shift in enumerate(('garde', 'astreinte')):
+                jours_soulignes[shift] = np.flatnonzero(tirage[ligne] < densite_soulignes).tolist()
+                jours_gras[shift] = np.flatnonzero((tirage[ligne] >= densite_soulignes) & (tirage[ligne] < densite_soulignes + densite_gras)).tolist()
+        else:
+            planning_initial = [-1] * (2 * D)
+
+        problemes.append(ProblemeEquipe(
+            fichier=f"synthetique_{eq+1}",
+            mdc=mdc,
+            preferences=preferences,
+            planning_initial=planning_initial,
+            jours_gras=jours_gras,
+            jours_soulignes=jours_soulignes,
+            toutes_cases_remplies=-1 not in planning_initial,
+            aucune_case_gras=not (jours_gras['garde'] or jours_gras['astreinte']),
+            attributs=attributs,
+            implications=implications,
+        ))
+
+    return problemes
+
+def gestionnaires(problemes, classe=GestionnairePlanning):
+    """
+    GestionnairePlanning de chaque équipe d'une instance (avec les réductions des médecins partagés).
+    classe: GestionnairePlanning ou une sous-classe (cf GestionnaireChronometre)
+    """
+
+    registre = RegistreMedecins([probleme.mdc for probleme in problemes])
+    return [
+        classe(probleme.N, probleme.D, probleme.preferences, registre.reductions(eq), probleme.attributs, probleme.implications,
+              probleme.jours_gras, probleme.jours_soulignes, None if probleme.planning_vide else probleme.planning_initial)
+        for eq, probleme in enumerate(problemes)
+    ]
+
+def mesurer(fonction, arguments, duree_min=0.5):
+    """
+    Appelle fonction(*args) pour chaque args de arguments, en boucle, pendant au moins duree_min secondes.
+    Renvoie le nombre d'appels, la durée et le nombre d'appels par seconde.
+    """
+
+    appels = 0
+    debut = time.perf_counter()
+    while True:
+        for args in arguments:
+            fonction(*args)
+        appels += len(arguments)
+        duree = time.perf_counter() - debut
+        if duree >= duree_min:
+            break
+
+    return {'ops_par_seconde': appels / duree, 'appels': appels, 'duree': duree}
+
+def microbenchmarks(gplan, duree_min=0.5, graine=0, nb_plannings=16):
+    """
+    Mesure les noyaux des métaheuristiques sur un GestionnairePlanning.
+    Les plannings utilisés sont tirés une fois pour toutes (même graine = mêmes entrées).
+    """
+
+    random.seed(graine)
+    np.random.seed(graine)
+
+    N, D = gplan.N, gplan.D
+    jours_gras = gplan.jours_gras
+    sol_initiale = np.array(gplan.planning_initial) if gplan.planning_initial is not None else None
+
+    valides = [gplan.solution_initiale() for _ in range(nb_plannings)] # respectent les contraintes
+    bruts = [np.random.randint(0, N, 2 * D) for _ in range(nb_plannings)] # à réparer
+
+    pheromone = np.ones((N, D, 2))
+    heuristic = heuristique_ant_colony(gplan, sol_initiale, jours_gras)
+
+    noyaux = {
+        'calcule_critere': (gplan.calcule_critere, [(p,) for p in valides]),
+        'forcer_contrainte': (gplan.forcer_contrainte, [(p,) for p in bruts]),
+        'detecte_contrainte': (gplan.detecte_contrainte, [(p,) for p in valides]),
+        'construct_solution': (construct_solution, [(pheromone, heuristic, gplan, ALPHA, BETA, sol_initiale, jours_gras)]),
+        'planning_voisin': (planning_voisin, [(p, gplan, jours_gras) for p in valides]),
+    }
+
+    return {nom: mesurer(fonction, arguments, duree_min) for nom, (fonction, arguments) in noyaux.items()}
+
+SOLVEURS = ['aco_ts', 'recuit', 'genetique']
+
+class GestionnaireChronometre(GestionnairePlanning):
+    """
+    GestionnairePlanning qui note, à chaque évaluation du critère, le meilleur critère atteint jusque-là
+    par un planning valide (qui respecte les contraintes), et l'instant où il a été atteint.
+    Cela permet de suivre n'importe quel solveur sans le modifier.
+    """
+
+    def demarrer(self):
+        self.debut = time.perf_counter()
+        self.meilleur = float('inf')
+        self.trace = [] # [(secondes depuis demarrer, meilleur critère)]
+
+    def noter(self, critere):
+        """
+        Note le critère d'un planning valide s'il bat le meilleur critère atteint jusque-là.
+        """
+
+        if critere < self.meilleur:
+            self.meilleur = critere
+            self.trace.append((time.perf_counter() - self.debut, float(critere)))
+
+    def calcule_critere(self, planning):
+        critere = super().calcule_critere(planning)
+        if critere < self.meilleur and not self.detecte_contrainte(planning):
+            self.noter(critere)
+        return critere
+
+    def trace_recuit(self, methode, iteration, score, meilleur_score, taux_acceptation, evaluations):
+        # le recuit évalue ses voisins par variation du critère (sans calcule_critere) : on suit sa meilleure solution
+        # par sa trace (cf traces.py), sa solution courante respectant toujours les contraintes
+        self.noter(meilleur_score)
+
+    def calcule_critere_lot(self, plannings):
+        # (le génétique évalue ses populations par lots) : on note le meilleur planning valide du lot
+        criteres = super().calcule_critere_lot(plannings)
+        valides = ~self.detecte_contrainte_lot(plannings)
+        if valides.any():
+            self.noter(criteres[valides].min())
+        return criteres
+
+def executer_solveur(solveur, gplan: GestionnaireChronometre, budget, graine=0):
+    """
+    Fait tourner un solveur pendant budget secondes, en repartant de sa meilleure solution tant qu'il reste du temps
+    (comme dans le portfolio, cf solve.py). Renvoie la trace du meilleur critère au fil du temps.
+    """
+
+    random.seed(graine)
+    np.random.seed(graine)
+
+    planning_initial = np.array(gplan.planning_initial) if gplan.planning_initial is not None else None
+    gplan.demarrer()
+    temps_fin = time.time() + budget
+
+    sol = None
+    while time.time() < temps_fin:
+        if solveur == 'aco_ts':
+            if sol is None:
+                resultat, _ = resoudre_aco_tabou(gplan, planning_initial, gplan.jours_gras, temps_limite=temps_fin, afficher=False)
+            else: # ACO déjà faite : on relance seulement la TS
+                resultat, _ = recherche_tabou(NUM_ITERS_T, NUM_VOISINS, MAX_STAGNATION, LEN_TABOU, gplan, sol=sol, max_dist=_max_dist(planning_initial, gplan.jours_gras), planning_initial=planning_initial, jours_gras=gplan.jours_gras, temps_limite=temps_fin, afficher=False)
+        elif solveur == 'recuit':
+            depart = sol if sol is not None else _solution_depart(gplan, planning_initial)
+            resultat, _ = recherche_recuit_simule(gplan=gplan, sol=depart, max_dist=_max_dist(planning_initial, gplan.jours_gras), planning_initial=planning_initial, jours_gras=gplan.jours_gras, temps_limite=temps_fin, trace=gplan.trace_recuit, **PARAMS_RECUIT_PORTFOLIO)
+        else:
+            depart = sol if sol is not None else _solution_depart(gplan, planning_initial)
+            resultat, _ = recherche_algo_genetique(gplan=gplan, sol=depart, temps_limite=temps_fin, **PARAMS_GENETIQUE_PORTFOLIO)
+
+        if sol is None or GestionnairePlanning.calcule_critere(gplan, resultat) < GestionnairePlanning.calcule_critere(gplan, sol):
+            sol = resultat
+
+    return gplan.trace
+
+def critere_a(trace, temps):
+    """
+    Meilleur critère atteint au bout de temps secondes (inf si aucun planning valide).
+    """
+
+    valeurs = [critere for t, critere in trace if t <= temps]
+    return valeurs[-1] if valeurs else float('inf')
+
+def temps_pour_cible(trace, cible):
+    """
+    Premier instant où le critère est <= cible (None si jamais atteint).
+    """
+
+    for t, critere in trace:
+        if critere <= cible:
+            return t
+    return None
+
+def _mediane(valeurs):
+    valeurs = [v for v in valeurs if v is not None and np.isfinite(v)]
+    return float(np.median(valeurs)) if valeurs else None
+
+def lancer_macro(familles=None, solveurs=None, graines=(0, 1, 2), budgets=(5, 10, 20), ecarts=(0.1, 0.05, 0.01), cibles=None, graine_instance=0, afficher=True):
+    """
+    Macro-benchmark : chaque solveur tourne max(budgets) secondes sur la première équipe d'une instance de chaque famille, pour chaque graine.
+
+    cibles: critères à atteindre, par famille ({famille: [cibles]}) ou pour toutes les familles (liste).
+    Si non données, les cibles sont déduites du meilleur critère observé m sur la famille (tous solveurs et graines confondus) :
+    m + écart * |m| pour chaque écart de ecarts.
+
+    Renvoie un dictionnaire sérialisable en JSON : traces, critères après chaque budget, courbes time-to-target
+    (pour chaque cible, la proportion des graines qui l'ont atteinte en fonction du temps) et tableau récapitulatif.
+    """
+
+    if familles is None:
+        familles = list(FAMILLES_INSTANCES)
+    if solveurs is None:
+        solveurs = SOLVEURS
+    budget_max = max(budgets)
+
+    resultats = {}
+    for famille in familles:
+        parametres = FAMILLES_INSTANCES[famille]
+        gplan = gestionnaires(generer_instance(graine=graine_instance, **parametres), classe=GestionnaireChronometre)[0]
+
+        traces = {solveur: {} for solveur in solveurs}
+        for solveur in solveurs:
+            for graine in graines:
+                if afficher:
+                    print(f"\033[1m\033[35m[GARDIEN]\033[0m benchmark {famille} / {solveur} / graine {graine} ({budget_max:g}s)", file=sys.stderr)
+                traces[solveur][graine] = executer_solveur(solveur, gplan, budget_max, graine)
+
+        # cibles de la famille
+        if cibles is None:
+            meilleur = min(critere_a(trace, budget_max) for par_graine in traces.values() for trace in par_graine.values())
+            cibles_famille = [meilleur + ecart * abs(meilleur) for ecart in ecarts] if np.isfinite(meilleur) else []
+        else:
+            cibles_famille = cibles.get(famille, []) if isinstance(cibles, dict) else list(cibles)
+
+        par_solveur = {}
+        for solveur, par_graine in traces.items():
+            criteres_budgets = {str(budget): [critere_a(trace, budget) for trace in par_graine.values()] for budget in budgets}
+
+            courbes = []
+            for cible in cibles_famille:
+                temps = sorted(t for t in (temps_pour_cible(trace, cible) for trace in par_graine.values()) if t is not None)
+                courbes.append({
+                    'cible': cible,
+                    'temps': temps, # temps des graines qui ont atteint la cible
+                    'points': [(t, (k + 1) / len(par_graine)) for k, t in enumerate(temps)], # (temps, proportion des graines ayant atteint la cible)
+                    'taux_succes': len(temps) / len(par_graine),
+                    'temps_median': _mediane(temps) if len(temps) * 2 >= len(par_graine) else None, # médiane sur toutes les graines (None si moins de la moitié a réussi)
+                })
+
+            par_solveur[solveur] = {
+                'traces': {str(graine): trace for graine, trace in par_graine.items()},
+                'criteres_budgets': criteres_budgets,
+                'time_to_target': courbes,
+                'resume': {
+                    'critere_median': {budget: _mediane(valeurs) for budget, valeurs in criteres_budgets.items()},
+                    'taux_succes': [courbe['taux_succes'] for courbe in courbes],
+                    'temps_median': [courbe['temps_median'] for courbe in courbes],
+                },
+            }
+
+        resultats[famille] = {'parametres': parametres, 'cibles': cibles_famille, 'solveurs': par_solveur}
+
+    return {
+        'type': 'macro',
+        'graines': list(graines),
+        'graine_instance': graine_instance,
+        'budgets': list(budgets),
+        'environnement': _environnement(),
+        'familles': resultats,
+    }
+
+def tableau_macro(resultat):
+    """
+    Tableau récapitulatif (texte) d'un macro-benchmark : critère médian après chaque budget,
+    puis taux de succès et temps médian pour chaque cible.
+    """
+
+    lignes = []
+    for famille, res_famille in resultat['familles'].items():
+        cibles = res_famille['cibles']
+        entetes = ["solveur"] + [f"critère@{budget:g}s" for budget in resultat['budgets']] + [f"cible {cible:.0f}" for cible in cibles]
+        lignes.append(f"{famille} {res_famille['parametres']}")
+        lignes.append(" | ".join(entetes))
+        lignes.append(" | ".join("---" for _ in entetes))
+        for solveur, res_solveur in res_famille['solveurs'].items():
+            resume = res_solveur['resume']
+            cellules = [solveur]
+            cellules += ["-" if critere is None else f"{critere:.0f}" for critere in resume['critere_median'].values()]
+            cellules += [f"{taux:.0%} ({'-' if temps is None else f'{temps:.2f}s'})" for taux, temps in zip(resume['taux_succes'], resume['temps_median'])]
+            lignes.append(" | ".join(cellules))
+        lignes.append("")
+    return "\n".join(lignes)
+
+def _environnement():
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'systeme': platform.platform(),
+    }
+
+def lancer_micro(familles=None, duree_min=0.5, graine=0):
+    """
+    Micro-benchmarks sur chaque famille d'instances (première équipe de l'instance). Renvoie un dictionnaire sérialisable en JSON.
+    """
+
+    if familles is None:
+        familles = list(FAMILLES_INSTANCES)
+
+    resultats = {}
+    for famille in familles:
+        parametres = FAMILLES_INSTANCES[famille]
+        gplan = gestionnaires(generer_instance(graine=graine, **parametres))[0]
+        resultats[famille] = {'parametres': parametres, 'noyaux': microbenchmarks(gplan, duree_min, graine)}
+
+    return {'type': 'micro', 'graine': graine, 'duree_min': duree_min, 'environnement': _environnement(), 'familles': resultats}
+
+def _ecrire_json(resultat, sortie):
+    texte = json.dumps(resultat, indent=2, ensure_ascii=False)
+    if sortie is None:
+        print(texte)
+    else:
+        with open(sortie, 'w', encoding='utf-8') as f:
+            f.write(texte + "\n")
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de Gardien sur des instances synthétiques.")
+    sous_parsers = parser.add_subparsers(dest='commande', required=True)
+
+    micro = sous_parsers.add_parser('micro', help="appels par seconde des fonctions les plus utilisées")
+    micro.add_argument('--familles', nargs='+', choices=list(FAMILLES_INSTANCES), default=None, help="familles d'instances (toutes par défaut)")
+    micro.add_argument('--duree', type=float, default=0.5, help="durée minimale de mesure de chaque fonction, en secondes")
+    micro.add_argument('--graine', type=int, default=0)
+    micro.add_argument('--sortie', default=None, help="fichier JSON de sortie (sinon, affiché)")
+
+    macro = sous_parsers.add_parser('macro', help="temps pour atteindre un critère cible et critère final après un budget de temps, par solveur")
+    macro.add_argument('--familles', nargs='+', choices=list(FAMILLES_INSTANCES), default=None, help="familles d'instances (toutes par défaut)")
+    macro.add_argument('--solveurs', nargs='+', choices=SOLVEURS, default=None, help="solveurs comparés (tous par défaut)")
+    macro.add_argument('--graines', nargs='+', type=int, default=[0, 1, 2], help="graines des solveurs")
+    macro.add_argument('--graine-instance', type=int, default=0, help="graine des instances générées")
+    macro.add_argument('--budgets', nargs='+', type=float, default=[5, 10, 20], help="budgets de temps en secondes (chaque exécution dure le plus grand)")
+    macro.add_argument('--ecarts', nargs='+', type=float, default=[0.1, 0.05, 0.01], help="cibles relatives au meilleur critère observé")
+    macro.add_argument('--cibles', nargs='+', type=float, default=None, help="cibles absolues (remplacent --ecarts)")
+    macro.add_argument('--sortie', default=None, help="fichier JSON de sortie (sinon, affiché)")
+
+    args = parser.parse_args(argv)
+
+    if args.commande == 'micro':
+        _ecrire_json(lancer_micro(args.familles, args.duree, args.graine), args.sortie)
+    else:
+        resultat = lancer_macro(args.familles, args.solveurs, args.graines, args.budgets, args.ecarts, args.cibles, args.graine_instance)
+        print(tableau_macro(resultat), file=sys.stderr)
+        _ecrire_json(resultat, args.sortie)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(cli())
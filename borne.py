@@ -0,0 +1,171 @@
+import numpy as np
+
+from config import *
+
+"""
+Borne inférieure du critère (calcule_critere) d'une équipe : aucun planning qui respecte les contraintes ne peut faire mieux.
+
+Chaque terme du critère est minoré séparément (la somme des minorants est un minorant de la somme) :
+-préférences et attributs, jour par jour : on cherche le meilleur couple (garde, astreinte) de chaque jour pris isolément,
+ en ignorant tout ce qui lie les jours entre eux (jour off, répartition, écarts)
+-répartition et écarts, médecin par médecin : la pénalité d'un médecin ne dépend (au mieux) que de son nombre de gardes k
+ (PENALITE_CRITERE_MAUVAISE_REPART*(cible-k)², et des écarts qui valent au moins PENALITE_CRITERE_ECART*(k-1)²/(D-1),
+ puisque les k-1 écarts entre ses gardes tiennent dans D-1 jours). Ces fonctions étant convexes en k, la meilleure
+ répartition des D gardes (nombres entiers) s'obtient en donnant les gardes une par une au médecin pour qui elle coûte le moins.
+ Idem pour les astreintes (sans les écarts).
+
+Quand peu de médecins ont un attribut, la première borne est trop optimiste : chaque jour pris isolément peut être couvert,
+mais pas tous les jours à la fois sans trop charger ces médecins. On calcule donc aussi, pour chaque attribut,
+une seconde borne où les attributs sont comptés avec la répartition : si les médecins qui ont l'attribut font s gardes et astreintes
+en tout, au moins D-s jours sont sans attribut. La borne renvoyée est la meilleure (la plus grande) des bornes.
+
+Les cases soulignées (fixées) sont prises en compte : médecin imposé, et pas de coût de préférence (cf calcule_critere).
+
+La borne sert à arrêter les recherches dès que l'écart entre la meilleure solution trouvée et la borne
+est inférieur à TOLERANCE_ECART (cf borne_atteinte) : sur les équipes faciles, la borne est atteinte (ou presque)
+en quelques secondes et il est inutile de continuer à chercher.
+"""
+
+TOLERANCE_ECART = 0.02 # écart relatif toléré entre le critère et la borne inférieure (0 : seulement si la borne est atteinte, None : jamais d'arrêt)
+
+def _cout_jours(gplan, attributs=True):
+    """
+    Minorant, pour chaque jour, de la somme des coûts de préférences (garde et astreinte) et de la pénalité d'attributs
+    (sans la pénalité d'attributs si attributs=False).
+    """
+
+    N, D = gplan.N, gplan.D
+    preferences = np.asarray(gplan.preferences, dtype=float)
+
+    cout_gardes = np.select([preferences < 0, preferences == 0], [PENALITE_CRITERE_PREF_NEG * preferences**2, PENALITE_CRITERE_PREF_NULLE], -BONUS_CRITERE_PREF_POS * preferences**2)
+    cout_astreintes = np.where(preferences < SEUIL_PREF_NEG_ASTREINTE, PENALITE_CRITERE_PREF_NEG * preferences**2, 0.0)
+
+    # pénalité d'attributs de chaque couple (mdc de garde, mdc d'astreinte)
+    penalites = np.zeros((N, N))
+    for mdc_avec_attribut in (gplan.attributs.values() if attributs else []):
+        sans = ~np.asarray(mdc_avec_attribut, dtype=bool)
+        penalites += PENALITE_CRITERE_ATTRIBUT_MANQUANT * np.outer(sans, sans)
+    np.fill_diagonal(penalites, np.inf) # même médecin en garde et en astreinte
+
+    planning_initial = gplan.planning_initial
+    couts = np.zeros(D)
+    for t in range(D):
+        garde = cout_gardes[:, t].copy()
+        astreinte = cout_astreintes[:, t].copy()
+
+        # cases soulignées : médecin imposé, sans coût de préférence
+        if planning_initial is not None:
+            if t in gplan.jours_soulignes['garde']:
+                garde[:] = np.inf
+                garde[planning_initial[t]] = 0
+            elif t in gplan.jours_gras['garde'] and planning_initial[t] != -1:
+                garde[planning_initial[t]] = np.inf
+            if t in gplan.jours_soulignes['astreinte']:
+                astreinte[:] = np.inf
+                astreinte[planning_initial[D + t]] = 0
+            elif t in gplan.jours_gras['astreinte'] and planning_initial[D + t] != -1:
+                astreinte[planning_initial[D + t]] = np.inf
+
+        couts[t] = np.min(garde[:, None] + astreinte[None, :] + penalites)
+
+    return couts
+
+def _repartitions_minimales(penalite, minimums, total):
+    """
+    Pour s = 0..total, minimum de sum_i penalite(k)_i sur les entiers k_i >= minimums[i] avec sum_i k_i = s (inf si s < sum(minimums)),
+    pour une pénalité convexe en k : on attribue les unités une par une, à chaque fois au médecin pour qui elle coûte le moins.
+    penalite: fonction (k: tableau de taille N) -> tableau de taille N
+    """
+
+    minimums = np.asarray(minimums, dtype=int)
+    couts = np.full(total + 1, np.inf)
+    if minimums.size == 0:
+        couts[0] = 0.0
+        return couts
+
+    k = minimums.copy()
+    depart = int(k.sum())
+    if depart > total:
+        return couts
+    couts[depart] = np.sum(penalite(k))
+    for s in range(depart + 1, total + 1):
+        marginal = penalite(k + 1) - penalite(k)
+        i = np.argmin(marginal)
+        k[i] += 1
+        couts[s] = couts[s - 1] + marginal[i]
+    return couts
+
+def borne_inferieure(gplan):
+    """
+    Borne inférieure du critère de l'équipe (cf commentaire en haut du fichier).
+    """
+
+    N, D = gplan.N, gplan.D
+    cibles_gardes, cibles_astreintes = gplan.cibles_repartition()
+    cibles_gardes, cibles_astreintes = np.asarray(cibles_gardes, dtype=float), np.asarray(cibles_astreintes, dtype=float)
+
+    # nombres minimaux de gardes et d'astreintes de chaque médecin (ses cases soulignées)
+    min_gardes = np.zeros(N, dtype=int)
+    min_astreintes = np.zeros(N, dtype=int)
+    if gplan.planning_initial is not None:
+        for t in gplan.jours_soulignes['garde']:
+            min_gardes[gplan.planning_initial[t]] += 1
+        for t in gplan.jours_soulignes['astreinte']:
+            min_astreintes[gplan.planning_initial[D + t]] += 1
+
+    # pénalités de répartition (et d'écarts) des médecins mdc en fonction de leurs nombres de gardes/astreintes k
+    def penalite_gardes(k, mdc=slice(None)):
+        penalite = PENALITE_CRITERE_MAUVAISE_REPART * (cibles_gardes[mdc] - k)**2
+        if D > 1:
+            penalite = penalite + PENALITE_CRITERE_ECART * np.maximum(k - 1, 0)**2 / (D - 1)
+        return penalite
+
+    def penalite_astreintes(k, mdc=slice(None)):
+        return PENALITE_CRITERE_MAUVAISE_REPART * (cibles_astreintes[mdc] - k)**2
+
+    # première borne : préférences et attributs jour par jour, puis répartition
+    borne = np.sum(_cout_jours(gplan))
+    borne += _repartitions_minimales(penalite_gardes, min_gardes, D)[D]
+    borne += _repartitions_minimales(penalite_astreintes, min_astreintes, D)[D]
+
+    # seconde borne (pour chaque attribut) : préférences jour par jour, puis répartition avec les jours sans attribut
+    if gplan.attributs:
+        cout_preferences = np.sum(_cout_jours(gplan, attributs=False))
+        for mdc_avec_attribut in gplan.attributs.values():
+            avec = np.asarray(mdc_avec_attribut, dtype=bool)
+
+            # G[s] : meilleure répartition des gardes quand les médecins avec l'attribut en font s (idem A pour les astreintes)
+            G = _repartitions_minimales(lambda k: penalite_gardes(k, avec), min_gardes[avec], D) \
+                + _repartitions_minimales(lambda k: penalite_gardes(k, ~avec), min_gardes[~avec], D)[::-1]
+            A = _repartitions_minimales(lambda k: penalite_astreintes(k, avec), min_astreintes[avec], D) \
+                + _repartitions_minimales(lambda k: penalite_astreintes(k, ~avec), min_astreintes[~avec], D)[::-1]
+
+            s = np.arange(D + 1)
+            jours_sans = np.maximum(D - (s[:, None] + s[None, :]), 0)
+            repartition = np.min(G[:, None] + A[None, :] + PENALITE_CRITERE_ATTRIBUT_MANQUANT * jours_sans)
+            borne = max(borne, cout_preferences + repartition)
+
+    return float(borne)
+
+def ecart_relatif(critere, borne):
+    """
+    Écart entre un critère et la borne inférieure, relatif à la borne (à 1 près, pour les bornes proches de 0).
+    """
+
+    return (critere - borne) / max(abs(borne), 1.0)
+
+def borne_atteinte(critere, borne):
+    """
+    True si le critère est à moins de TOLERANCE_ECART de la borne (False si pas de borne, ou si TOLERANCE_ECART vaut None).
+    """
+
+    return borne is not None and TOLERANCE_ECART is not None and ecart_relatif(critere, borne) <= TOLERANCE_ECART
+
+def texte_ecart(critere, borne):
+    """
+    Écart à la borne pour les barres de progression (chaîne vide si pas de borne).
+    """
+
+    if borne is None:
+        return ""
+    return f" \033[2m(écart à la borne: {100 * ecart_relatif(critere, borne):.0f}%)\033[0m"
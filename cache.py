@@ -0,0 +1,159 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+from probleme import ProblemeEquipe, masque_jours, jours_masque
+from lecture import charger_classeurs
+
+"""
+Cache binaire des fichiers Excel déjà lus.
+
+Relire un classeur avec openpyxl est lent (surtout sur un lecteur réseau) alors que la plupart des fichiers
+ne changent pas d'une exécution à l'autre. On stocke donc chaque équipe lue dans un répertoire de cache
+placé à côté des fichiers d'entrée (DOSSIER_CACHE), sous forme d'une archive NumPy :
+un répertoire par fichier contenant un .npy par tableau (np.load ne sait pas mapper en mémoire un .npz)
+et un meta.json pour le reste (noms des médecins et des attributs, clé du cache).
+
+Une entrée est valide si la taille, la date de modification et le hash (sha256) du contenu correspondent au fichier.
+Si la taille et la date sont identiques, on ne recalcule pas le hash (cas le plus fréquent).
+Les tableaux sont chargés en mémoire mappée (mmap_mode='r').
+"""
+
+DOSSIER_CACHE = '.gardien_cache'
+VERSION_CACHE = 2 # à incrémenter si le format des entrées change, ou si la lecture (cf lecture.py) donne un autre résultat pour le même fichier
+
+def _hash_fichier(chemin):
+    h = hashlib.sha256()
+    with open(chemin, 'rb') as f:
+        for bloc in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloc)
+    return h.hexdigest()
+
+def _dossier_entree(dossier_cache, chemin):
+    return os.path.join(dossier_cache, os.path.basename(chemin))
+
+def _lire_meta(dossier):
+    try:
+        with open(os.path.join(dossier, 'meta.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def lire_cache(dossier_cache, chemin):
+    """
+    Renvoie le ProblemeEquipe en cache pour ce fichier, ou None si l'entrée est absente ou périmée.
+    """
+
+    dossier = _dossier_entree(dossier_cache, chemin)
+    meta = _lire_meta(dossier)
+    if meta is None or meta.get('version') != VERSION_CACHE:
+        return None
+
+    stat = os.stat(chemin)
+    if meta['taille'] != stat.st_size:
+        return None
+
+    if meta['mtime_ns'] != stat.st_mtime_ns:
+        # fichier "touché" (copie, synchronisation...) : on vérifie le contenu
+        if meta['sha256'] != _hash_fichier(chemin):
+            return None
+        meta['mtime_ns'] = stat.st_mtime_ns
+        try:
+            _ecrire_meta(dossier, meta)
+        except OSError:
+            pass
+
+    def charger(nom):
+        return np.load(os.path.join(dossier, f"{nom}.npy"), mmap_mode='r')
+
+    gras = charger('gras') # (2, D)
+    soulignes = charger('soulignes')
+    attributs = charger('attributs') # (nombre d'attributs, N)
+    implications = charger('implications') # (2, N) : gardes puis astreintes
+
+    return ProblemeEquipe(
+        fichier=os.path.basename(chemin),
+        mdc=meta['mdc'],
+        preferences=charger('preferences'),
+        planning_initial=charger('planning_initial').tolist(),
+        jours_gras=jours_masque(gras),
+        jours_soulignes=jours_masque(soulignes),
+        toutes_cases_remplies=meta['toutes_cases_remplies'],
+        aucune_case_gras=meta['aucune_case_gras'],
+        attributs={nom: attributs[k].tolist() for k, nom in enumerate(meta['attributs'])},
+        implications={'gardes': implications[0], 'astreintes': implications[1]},
+    )
+
+def _ecrire_meta(dossier, meta):
+    with open(os.path.join(dossier, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+def ecrire_cache(dossier_cache, chemin, probleme: ProblemeEquipe):
+    """
+    Enregistre un ProblemeEquipe dans le cache.
+    L'entrée est écrite dans un répertoire temporaire puis renommée, pour ne jamais laisser d'entrée à moitié écrite.
+    """
+
+    stat = os.stat(chemin)
+
+    tableaux = {
+        'preferences': np.asarray(probleme.preferences, dtype=float),
+        'planning_initial': np.asarray(probleme.planning_initial, dtype=np.int64),
+        'gras': masque_jours(probleme.jours_gras, probleme.D),
+        'soulignes': masque_jours(probleme.jours_soulignes, probleme.D),
+        'attributs': np.array(list(probleme.attributs.values()), dtype=bool).reshape(len(probleme.attributs), probleme.N),
+        'implications': np.stack([probleme.implications['gardes'], probleme.implications['astreintes']]).astype(float),
+    }
+    meta = {
+        'version': VERSION_CACHE,
+        'taille': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': _hash_fichier(chemin),
+        'mdc': list(probleme.mdc),
+        'attributs': list(probleme.attributs.keys()),
+        'toutes_cases_remplies': probleme.toutes_cases_remplies,
+        'aucune_case_gras': probleme.aucune_case_gras,
+    }
+
+    dossier = _dossier_entree(dossier_cache, chemin)
+    dossier_tmp = None
+    try:
+        os.makedirs(dossier_cache, exist_ok=True)
+        dossier_tmp = tempfile.mkdtemp(dir=dossier_cache, prefix='.tmp-')
+        for nom, tableau in tableaux.items():
+            np.save(os.path.join(dossier_tmp, f"{nom}.npy"), tableau)
+        _ecrire_meta(dossier_tmp, meta)
+
+        if os.path.isdir(dossier):
+            shutil.rmtree(dossier)
+        os.replace(dossier_tmp, dossier)
+    except OSError:
+        # le cache n'est qu'une optimisation : on ne bloque pas l'exécution s'il n'est pas accessible en écriture
+        if dossier_tmp is not None:
+            shutil.rmtree(dossier_tmp, ignore_errors=True)
+
+def charger_classeurs_caches(chemins, dossier_cache=None, nb_processus=None):
+    """
+    Comme lecture.charger_classeurs, mais en passant par le cache :
+    seuls les fichiers absents du cache (ou modifiés) sont relus, puis ajoutés au cache.
+    Par défaut, le cache est placé dans le répertoire du premier fichier.
+    """
+
+    if not chemins:
+        return []
+
+    if dossier_cache is None:
+        dossier_cache = os.path.join(os.path.dirname(os.path.abspath(chemins[0])), DOSSIER_CACHE)
+
+    problemes = [lire_cache(dossier_cache, chemin) for chemin in chemins]
+
+    a_lire = [k for k, probleme in enumerate(problemes) if probleme is None]
+    lus = charger_classeurs([chemins[k] for k in a_lire], nb_processus=nb_processus)
+    for k, probleme in zip(a_lire, lus):
+        ecrire_cache(dossier_cache, chemins[k], probleme)
+        problemes[k] = probleme
+
+    return problemes
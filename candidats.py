@@ -0,0 +1,90 @@
+import random
+import numpy as np
+
+from config import SEUIL_PREF_NEG_ASTREINTE, NEG_PREF_TEAM
+
+"""
+Listes de candidats : pour chaque jour et chaque type de créneau (garde/astreinte),
+les k médecins les plus plausibles, calculées une fois pour toutes à partir des préférences.
+
+Sans ces listes, l'ACO (construct_solution) et les voisinages du tabou et du recuit tirent parmi les N médecins,
+y compris ceux que le critère rejette presque toujours :
+-médecins déjà pris dans une autre équipe ce jour-là (préférence NEG_PREF_TEAM, cf solve._bloquer_autres_equipes)
+-médecins avec une préférence < SEUIL_PREF_NEG_ASTREINTE (pénalité PENALITE_CRITERE_PREF_NEG*pref², garde comme astreinte)
+-le médecin initial d'un jour en gras (il doit être remplacé)
+Pour de grandes équipes (60+ médecins), la plupart des tirages sont alors perdus.
+
+Classement (coût croissant) :
+-garde : -préférence (les médecins qui veulent la garde d'abord)
+-astreinte : tous les médecins plausibles sont équivalents (les préférences ne comptent pas pour les astreintes)
+Les égalités sont départagées au hasard, différemment chaque jour : avec k < N, un médecin de préférence nulle
+n'est pas exclu tous les jours (ce qui fausserait la répartition des gardes).
+
+Avec une probabilité P_EXPLORATION, le tirage se fait parmi tous les médecins (pour ne jamais s'interdire une solution).
+"""
+
+K_CANDIDATS = 12 # taille maximale de chaque liste
+P_EXPLORATION = 0.05 # probabilité de tirer en dehors de la liste
+
+class ListesCandidats:
+    def __init__(self, preferences, k=K_CANDIDATS, exploration=P_EXPLORATION, planning_initial=None, jours_gras=None):
+        """
+        preferences: (N, D)
+        planning_initial, jours_gras: les médecins initiaux des jours en gras sont retirés des listes
+        """
+
+        preferences = np.asarray(preferences, dtype=float)
+        N, D = preferences.shape
+        self.N = N
+        self.D = D
+        self.k = min(k, N)
+        self.exploration = exploration
+
+        # coûts (N, D, 2), inf pour les médecins non plausibles
+        implausible = (preferences <= NEG_PREF_TEAM) | (preferences < SEUIL_PREF_NEG_ASTREINTE)
+        cout = np.stack((-preferences, np.zeros_like(preferences)), axis=2)
+        cout[implausible] = np.inf
+
+        if planning_initial is not None and jours_gras is not None:
+            planning_initial = np.asarray(planning_initial)
+            for s, type_creneau in enumerate(['garde', 'astreinte']):
+                for t in jours_gras[type_creneau]:
+                    mdc_initial = planning_initial[s * D + t]
+                    if mdc_initial != -1:
+                        cout[mdc_initial, t, s] = np.inf
+
+        # tri par coût croissant (égalités départagées au hasard), puis on garde les k premiers de chaque créneau
+        alea = np.random.random_sample(cout.shape)
+        ordre = np.lexsort((alea, cout), axis=0) # (N, D, 2)
+        self.candidats = np.ascontiguousarray(ordre[:self.k].transpose(1, 2, 0)) # (D, 2, k)
+
+        # nombre de candidats plausibles de chaque créneau (si aucun, on garde quand même les k moins mauvais)
+        nb_plausibles = np.sum(np.isfinite(cout), axis=0) # (D, 2)
+        self.nb = np.where(nb_plausibles > 0, np.minimum(nb_plausibles, self.k), self.k)
+
+    def liste(self, jour, type_creneau):
+        """
+        Candidats du créneau (type_creneau: 0 pour la garde, 1 pour l'astreinte), du plus plausible au moins plausible.
+        """
+
+        return self.candidats[jour, type_creneau, :self.nb[jour, type_creneau]]
+
+    def disponibles(self, jour, type_creneau, exclus=()):
+        """
+        Médecins parmi lesquels tirer pour ce créneau : la liste de candidats (ou tous les médecins avec une probabilité
+        exploration, ou si tous les candidats sont exclus), sans les médecins exclus.
+        """
+
+        if random.random() >= self.exploration:
+            disponibles = [int(i) for i in self.liste(jour, type_creneau) if i not in exclus]
+            if disponibles:
+                return disponibles
+        return [i for i in range(self.N) if i not in exclus]
+
+    def tirer(self, jour, type_creneau, exclus=()):
+        """
+        Un médecin au hasard pour ce créneau (cf disponibles). Si tous les médecins sont exclus, un médecin au hasard.
+        """
+
+        disponibles = self.disponibles(jour, type_creneau, exclus)
+        return random.choice(disponibles) if disponibles else random.randrange(self.N)
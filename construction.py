@@ -0,0 +1,234 @@
+import numpy as np
+
+from config import *
+
+"""
+Construction d'un planning de départ de bonne qualité (au lieu d'un planning aléatoire réparé, cf solution_initiale).
+
+Le planning est construit en deux passes, chacune étant un problème d'affectation de coût minimal (méthode hongroise) :
+1) gardes : chaque jour à remplir reçoit un médecin, d'après le coût des préférences (le même que dans calcule_critere).
+   Chaque médecin est dupliqué en autant d'exemplaires qu'il peut prendre de gardes : son k-ième exemplaire coûte en plus
+   l'augmentation de la pénalité de mauvaise répartition (PENALITE_CRITERE_MAUVAISE_REPART*(cible - nb)²) quand il passe
+   de k-1 à k gardes. Les exemplaires au-delà de la cible (implications['gardes']) coûtent donc de plus en plus cher.
+   L'affectation ignore les interactions entre jours (jour off après la garde, petits écarts) : on les corrige ensuite
+   par des échanges de gardes entre jours à remplir (ce qui ne change pas le nombre de gardes de chaque médecin).
+2) astreintes : même principe, une fois les gardes connues, ce qui permet d'interdire le médecin de garde le jour même
+   et celui de garde la veille (jour off), et de tenir compte des attributs (cf penalite_attributs).
+
+Les cases remplies du planning initial qui ne sont pas en gras sont gardées telles quelles (comme dans construct_solution),
+et le médecin initial d'un jour en gras est interdit.
+Les éventuelles contraintes restantes (cas très contraints) sont réglées par forcer_contrainte.
+"""
+
+COUT_INTERDIT = 1e9 # coût d'une affectation interdite (fini, pour que la méthode hongroise reste bien définie)
+MARGE_EXEMPLAIRES = 2 # nombre d'exemplaires de chaque médecin au-delà de sa cible (plus pour les astreintes des médecins avec attribut)
+
+def affectation_cout_minimal(couts):
+    """
+    Méthode hongroise (algorithme de Kuhn-Munkres, en O(n²m)) pour une matrice de coûts (n, m) avec n <= m.
+    Renvoie, pour chaque ligne, la colonne qui lui est affectée (chaque colonne est utilisée au plus une fois)
+    de façon à minimiser la somme des coûts.
+    """
+
+    couts = np.asarray(couts, dtype=float)
+    n, m = couts.shape
+    if n > m:
+        raise ValueError(f"Affectation impossible : {n} lignes pour {m} colonnes")
+
+    # potentiels des lignes (u) et des colonnes (v), indices décalés de 1 (la colonne 0 est fictive)
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    ligne_de = np.zeros(m + 1, dtype=int) # ligne affectée à chaque colonne (0 : aucune)
+    precedent = np.zeros(m + 1, dtype=int)
+
+    # départ : chaque ligne prend sa colonne la moins chère si elle est encore libre (u = minimum de la ligne)
+    # les lignes restantes sont ensuite ajoutées une par une par chemins augmentants
+    u[1:] = couts.min(axis=1)
+    a_placer = []
+    for i in range(1, n + 1):
+        j = int(np.argmin(couts[i - 1])) + 1
+        if ligne_de[j] == 0:
+            ligne_de[j] = i
+        else:
+            a_placer.append(i)
+
+    for i in a_placer:
+        ligne_de[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        utilisee = np.zeros(m + 1, dtype=bool)
+
+        # plus court chemin augmentant depuis la ligne i (Dijkstra sur les coûts réduits)
+        while True:
+            utilisee[j0] = True
+            i0 = ligne_de[j0]
+            reduits = couts[i0 - 1] - u[i0] - v[1:]
+            a_jour = ~utilisee[1:] & (reduits < minv[1:])
+            minv[1:][a_jour] = reduits[a_jour]
+            precedent[1:][a_jour] = j0
+
+            candidats = np.where(utilisee[1:], np.inf, minv[1:])
+            j1 = int(np.argmin(candidats)) + 1
+            delta = candidats[j1 - 1]
+
+            u[ligne_de[utilisee]] += delta
+            v[utilisee] -= delta
+            minv[~utilisee] -= delta
+
+            j0 = j1
+            if ligne_de[j0] == 0:
+                break
+
+        # on inverse le chemin augmentant
+        while j0:
+            j1 = precedent[j0]
+            ligne_de[j0] = ligne_de[j1]
+            j0 = j1
+
+    colonnes = np.empty(n, dtype=int)
+    for j in range(1, m + 1):
+        if ligne_de[j]:
+            colonnes[ligne_de[j] - 1] = j - 1
+    return colonnes
+
+def _affecter(couts, nb_deja, cibles, marges):
+    """
+    Affecte un médecin à chaque jour à remplir (une ligne de couts (nb_jours, N) par jour), avec la pénalité
+    de mauvaise répartition (cf commentaire en haut du fichier).
+    nb_deja: nombre de créneaux déjà attribués à chaque médecin (cases gardées), cibles: nombre cible de créneaux
+    marges: nombre d'exemplaires de chaque médecin au-delà de sa cible
+    """
+
+    nb_jours, N = couts.shape
+    if nb_jours == 0:
+        return np.zeros(0, dtype=int)
+
+    manque = np.ceil(np.maximum(cibles - nb_deja, 0)).astype(int)
+    marge = np.asarray(marges, dtype=int)
+    while np.sum(np.minimum(manque + marge, nb_jours)) < nb_jours:
+        marge = marge + 1
+    nb_exemplaires = np.minimum(manque + marge, nb_jours)
+
+    mdc_colonnes = np.repeat(np.arange(N), nb_exemplaires)
+    rang = np.concatenate([np.arange(k) for k in nb_exemplaires]) # k-ième exemplaire du médecin (à partir de 0)
+    nb_apres = nb_deja[mdc_colonnes] + rang
+    surcout = PENALITE_CRITERE_MAUVAISE_REPART * (2 * (nb_apres - cibles[mdc_colonnes]) + 1) # (cible-(nb+1))² - (cible-nb)²
+
+    colonnes = affectation_cout_minimal(couts[:, mdc_colonnes] + surcout[None, :])
+    return mdc_colonnes[colonnes]
+
+def _cout_gardes(preferences):
+    """
+    Coût (N, D) de chaque médecin pour chaque garde, d'après les préférences (cf calcule_critere).
+    """
+
+    return np.select([preferences < 0, preferences == 0], [PENALITE_CRITERE_PREF_NEG * preferences**2, PENALITE_CRITERE_PREF_NULLE], -BONUS_CRITERE_PREF_POS * preferences**2)
+
+def _penalite_ecarts(jours):
+    """
+    Pénalité des écarts entre les gardes (triées) d'un même médecin (cf calcule_soft_critere),
+    avec deux gardes d'affilée interdites si la contrainte de jour off est active.
+    """
+
+    ecarts = np.diff(jours)
+    penalite = np.sum(PENALITE_CRITERE_ECART / ecarts) + PENALITE_CRITERE_PETIT_ECART * np.sum(ecarts < PETIT_ECART)
+    if ENABLE_OFF_AFTER_GARDE:
+        penalite += COUT_INTERDIT * np.sum(ecarts == 1)
+    return penalite
+
+def _echanger_gardes(gardes, libres, cout):
+    """
+    Seconde passe sur les gardes : pour chaque garde à remplir trop proche d'une autre garde du même médecin,
+    on cherche l'échange avec un autre jour à remplir qui fait le plus baisser le coût (préférences et écarts).
+    cout: (N, D), COUT_INTERDIT pour les affectations interdites
+    """
+
+    def cout_medecin(mdc, planning):
+        jours = np.flatnonzero(planning == mdc)
+        return np.sum(cout[mdc, jours]) + _penalite_ecarts(jours)
+
+    for t in libres:
+        mdc = gardes[t]
+        voisins = gardes[max(t - PETIT_ECART + 1, 0):t + PETIT_ECART]
+        if np.sum(voisins == mdc) <= 1:
+            continue
+
+        meilleur_gain, meilleur_u = 0, None
+        for u in libres:
+            autre = gardes[u]
+            if autre == mdc:
+                continue
+            avant = cout_medecin(mdc, gardes) + cout_medecin(autre, gardes)
+            gardes[t], gardes[u] = autre, mdc
+            gain = avant - cout_medecin(mdc, gardes) - cout_medecin(autre, gardes)
+            gardes[t], gardes[u] = mdc, autre
+            if gain > meilleur_gain:
+                meilleur_gain, meilleur_u = gain, u
+
+        if meilleur_u is not None:
+            gardes[t], gardes[meilleur_u] = gardes[meilleur_u], mdc
+
+def solution_construite(gplan, planning_initial=None, jours_gras=None):
+    """
+    Planning de départ construit par affectations de coût minimal (cf commentaire en haut du fichier).
+    Le planning renvoyé respecte les contraintes.
+    """
+
+    N, D = gplan.N, gplan.D
+    preferences = np.asarray(gplan.preferences, dtype=float)
+    if jours_gras is None:
+        jours_gras = {'garde': [], 'astreinte': []}
+
+    planning = np.full(2 * D, -1, dtype=int) if planning_initial is None else np.array(planning_initial, dtype=int)
+    initial = planning.copy()
+    gardes, astreintes = planning[:D], planning[D:] # vues sur planning
+
+    libres_gardes = np.array([t for t in range(D) if gardes[t] == -1 or t in jours_gras['garde']], dtype=int)
+    libres_astreintes = np.array([t for t in range(D) if astreintes[t] == -1 or t in jours_gras['astreinte']], dtype=int)
+    gardes[libres_gardes] = -1
+    astreintes[libres_astreintes] = -1
+
+    cibles_gardes, cibles_astreintes = gplan.cibles_repartition()
+    cibles_gardes, cibles_astreintes = np.asarray(cibles_gardes, dtype=float), np.asarray(cibles_astreintes, dtype=float)
+
+    # ---- première passe : gardes ----
+    cout = _cout_gardes(preferences)
+    for t in jours_gras['garde']:
+        if initial[t] != -1:
+            cout[initial[t], t] = COUT_INTERDIT
+    for t in range(D):
+        if astreintes[t] != -1: # astreinte gardée le jour même
+            cout[astreintes[t], t] = COUT_INTERDIT
+        if ENABLE_OFF_AFTER_GARDE and t+1 < D and astreintes[t+1] != -1: # astreinte gardée le lendemain
+            cout[astreintes[t+1], t] = COUT_INTERDIT
+        if ENABLE_OFF_AFTER_GARDE: # garde gardée la veille ou le lendemain
+            for voisin in (t-1, t+1):
+                if 0 <= voisin < D and gardes[voisin] != -1:
+                    cout[gardes[voisin], t] = COUT_INTERDIT
+
+    nb_gardes = np.bincount(gardes[gardes != -1], minlength=N)
+    gardes[libres_gardes] = _affecter(cout[:, libres_gardes].T, nb_gardes, cibles_gardes, np.full(N, MARGE_EXEMPLAIRES))
+    _echanger_gardes(gardes, libres_gardes, cout)
+
+    # ---- seconde passe : astreintes ----
+    cout = np.where(preferences < SEUIL_PREF_NEG_ASTREINTE, PENALITE_CRITERE_PREF_NEG * preferences**2, 0.0)
+    for mdc in range(N):
+        cout[mdc] += [gplan.penalite_attributs(gardes[t], mdc) for t in range(D)]
+    for t in range(D):
+        cout[gardes[t], t] = COUT_INTERDIT
+        if ENABLE_OFF_AFTER_GARDE and t > 0:
+            cout[gardes[t-1], t] = COUT_INTERDIT
+    for t in jours_gras['astreinte']:
+        if initial[D + t] != -1:
+            cout[initial[D + t], t] = COUT_INTERDIT
+
+    # les médecins qui ont un attribut peuvent dépasser leur cible tant que le surcoût reste inférieur
+    # à la pénalité d'un attribut manquant (sinon, les jours sans attribut en garde resteraient sans attribut)
+    marges = np.full(N, MARGE_EXEMPLAIRES)
+    avec_attribut = np.any([np.asarray(mdc_avec_attribut, dtype=bool) for mdc_avec_attribut in gplan.attributs.values()], axis=0) if gplan.attributs else np.zeros(N, dtype=bool)
+    marges[avec_attribut] += int(np.ceil(PENALITE_CRITERE_ATTRIBUT_MANQUANT / (2 * PENALITE_CRITERE_MAUVAISE_REPART)))
+
+    nb_astreintes = np.bincount(astreintes[astreintes != -1], minlength=N)
+    astreintes[libres_astreintes] = _affecter(cout[:, libres_astreintes].T, nb_astreintes, cibles_astreintes, marges)
+
+    return np.array(gplan.forcer_contrainte(planning))
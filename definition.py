@@ -2,6 +2,14 @@ import random
 import numpy as np
 
 from config import *
+from statistiques import statistiques_planning
+from candidats import ListesCandidats, K_CANDIDATS
+from planning import DTYPE_PLANNING
+import profilage
+
+RAYON_REPARATION = 3 # réparation locale (cf reparation_locale) : nombre maximal de jours réaffectés de part et d'autre du jour bloqué
+MAX_NOEUDS_REPARATION = 2000 # nombre maximal d'affectations essayées par fenêtre
+MAX_TIRAGES_LOT = 20 # forcer_contrainte_lot : nombre maximal de tirages d'un médecin qui convient (ensuite, réparation individuelle)
 
 """
 Permet de manipuler des plannings facilement : création, détection de contrainte, fixer les contraintes, calculer le critère.
@@ -28,8 +36,18 @@ Chaque mdc indique pour chaque garde sa préférence de travail : négatif = ne
 Note : les préférences concernant les gardes et non les astreintes. Toutefois, une préférence très fortement négative évitera aussi les astreintes. (cf SEUIL_PREF_NEG_ASTREINTE)
 On implémente cela avec la foncton calcule_critere.
 """
+class ErreurReparation(Exception):
+    """
+    forcer_contrainte n'a trouvé aucun médecin disponible au jour donné, même en réaffectant les jours voisins.
+    Le tirage étant aléatoire, relancer avec une autre graine peut suffire (cf solve_multi).
+    """
+
+    def __init__(self, jour):
+        self.jour = jour
+        super().__init__(f"\033[1m\033[31m[ERREUR]\033[0m Aucun médecin disponible au jour {jour+1}, même en réaffectant les jours voisins. Vous pouvez essayer de relancer l'algorithme.")
+
 class GestionnairePlanning:
-    def __init__(self, nombre_mdc, nombre_gardes, preferences=None, reductions=None, attributs=None, implications=None, jours_gras=None, jours_soulignes=None, planning_initial=None):
+    def __init__(self, nombre_mdc, nombre_gardes, preferences=None, reductions=None, attributs=None, implications=None, jours_gras=None, jours_soulignes=None, planning_initial=None, k_candidats=K_CANDIDATS):
         self.N = nombre_mdc
         self.D = nombre_gardes # aussi égal au nombre d'astreintes
 
@@ -56,6 +74,22 @@ class GestionnairePlanning:
         # répertorie les implications pour chaque mdc (nombre cible de gardes et nombre cible d'astreintes à distribuer)
         self.implications = implications
 
+        # taille des listes de candidats (cf candidats.py), None pour tirer parmi tous les mdc
+        self.k_candidats = k_candidats
+        self._candidats = None
+
+    @property
+    def candidats(self):
+        """
+        Listes de candidats de chaque jour (cf candidats.py), construites à la première utilisation. None si désactivées.
+        """
+
+        if self.k_candidats is None or self.preferences is None:
+            return None
+        if self._candidats is None:
+            self._candidats = ListesCandidats(self.preferences, self.k_candidats, planning_initial=self.planning_initial, jours_gras=self.jours_gras)
+        return self._candidats
+
     def random_mdc(self):
         """
         Renvoie un médecin au hasard (sous forme d'entier entre 0 et N-1).
@@ -123,6 +157,30 @@ class GestionnairePlanning:
         
         return False
 
+    def detecte_contrainte_lot(self, plannings):
+        """
+        detecte_contrainte pour un lot de plannings (tableau (P, 2D)) : renvoie un tableau de P booléens.
+        """
+
+        plannings = np.asarray(plannings)
+        planning_gardes = plannings[:, :self.D]
+        planning_astreintes = plannings[:, self.D:]
+
+        viole = np.any(planning_gardes == planning_astreintes, axis=1)
+        if ENABLE_OFF_AFTER_GARDE:
+            viole |= np.any(planning_gardes[:, 1:] == planning_gardes[:, :-1], axis=1)
+            viole |= np.any(planning_astreintes[:, 1:] == planning_gardes[:, :-1], axis=1)
+
+        if self.planning_initial is not None:
+            initial = np.asarray(self.planning_initial)
+            for s, type_creneau in enumerate(['garde', 'astreinte']):
+                gras = np.asarray(self.jours_gras[type_creneau], dtype=int) + s * self.D
+                soulignes = np.asarray(self.jours_soulignes[type_creneau], dtype=int) + s * self.D
+                viole |= np.any(plannings[:, gras] == initial[gras], axis=1)
+                viole |= np.any(plannings[:, soulignes] != initial[soulignes], axis=1)
+
+        return viole
+
     def forcer_contrainte(self, planning):
         """
         Force le respect des contraintes:
@@ -135,8 +193,9 @@ class GestionnairePlanning:
         La planning renvoyé respecte la contrainte.
         """
 
-        planning_gardes = planning[:self.D].copy()
-        planning_astreintes = planning[self.D:].copy()
+        resultat = np.array(planning, dtype=DTYPE_PLANNING) # une seule copie, les gardes et les astreintes sont des vues dessus
+        planning_gardes = resultat[:self.D]
+        planning_astreintes = resultat[self.D:]
 
         # empeche la réaffection des médecins aux jours en gras
         for t in range(len(planning_gardes)):
@@ -199,8 +258,8 @@ class GestionnairePlanning:
                     
                     if mdc_dispo:
                         planning_gardes[t] = random.choice(mdc_dispo) # on tire au sort un mdc
-                    else:
-                        raise Exception(f"\033[1m\033[31m[ERREUR]\033[0m Aucun médecin disponible pour l'astreinte au temps {t}. Vous pouvez essayer de relancer l'algorithme.")
+                    elif not self.reparation_locale(planning_gardes, planning_astreintes, t):
+                        raise ErreurReparation(t)
 
 
                 # un mdc fait une garde suivie par une astreinte (GA)
@@ -227,8 +286,8 @@ class GestionnairePlanning:
                     
                     if mdc_dispo:
                         planning_astreintes[t] = random.choice(mdc_dispo) # on tire au sort un mdc
-                    else:
-                        raise Exception(f"\033[1m\033[31m[ERREUR]\033[0m Aucun médecin disponible pour l'astreinte au temps {t}. Vous pouvez essayer de relancer l'algorithme.")
+                    elif not self.reparation_locale(planning_gardes, planning_astreintes, t):
+                        raise ErreurReparation(t)
 
         # forcer la contrainte "même médecin en garde et en astreinte"
         for t in range(len(planning_gardes)):
@@ -247,18 +306,179 @@ class GestionnairePlanning:
 
                 if mdc_dispo:
                     planning_astreintes[t] = random.choice(mdc_dispo)
-                else:
-                    raise Exception(f"\033[1m\033[31m[ERREUR]\033[0m Aucun médecin disponible pour l'astreinte au temps {t}. Vous pouvez essayer de relancer l'algorithme.")
+                elif not self.reparation_locale(planning_gardes, planning_astreintes, t):
+                    raise ErreurReparation(t)
 
-        return np.concatenate((planning_gardes, planning_astreintes))
+        if profilage.ACTIF: # nombre de cases changées par la réparation (cf profilage.py)
+            modifiees = int(np.sum(resultat != np.asarray(planning)))
+            profilage.compter('forcer_contrainte.appels')
+            profilage.compter('forcer_contrainte.cases_modifiees', modifiees)
+            profilage.histogramme('forcer_contrainte.cases_modifiees', modifiees)
+
+        return resultat
+
+    def reparation_locale(self, planning_gardes, planning_astreintes, t):
+        """
+        Appelée par forcer_contrainte quand plus aucun médecin n'est disponible au jour t.
+        On réaffecte les créneaux non soulignés des jours autour de t, sur une fenêtre de plus en plus large
+        (jusqu'à RAYON_REPARATION jours de part et d'autre), par retour sur trace borné (MAX_NOEUDS_REPARATION essais par fenêtre).
+        Les médecins actuels sont essayés en premier, pour changer le moins de cases possible.
+        Modifie planning_gardes et planning_astreintes sur place et renvoie True si la réparation a réussi.
+        """
+
+        D = self.D
+        types = ['garde', 'astreinte']
+
+        def fixe(jour, s):
+            return self.planning_initial is not None and jour in self.jours_soulignes[types[s]]
+
+        for rayon in range(1, RAYON_REPARATION + 1):
+            debut, fin = max(0, t - rayon), min(D - 1, t + rayon)
+            creneaux = [(jour, s) for jour in range(debut, fin + 1) for s in (0, 1)] # garde puis astreinte, jour par jour
+            plannings = (planning_gardes.copy(), planning_astreintes.copy())
+            gardes, astreintes = plannings
+            noeuds = 0
+
+            def valide(jour, s, mdc):
+                # jour en gras : le médecin initial doit changer
+                if self.planning_initial is not None and jour in self.jours_gras[types[s]] and mdc == self.planning_initial[s * D + jour]:
+                    return False
+                # garde et astreinte du même jour (la garde est affectée avant l'astreinte)
+                if s == 1 and mdc == gardes[jour]:
+                    return False
+                if ENABLE_OFF_AFTER_GARDE:
+                    # jour off après la garde de la veille
+                    if jour > 0 and mdc == gardes[jour - 1]:
+                        return False
+                    # dernier jour de la fenêtre : le lendemain (hors fenêtre) ne bouge pas
+                    if s == 0 and jour == fin and fin < D - 1 and mdc in (gardes[fin + 1], astreintes[fin + 1]):
+                        return False
+                return True
+
+            def explorer(k):
+                nonlocal noeuds
+                if k == len(creneaux):
+                    return True
+                noeuds += 1
+                if noeuds > MAX_NOEUDS_REPARATION:
+                    return False
+
+                jour, s = creneaux[k]
+                actuel = plannings[s][jour]
+                if fixe(jour, s):
+                    return valide(jour, s, actuel) and explorer(k + 1)
+
+                candidats = [mdc for mdc in random.sample(range(self.N), self.N) if mdc != actuel]
+                if actuel != -1:
+                    candidats.insert(0, actuel)
+                for mdc in candidats:
+                    if valide(jour, s, mdc):
+                        plannings[s][jour] = mdc
+                        if explorer(k + 1):
+                            return True
+                        if noeuds > MAX_NOEUDS_REPARATION:
+                            break
+                plannings[s][jour] = actuel
+                return False
+
+            if explorer(0):
+                planning_gardes[debut:fin + 1] = gardes[debut:fin + 1]
+                planning_astreintes[debut:fin + 1] = astreintes[debut:fin + 1]
+                if profilage.ACTIF:
+                    profilage.compter('forcer_contrainte.reparations_locales')
+                return True
+
+        if profilage.ACTIF:
+            profilage.compter('forcer_contrainte.reparations_echouees')
+        return False
+
+    def forcer_contrainte_lot(self, plannings):
+        """
+        forcer_contrainte pour un lot de plannings (tableau (P, 2D)), renvoie un nouveau tableau (P, 2D).
+
+        Les cases soulignées et en gras sont traitées d'un coup pour tout le lot, puis on parcourt les jours dans l'ordre,
+        chaque jour pour tous les plannings à la fois : on retire au hasard un médecin pour la garde (puis l'astreinte)
+        qui est en conflit avec les jours déjà traités ou avec une case soulignée du lendemain.
+        Les plannings qui violent encore une contrainte (aucun médecin tiré ne convient, cas très contraints)
+        passent ensuite un par un dans forcer_contrainte.
+        """
+
+        plannings = np.array(plannings, dtype=DTYPE_PLANNING)
+        P, D = plannings.shape[0], self.D
+        planning_gardes = plannings[:, :D] # vues sur plannings
+        planning_astreintes = plannings[:, D:]
+
+        # cases fixées (soulignées) et médecins interdits (médecin initial d'une case en gras), -1 si aucun
+        fixes = np.full(2 * D, -1, dtype=int)
+        interdits = np.full(2 * D, -1, dtype=int)
+        if self.planning_initial is not None:
+            initial = np.asarray(self.planning_initial, dtype=int)
+            for s, type_creneau in enumerate(['garde', 'astreinte']):
+                soulignes = np.asarray(self.jours_soulignes[type_creneau], dtype=int) + s * D
+                gras = np.asarray(self.jours_gras[type_creneau], dtype=int) + s * D
+                fixes[soulignes] = initial[soulignes]
+                interdits[gras] = initial[gras]
+            plannings[:, fixes != -1] = fixes[fixes != -1]
+        fixes_gardes, fixes_astreintes = fixes[:D], fixes[D:]
+
+        echecs = np.zeros(P, dtype=bool) # plannings pour lesquels aucun médecin tiré ne convenait
+
+        def retirer(lignes, exclus):
+            """
+            Tire pour chaque ligne un médecin qui n'est pas dans exclus (tableau (len(lignes), k), -1 ignoré).
+            """
+
+            tirage = np.random.randint(0, self.N, size=len(lignes))
+            for _ in range(MAX_TIRAGES_LOT):
+                mauvais = np.any(tirage[:, None] == exclus, axis=1)
+                if not mauvais.any():
+                    return tirage
+                tirage[mauvais] = np.random.randint(0, self.N, size=int(mauvais.sum()))
+            echecs[lignes[np.any(tirage[:, None] == exclus, axis=1)]] = True
+            return tirage
+
+        for t in range(D):
+            # garde du jour t
+            if fixes_gardes[t] == -1:
+                mdc = planning_gardes[:, t]
+                exclus = [np.full(P, interdits[t]), np.full(P, fixes_astreintes[t])]
+                if ENABLE_OFF_AFTER_GARDE:
+                    exclus.append(planning_gardes[:, t-1] if t > 0 else np.full(P, -1))
+                    if t + 1 < D:
+                        exclus += [np.full(P, fixes_gardes[t+1]), np.full(P, fixes_astreintes[t+1])]
+                exclus = np.stack(exclus, axis=1)
+                lignes = np.flatnonzero(np.any((mdc[:, None] == exclus) & (exclus != -1), axis=1))
+                if len(lignes):
+                    planning_gardes[lignes, t] = retirer(lignes, exclus[lignes])
+
+            # astreinte du jour t
+            if fixes_astreintes[t] == -1:
+                mdc = planning_astreintes[:, t]
+                exclus = [np.full(P, interdits[D + t]), planning_gardes[:, t]]
+                if ENABLE_OFF_AFTER_GARDE and t > 0:
+                    exclus.append(planning_gardes[:, t-1])
+                exclus = np.stack(exclus, axis=1)
+                lignes = np.flatnonzero(np.any((mdc[:, None] == exclus) & (exclus != -1), axis=1))
+                if len(lignes):
+                    planning_astreintes[lignes, t] = retirer(lignes, exclus[lignes])
+
+        # conflits restants (entre cases soulignées, ou tirages infructueux) : réparation planning par planning
+        restants = np.flatnonzero(echecs | self.detecte_contrainte_lot(plannings))
+        for i in restants:
+            plannings[i] = self.forcer_contrainte(plannings[i])
+
+        if profilage.ACTIF:
+            profilage.compter('forcer_contrainte_lot.plannings', P)
+            profilage.compter('forcer_contrainte_lot.plannings_individuels', len(restants))
+
+        return plannings
 
     def solution_initiale(self):
         """
         Renvoie un planning généré aléatoirement (mais qui respecte les contraintes)
         """
-        A = [self.random_mdc() for _ in range(2*self.D)] # construction du planning : d'abord les gardes puis les astreintes
-        B = self.forcer_contrainte(A) # on applique la contrainte
-        return np.array(B)
+        A = np.fromiter((self.random_mdc() for _ in range(2*self.D)), dtype=DTYPE_PLANNING, count=2*self.D) # construction du planning : d'abord les gardes puis les astreintes
+        return self.forcer_contrainte(A) # on applique la contrainte (renvoie une copie)
 
     def calcule_critere(self, planning):
         """
@@ -321,13 +541,7 @@ class GestionnairePlanning:
 
         # pénaliser une mauvaise répartition des gardes/astreintes entre les mdc
         # (cf guide d'utilisateur pour plus de détais sur cette stratégie)
-        if self.implications is None:
-            nb_positifs_par_mdc = (self.preferences > 0).sum(axis=1) # (N,)
-            target_nb_gardes_par_mdc = self.D * ((nb_positifs_par_mdc/self.reductions) / np.sum(nb_positifs_par_mdc/self.reductions)) # (N,)
-            target_nb_astreintes_par_mdc = self.D * ((nb_positifs_par_mdc/self.reductions) / np.sum(nb_positifs_par_mdc/self.reductions)) # (N,)
-        else:
-            target_nb_gardes_par_mdc = self.implications['gardes']
-            target_nb_astreintes_par_mdc = self.implications['astreintes']   
+        target_nb_gardes_par_mdc, target_nb_astreintes_par_mdc = self.cibles_repartition()
 
         nb_gardes_par_mdc = np.zeros(self.N, dtype=int)
         for mdc in planning_gardes:
@@ -342,7 +556,65 @@ class GestionnairePlanning:
         critere += PENALITE_CRITERE_MAUVAISE_REPART * np.sum((target_nb_astreintes_par_mdc - nb_astreintes_par_mdc)**2)
 
         return critere
+
+    def calcule_critere_lot(self, plannings):
+        """
+        calcule_critere pour un lot de plannings (tableau (P, 2D)) : renvoie un tableau de P critères.
+        Mêmes termes que calcule_critere et calcule_soft_critere, calculés pour tout le lot à la fois.
+        """
+
+        plannings = np.asarray(plannings)
+        P, D, N = plannings.shape[0], self.D, self.N
+        planning_gardes = plannings[:, :D]
+        planning_astreintes = plannings[:, D:]
+        jours = np.arange(D)
+        preferences = np.asarray(self.preferences, dtype=float)
+
+        # respect des préférences (gardes, puis astreintes si grosse préf négative), hors jours soulignés
+        cout_gardes = np.select([preferences < 0, preferences == 0], [PENALITE_CRITERE_PREF_NEG * preferences**2, PENALITE_CRITERE_PREF_NULLE], -BONUS_CRITERE_PREF_POS * preferences**2)
+        cout_gardes[:, self.jours_soulignes['garde']] = 0
+        cout_astreintes = np.where(preferences < SEUIL_PREF_NEG_ASTREINTE, PENALITE_CRITERE_PREF_NEG * preferences**2, 0.0)
+        cout_astreintes[:, self.jours_soulignes['astreinte']] = 0
+        critere = cout_gardes[planning_gardes, jours].sum(axis=1) + cout_astreintes[planning_astreintes, jours].sum(axis=1)
+
+        # pénalités pour les attributs non respectés
+        for _, mdc_avec_attribut in self.attributs.items():
+            avec = np.asarray(mdc_avec_attribut, dtype=bool)
+            critere += PENALITE_CRITERE_ATTRIBUT_MANQUANT * np.sum(~avec[planning_gardes] & ~avec[planning_astreintes], axis=1)
+
+        # écarts entre les gardes d'un même mdc : on trie les jours par mdc, les écarts sont entre deux jours consécutifs du même mdc
+        ordre = np.argsort(planning_gardes, axis=1, kind='stable')
+        mdc_tries = np.take_along_axis(planning_gardes, ordre, axis=1)
+        ecarts = np.diff(ordre, axis=1)
+        meme_mdc = mdc_tries[:, 1:] == mdc_tries[:, :-1]
+        ecarts = np.where(meme_mdc, ecarts, 1)
+        critere += np.sum(meme_mdc * (PENALITE_CRITERE_PETIT_ECART * (ecarts < PETIT_ECART) + PENALITE_CRITERE_ECART / ecarts), axis=1)
+
+        # répartition des gardes/astreintes entre les mdc
+        target_nb_gardes_par_mdc, target_nb_astreintes_par_mdc = self.cibles_repartition()
+        decalage = N * np.arange(P)[:, None]
+        nb_gardes_par_mdc = np.bincount((planning_gardes + decalage).ravel(), minlength=P * N).reshape(P, N)
+        nb_astreintes_par_mdc = np.bincount((planning_astreintes + decalage).ravel(), minlength=P * N).reshape(P, N)
+        critere += PENALITE_CRITERE_MAUVAISE_REPART * np.sum((target_nb_gardes_par_mdc - nb_gardes_par_mdc)**2, axis=1)
+        critere += PENALITE_CRITERE_MAUVAISE_REPART * np.sum((target_nb_astreintes_par_mdc - nb_astreintes_par_mdc)**2, axis=1)
+
+        return critere
     
+    def cibles_repartition(self):
+        """
+        Nombres cibles de gardes et d'astreintes de chaque mdc (deux tableaux de taille N), utilisés par calcule_soft_critere.
+        """
+
+        if self.implications is None:
+            nb_positifs_par_mdc = (self.preferences > 0).sum(axis=1) # (N,)
+            target_nb_gardes_par_mdc = self.D * ((nb_positifs_par_mdc/self.reductions) / np.sum(nb_positifs_par_mdc/self.reductions)) # (N,)
+            target_nb_astreintes_par_mdc = self.D * ((nb_positifs_par_mdc/self.reductions) / np.sum(nb_positifs_par_mdc/self.reductions)) # (N,)
+        else:
+            target_nb_gardes_par_mdc = self.implications['gardes']
+            target_nb_astreintes_par_mdc = self.implications['astreintes']
+
+        return target_nb_gardes_par_mdc, target_nb_astreintes_par_mdc
+
     def penalite_attributs(self, mdc_garde, mdc_astreinte):
         """
         Calcule la pénalité pour un jour donné en fonction des attributs des médecins de garde et d'astreinte.
@@ -387,55 +659,18 @@ class GestionnairePlanning:
         calculer le nb d'astreintes par mdc
         """
 
-        resultat = {}
-        
-        # ------ nombre de neg, -1 et 0 attribués ------
-        planning_gardes = planning[:self.D]
-        planning_astreintes = planning[self.D:]
-
-        nombre_neg = 0
-        nombre_moins1 = 0
-        nombre_0 = 0
+        stats = statistiques_planning(planning, self.preferences) # cf statistiques.py
 
-        preferences_mdc_gardes = self.preferences[planning_gardes, np.arange(self.D)]
-        for i, pref in enumerate(preferences_mdc_gardes):
-            if pref < 0:
-                nombre_neg += 1
-                if pref == -1:
-                    nombre_moins1 += 1
-            elif pref == 0:
-                nombre_0 += 1
+        resultat = {}
 
-        resultat.update({"nombre_neg": nombre_neg, "nombre_moins1": nombre_moins1, "nombre_0": nombre_0})
+        # ------ nombre de neg, -1 et 0 attribués ------
+        resultat.update({"nombre_neg": int(stats['gardes_pref_neg'].sum()), "nombre_moins1": int(stats['gardes_pref_moins1'].sum()), "nombre_0": int(stats['gardes_pref_nulle'].sum())})
 
         # ------ nombre de gardes et astreintes attribuées par mdc ------
-
-        nb_gardes_par_mdc = np.zeros(self.N, dtype=int)
-        nb_astreintes_par_mdc = np.zeros(self.N, dtype=int)
-
-        for mdc in planning_gardes:
-            nb_gardes_par_mdc[mdc] += 1
-
-        for mdc in planning_astreintes:
-            nb_astreintes_par_mdc[mdc] += 1
-
-        resultat["nb_gardes_par_mdc"] = nb_gardes_par_mdc.tolist()
-        resultat["nb_astreintes_par_mdc"] = nb_astreintes_par_mdc.tolist()
+        resultat["nb_gardes_par_mdc"] = stats['nb_gardes'].tolist()
+        resultat["nb_astreintes_par_mdc"] = stats['nb_astreintes'].tolist()
 
         # ------ écart moyen entre les gardes pour chaque mdc ------
-
-        ecart_moyen_gardes_par_mdc = []
-
-        for mdc in range(self.N):
-            # Trouver les jours où le mdc a une garde
-            jours_mdc = np.where(np.array(planning_gardes) == mdc)[0]
-            if len(jours_mdc) > 1:
-                ecarts = np.diff(jours_mdc) # écarts entre les gardes successives
-                ecart_moyen = np.mean(ecarts) # écart moyen
-            else:
-                ecart_moyen = None
-            ecart_moyen_gardes_par_mdc.append(ecart_moyen)
-
-        resultat["ecart_moyen_gardes_par_mdc"] = ecart_moyen_gardes_par_mdc
+        resultat["ecart_moyen_gardes_par_mdc"] = [None if np.isnan(ecart) else float(ecart) for ecart in stats['ecart_moyen_gardes']]
 
         return resultat
@@ -0,0 +1,447 @@
+import os
+import math
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from openpyxl import load_workbook
+from openpyxl.styles import PatternFill, Font
+from openpyxl.utils import get_column_letter
+
+from statistiques import statistiques_planning
+
+"""
+Exportation des plannings : un fichier Excel par équipe.
+
+Pour chaque équipe, on repart du fichier d'entrée, on remplit les colonnes garde/astreinte,
+on colore les préférences et les jours problématiques, et on (re)crée les feuilles "résumé" et "légende".
+Les classeurs sont indépendants les uns des autres : on peut donc les exporter en parallèle (exporter_classeurs).
+
+Les styles de la feuille principale sont d'abord calculés sous forme de tableaux (un code de couleur par cellule),
+puis appliqués en un seul parcours. Les remplissages et polices sont enregistrés une seule fois par classeur
+(StylesClasseur) et, en mode minimal, on ne modifie que les cellules dont la valeur ou le style change réellement.
+"""
+
+blue_fill = PatternFill(start_color="6c9beb", end_color="6c9beb", fill_type="solid")
+red_fill = PatternFill(start_color="DB7C6C", end_color="DB7C6C", fill_type="solid")
+green_fill = PatternFill(start_color="99c57a", end_color="99c57a", fill_type="solid")
+gray_fill = PatternFill(start_color="9a9796", end_color="9a9796", fill_type="solid")
+yellow_fill = PatternFill(start_color="FFEB99", end_color="FFEB99", fill_type="solid")
+collision_fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
+jour_off_fill = PatternFill(start_color="FFB366", end_color="FFB366", fill_type="solid")
+attribut_fill = PatternFill(start_color="FFA07A", end_color="FFA07A", fill_type="solid")
+modification_fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
+nonassigne_fill = PatternFill(start_color="FF69B4", end_color="FF69B4", fill_type="solid")
+
+police_normale = Font(bold=False) # on enlève le gras (gras=valeur à modifier, or, ça y est on a modifié)
+police_soulignee = Font(underline='single') # par contre, on garde le soulignage pour les valeurs fixées
+
+# codes des remplissages utilisés dans les tableaux de styles (-1 = on ne touche pas au remplissage)
+GRIS, ROUGE, JAUNE, VERT, BLEU, COLLISION, JOUR_OFF, ATTRIBUT, NON_ASSIGNE, MODIFICATION = range(10)
+REMPLISSAGES = (gray_fill, red_fill, yellow_fill, green_fill, blue_fill, collision_fill, jour_off_fill, attribut_fill, nonassigne_fill, modification_fill)
+POLICES = (police_normale, police_soulignee)
+
+ENTETES_RESUME = ["Médecin", "Gardes effectuées", "Gardes ciblées", "Astreintes effectuées", 
+           "Astreintes ciblées", "Écart moyen entre gardes", "Gardes sur préf. négatives", 
+           "Gardes sur préf. nulles"]
+
+class StylesClasseur:
+    """
+    Remplissages et polices partagés d'un classeur.
+    Chaque style est enregistré une seule fois dans le classeur : une cellule qui a déjà le bon style
+    se reconnaît alors à son indice de style, sans comparer les objets openpyxl.
+    """
+
+    def __init__(self, wb):
+        self.remplissages = [wb._fills.add(fill) for fill in REMPLISSAGES]
+        self.polices = [wb._fonts.add(font) for font in POLICES]
+
+    def remplir(self, cellule, code):
+        """
+        Applique le remplissage de code donné. Renvoie True si la cellule a été modifiée.
+        """
+
+        if cellule._style and cellule._style.fillId == self.remplissages[code]:
+            return False
+        cellule.fill = REMPLISSAGES[code]
+        return True
+
+    def police(self, cellule, soulignee):
+        if cellule._style and cellule._style.fontId == self.polices[soulignee]:
+            return False
+        cellule.font = POLICES[soulignee]
+        return True
+
+def _meme_valeur(a, b):
+    """
+    Égalité de deux valeurs de cellule (openpyxl n'enregistre pas les flottants avec toutes leurs décimales).
+    """
+
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool) and not isinstance(b, bool):
+        return math.isclose(a, b, rel_tol=1e-12, abs_tol=1e-12)
+    return a == b
+
+def _ecrire(cellule, valeur):
+    """
+    Écrit une valeur seulement si elle diffère de celle de la cellule (une cellule vide vaut "").
+    """
+
+    actuelle = "" if cellule.value is None else cellule.value
+    if actuelle == valeur:
+        return False
+    cellule.value = valeur
+    return True
+
+def styles_feuille_principale(resultat, planning_initial, valeurs_preferences, jours_fixes, collisions, jours_off, jours_attributs):
+    """
+    Calcule tous les styles de la feuille principale sous forme de tableaux.
+    valeurs_preferences: tableau (D, N) des préférences lues dans la feuille (nan si la case est vide)
+    Renvoie (codes des préférences (D, N), codes de la colonne "jour" (D,), codes des colonnes garde/astreinte (2, D), soulignage (2, D)).
+    """
+
+    D, N = valeurs_preferences.shape
+    resultat = np.asarray(resultat)
+    gardes = resultat[:D]
+    astreintes = resultat[D:]
+
+    # préférences : gris si vide, sinon jaune/rouge (négative assignée ou non) et bleu/vert (positive ou nulle assignée ou non)
+    assignee = np.arange(N)[None, :] == gardes[:, None]
+    with np.errstate(invalid='ignore'):
+        negative = valeurs_preferences < 0
+    codes_preferences = np.where(negative, np.where(assignee, JAUNE, ROUGE), np.where(assignee, BLEU, VERT))
+    codes_preferences[np.isnan(valeurs_preferences)] = GRIS
+
+    # colonne "jour" : le dernier problème détecté l'emporte (même ordre de priorité qu'avant)
+    codes_jours = np.full(D, -1)
+    for jours, code in ((collisions, COLLISION), (jours_off, JOUR_OFF), (jours_attributs, ATTRIBUT)):
+        codes_jours[list(jours)] = code
+    codes_jours[(gardes == -1) | (astreintes == -1)] = NON_ASSIGNE # case vide: on le signale
+
+    # garde/astreinte modifiée par rapport au planning initial
+    codes_shifts = np.full((2, D), -1)
+    if planning_initial is not None:
+        initial = np.asarray(planning_initial).reshape(2, D)
+        codes_shifts[(initial != -1) & (initial != resultat.reshape(2, D))] = MODIFICATION
+
+    soulignes = np.zeros((2, D), dtype=int)
+    soulignes[0, list(jours_fixes['garde'])] = 1
+    soulignes[1, list(jours_fixes['astreinte'])] = 1
+
+    return codes_preferences, codes_jours, codes_shifts, soulignes
+
+def _feuille_principale(ws, styles, resultat, planning_initial, mdc, jours_fixes, collisions, jours_off, jours_attributs):
+    """
+    Remplit les colonnes garde/astreinte et colore la feuille principale. Renvoie le nombre de cellules modifiées.
+    """
+
+    N = len(mdc)
+    D = len(resultat) // 2
+
+    lignes = [list(ligne) for ligne in ws.iter_rows(min_row=2, max_row=D + 1, min_col=1, max_col=3 + N)]
+    valeurs_preferences = np.array([[np.nan if cellule.value is None else float(cellule.value) for cellule in ligne[3:]] for ligne in lignes], dtype=float).reshape(D, N)
+
+    codes_preferences, codes_jours, codes_shifts, soulignes = styles_feuille_principale(resultat, planning_initial, valeurs_preferences, jours_fixes, collisions, jours_off, jours_attributs)
+    noms = list(mdc) + [""] # l'indice -1 donne une case vide
+
+    modifiees = 0
+    for day, ligne in enumerate(lignes):
+        jour_cell, garde_cell, astreinte_cell = ligne[:3]
+
+        if codes_jours[day] != -1:
+            modifiees += styles.remplir(jour_cell, codes_jours[day])
+        modifiees += styles.police(jour_cell, 0)
+
+        for shift, cellule in enumerate((garde_cell, astreinte_cell)):
+            if codes_shifts[shift, day] != -1:
+                modifiees += styles.remplir(cellule, codes_shifts[shift, day])
+            modifiees += _ecrire(cellule, noms[resultat[shift * D + day]])
+            modifiees += styles.police(cellule, soulignes[shift, day])
+
+        for j, code in enumerate(codes_preferences[day]):
+            modifiees += styles.remplir(ligne[3 + j], code)
+
+    return modifiees
+
+def _lignes_resume(resultat, mdc, preferences, implications):
+    """
+    Contenu de la feuille "résumé" (entêtes puis une ligne par médecin) : combien de gardes, etc...
+    (ce résumé concerne CE planning seulement, pas le planning global sur plusieurs équipes)
+    """
+
+    stats = statistiques_planning(resultat, preferences, implications) # cf statistiques.py
+
+    lignes = [ENTETES_RESUME]
+    for j, mdc_name in enumerate(mdc):
+        # écart moyen entre les gardes ("-" si moins de 2 gardes)
+        ecart_moyen = "-" if np.isnan(stats['ecart_moyen_gardes'][j]) else float(stats['ecart_moyen_gardes'][j])
+        lignes.append([mdc_name, int(stats['nb_gardes'][j]), float(implications['gardes'][j]), int(stats['nb_astreintes'][j]),
+                       float(implications['astreintes'][j]), ecart_moyen, int(stats['gardes_pref_neg'][j]), int(stats['gardes_pref_nulle'][j])])
+    return lignes
+
+def _feuille_resume(wb, styles, resultat, mdc, preferences, implications, minimal):
+    """
+    Feuille "résumé" (cf _lignes_resume).
+    En mode minimal, une feuille existante est mise à jour cellule par cellule au lieu d'être recréée.
+    """
+
+    lignes = _lignes_resume(resultat, mdc, preferences, implications)
+    headers = ENTETES_RESUME
+
+    if "résumé" in wb.sheetnames and not minimal:
+        del wb["résumé"]
+    if "résumé" in wb.sheetnames:
+        ws_resume = wb["résumé"]
+        if ws_resume.max_row > len(lignes): # moins de médecins qu'avant
+            ws_resume.delete_rows(len(lignes) + 1, ws_resume.max_row - len(lignes))
+    else:
+        ws_resume = wb.create_sheet("résumé")
+
+    for row, valeurs in enumerate(lignes, 1):
+        for col, valeur in enumerate(valeurs, 1):
+            cell = ws_resume.cell(row=row, column=col)
+            if not _meme_valeur(cell.value, valeur):
+                cell.value = valeur
+            # Pour les nombres avec décimales, on garde les nombres et on formate la cellule
+            if isinstance(valeur, float) and cell.number_format != '#,##0.0':
+                cell.number_format = '#,##0.0'  # Format français avec 1 décimale
+
+    for col, header in enumerate(headers, 1):
+        cell = ws_resume.cell(row=1, column=col)
+        if not cell.font.bold:
+            cell.font = Font(bold=True)
+        # Colorer les entêtes des colonnes de préférences
+        if header in ("Gardes sur préf. négatives", "Gardes sur préf. nulles"):
+            styles.remplir(cell, JAUNE)
+
+    for col in range(1, len(headers) + 1):
+        ws_resume.column_dimensions[get_column_letter(col)].width = 25 # largeur colonne (esthétique)
+
+def _feuille_legende(wb, minimal):
+    """
+    Feuille "légende" : c'est essentiellement du formatage/esthétisme.
+    Son contenu ne dépend pas du planning : en mode minimal, on garde celle qui existe déjà.
+    """
+
+    if "légende" in wb.sheetnames:
+        if minimal and wb["légende"]['A1'].value == "LÉGENDE DES COULEURS":
+            return
+        del wb["légende"]
+    ws_legende = wb.create_sheet("légende")
+
+    title_font = Font(bold=True, size=12)
+    subtitle_font = Font(bold=True)
+
+    # titre
+    ws_legende['A1'] = "LÉGENDE DES COULEURS"
+    ws_legende['A1'].font = title_font
+
+    # légende des problèmes "graves"
+    ws_legende['A3'] = "Problèmes graves :"
+    ws_legende['A3'].font = subtitle_font
+
+    ws_legende['B4'] = "Collision (médecin assigné à plusieurs équipes)"
+    ws_legende['A4'].fill = collision_fill
+
+    ws_legende['B5'] = "Jour OFF après garde non respecté"
+    ws_legende['A5'].fill = jour_off_fill
+
+    ws_legende['B6'] = "Attribut manquant ce jour-là"
+    ws_legende['A6'].fill = attribut_fill
+
+    ws_legende['B7'] = "Garde ou astreinte non attribuée"
+    ws_legende['A7'].fill = nonassigne_fill
+
+    # légende des préférences
+    ws_legende['A9'] = "Préférences :"
+    ws_legende['A9'].font = subtitle_font
+
+    ws_legende['B10'] = "Préférence positive ou nulle (assignée à une garde)"
+    ws_legende['A10'].fill = blue_fill
+
+    ws_legende['B11'] = "Préférence négative (assignée à une garde)"
+    ws_legende['A11'].fill = yellow_fill
+
+    ws_legende['B12'] = "Préférence positive"
+    ws_legende['A12'].fill = green_fill
+
+    ws_legende['B13'] = "Préférence négative"
+    ws_legende['A13'].fill = red_fill
+
+    ws_legende['B14'] = "Préférence nulle"
+    ws_legende['A14'].fill = gray_fill
+
+    # légende des modifications
+    ws_legende['A16'] = "Modifications :"
+    ws_legende['A16'].font = subtitle_font
+
+    ws_legende['B17'] = "Garde ou astreinte modifiée par rapport au planning initial"
+    ws_legende['A17'].fill = modification_fill
+
+    ws_legende.column_dimensions['B'].width = 50
+    ws_legende.column_dimensions['A'].width = 4
+
+    for k in range(1, 18):
+        ws_legende.row_dimensions[k].height = 20
+
+def _couleur(fill):
+    return fill.fgColor.rgb if fill is not None and fill.fill_type else None
+
+def _gras_souligne(cellule):
+    if cellule.font is None: # cellule absente du fichier (lecture seule)
+        return False, False
+    return bool(cellule.font.bold), cellule.font.underline == 'single'
+
+COULEURS = [_couleur(fill) for fill in REMPLISSAGES]
+COULEURS_PROBLEMES = {COULEURS[code] for code in (COLLISION, JOUR_OFF, ATTRIBUT, NON_ASSIGNE)}
+
+def classeur_a_jour(chemin_entree, chemin_sortie, resultat, planning_initial, mdc, preferences, implications, jours_fixes, collisions, jours_off, jours_attributs):
+    """
+    Indique si chemin_sortie affiche déjà exactement ce que l'exportation écrirait
+    (planning, jours problématiques, couleurs des préférences, soulignage, résumé), auquel cas il est inutile de le réécrire.
+    Le classeur est ouvert en lecture seule (bien plus rapide qu'un chargement complet, et aucune sauvegarde).
+
+    Si chemin_sortie est un fichier séparé (mode N), il doit être plus récent que chemin_entree,
+    et les cases sans problème ne doivent plus porter la couleur d'un problème ou d'une modification d'un planning précédent
+    (l'exportation repartirait de chemin_entree, qui n'a pas ces couleurs).
+    En mode R (chemin_sortie == chemin_entree), ces couleurs ne seraient de toute façon pas effacées : on ne les vérifie pas.
+    """
+
+    if not os.path.exists(chemin_sortie):
+        return False
+
+    separe = os.path.abspath(chemin_sortie) != os.path.abspath(chemin_entree)
+    if separe and os.stat(chemin_sortie).st_mtime_ns < os.stat(chemin_entree).st_mtime_ns:
+        return False
+
+    N = len(mdc)
+    D = len(resultat) // 2
+    resultat = np.asarray(resultat)
+    noms = list(mdc) + [""] # l'indice -1 donne une case vide
+
+    wb = load_workbook(chemin_sortie, read_only=True)
+    try:
+        if "résumé" not in wb.sheetnames or "légende" not in wb.sheetnames:
+            return False
+
+        ws = wb.worksheets[0]
+        entetes = next(ws.iter_rows(min_row=1, max_row=1, min_col=4, max_col=3 + N, values_only=True), ())
+        if list(entetes) != list(mdc):
+            return False
+
+        lignes = [list(ligne) for ligne in ws.iter_rows(min_row=2, max_row=D + 1, min_col=1, max_col=3 + N)]
+        if len(lignes) != D or any(len(ligne) != 3 + N for ligne in lignes):
+            return False
+        valeurs_preferences = np.array([[np.nan if cellule.value is None else float(cellule.value) for cellule in ligne[3:]] for ligne in lignes], dtype=float).reshape(D, N)
+
+        codes_preferences, codes_jours, codes_shifts, soulignes = styles_feuille_principale(resultat, planning_initial, valeurs_preferences, jours_fixes, collisions, jours_off, jours_attributs)
+
+        for day, ligne in enumerate(lignes):
+            jour_cell = ligne[0]
+            couleur_jour = _couleur(jour_cell.fill)
+            if codes_jours[day] != -1:
+                if couleur_jour != COULEURS[codes_jours[day]]:
+                    return False
+            elif separe and couleur_jour in COULEURS_PROBLEMES:
+                return False
+            if _gras_souligne(jour_cell)[0]:
+                return False
+
+            for shift in range(2):
+                cellule = ligne[1 + shift]
+                valeur = "" if cellule.value is None else cellule.value
+                if valeur != noms[resultat[shift * D + day]]:
+                    return False
+                couleur = _couleur(cellule.fill)
+                if codes_shifts[shift, day] != -1:
+                    if couleur != COULEURS[MODIFICATION]:
+                        return False
+                elif separe and couleur == COULEURS[MODIFICATION]:
+                    return False
+                if _gras_souligne(cellule) != (False, bool(soulignes[shift, day])):
+                    return False
+
+            for j in range(N):
+                if _couleur(ligne[3 + j].fill) != COULEURS[codes_preferences[day, j]]:
+                    return False
+
+        resume = [list(ligne) for ligne in wb["résumé"].iter_rows(values_only=True)]
+        attendu = _lignes_resume(resultat, mdc, preferences, implications)
+        if len(resume) != len(attendu):
+            return False
+        for ligne, ligne_attendue in zip(resume, attendu):
+            if len(ligne) < len(ligne_attendue) or not all(_meme_valeur(a, b) for a, b in zip(ligne, ligne_attendue)):
+                return False
+    finally:
+        wb.close()
+
+    return True
+
+def _sauvegarde_atomique(wb, chemin):
+    """
+    Enregistre le classeur dans un fichier temporaire du même répertoire, puis le renomme :
+    en cas d'interruption, le fichier existant n'est jamais laissé à moitié écrit.
+    Le fichier garde les droits du fichier remplacé (ou les droits par défaut s'il est nouveau) :
+    mkstemp crée le fichier temporaire en 0600, ce qui retirerait l'accès aux autres utilisateurs d'un dossier partagé.
+    """
+
+    if os.path.exists(chemin):
+        droits = os.stat(chemin).st_mode & 0o7777
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        droits = 0o666 & ~umask
+
+    fd, chemin_tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(chemin)), prefix='.tmp-', suffix='.xlsx')
+    os.close(fd)
+    try:
+        wb.save(chemin_tmp)
+        os.chmod(chemin_tmp, droits)
+        os.replace(chemin_tmp, chemin)
+    except BaseException:
+        if os.path.exists(chemin_tmp):
+            os.remove(chemin_tmp)
+        raise
+
+def exporter_classeur(chemin_entree, chemin_sortie, resultat, planning_initial, mdc, preferences, implications, jours_fixes, collisions, jours_off, jours_attributs, minimal=True):
+    """
+    Écrit le planning optimisé d'une équipe dans chemin_sortie, à partir du classeur chemin_entree.
+    collisions, jours_off et jours_attributs sont les jours problématiques de l'équipe (indices des jours, cf validation.py), colorés dans la colonne "jour".
+    minimal: si True, on ne modifie que les cellules qui changent, et les feuilles "résumé"/"légende" existantes sont réutilisées
+    (sinon elles sont recréées, comme avant).
+    En mode minimal, si chemin_sortie affiche déjà ce planning (cf classeur_a_jour), il n'est pas réécrit.
+    Renvoie le nom du fichier créé, ou None si le fichier était déjà à jour.
+    """
+
+    if minimal and classeur_a_jour(chemin_entree, chemin_sortie, resultat, planning_initial, mdc, preferences, implications, jours_fixes, collisions, jours_off, jours_attributs):
+        return None
+
+    wb = load_workbook(chemin_entree)
+    styles = StylesClasseur(wb)
+
+    _feuille_resume(wb, styles, resultat, mdc, preferences, implications, minimal)
+    _feuille_legende(wb, minimal)
+
+    # modification de la feuille principale (remplissage colonne garde+astreinte, colorations)
+    _feuille_principale(wb.worksheets[0], styles, resultat, planning_initial, mdc, jours_fixes, collisions, jours_off, jours_attributs)
+
+    _sauvegarde_atomique(wb, chemin_sortie)
+    wb.close()
+    return os.path.basename(chemin_sortie)
+
+def _exporter_classeur(args):
+    return exporter_classeur(*args)
+
+def exporter_classeurs(taches, nb_processus=None):
+    """
+    Exporte plusieurs classeurs (une tâche = les arguments de exporter_classeur), un classeur par processus.
+    Renvoie les noms des fichiers créés, dans l'ordre des tâches (None pour les fichiers déjà à jour, non réécrits).
+    """
+
+    if nb_processus is None:
+        nb_processus = min(len(taches), os.cpu_count() or 1)
+
+    if nb_processus <= 1 or len(taches) <= 1:
+        return [exporter_classeur(*tache) for tache in taches]
+
+    with ProcessPoolExecutor(max_workers=nb_processus) as executor:
+        return list(executor.map(_exporter_classeur, taches))
@@ -0,0 +1,310 @@
+import numpy as np
+from dataclasses import dataclass, field
+from typing import List
+
+from config import ENABLE_OFF_AFTER_GARDE, NEG_PREF_TEAM
+from probleme import masque_jours
+
+"""
+Analyse de faisabilité, après la lecture des fichiers et avant l'optimisation (cf gardien.run).
+
+Sans elle, une instance impossible n'est découverte qu'au fond de forcer_contrainte ("Aucun médecin disponible...")
+après plusieurs minutes d'ACO, ou seulement après coup (attributs manquants, etc.).
+Ici on vérifie en quelques millisecondes, à partir des seules données d'entrée :
+
+Erreurs (l'optimisation ne peut pas aboutir) :
+-équipe trop petite (il faut 2 médecins par jour, 3 avec le jour OFF après la garde)
+-cases soulignées incompatibles entre elles : même médecin deux fois le même jour, ou qui travaille le lendemain
+ d'une garde soulignée
+-jours sans aucun couple (garde, astreinte) possible, ou dont aucun couple n'est compatible avec ceux de la veille
+ (jour OFF après la garde), compte tenu des seules contraintes dures de l'équipe : c'est ce qui fait échouer forcer_contrainte
+
+Avertissements (l'optimisation aboutira, mais le critère ne pourra pas être entièrement satisfait) :
+-cases soulignées en collision avec celles d'une autre équipe (ou avec le planning d'une équipe non optimisée)
+-jours où il n'y a pas assez de médecins libres : collisions avec les autres équipes inévitables
+-gardes sur préférence négative inévitables
+-attributs qu'aucun médecin disponible ne peut couvrir
+-nombres cibles (implications) impossibles à atteindre
+
+Un médecin est exclu d'un créneau s'il est de garde la veille ou travaille le lendemain (case fixée, avec le jour OFF
+après la garde), ou s'il est le médecin initial d'un jour en gras. Il est seulement indisponible (avertissements) s'il est
+pris ce jour-là dans une autre équipe (case soulignée, ou planning d'une équipe qui n'est pas optimisée)
+ou si sa préférence vaut NEG_PREF_TEAM ou moins : l'optimisation ne fait alors que le pénaliser.
+"""
+
+ERREUR = 'erreur'
+AVERTISSEMENT = 'avertissement'
+
+class ErreurFaisabilite(Exception):
+    """
+    Instance impossible à optimiser (le message, déjà formaté pour l'affichage, liste les erreurs).
+    """
+
+@dataclass
+class Diagnostic:
+    gravite: str # ERREUR ou AVERTISSEMENT
+    equipe: int # indice de l'équipe
+    fichier: str
+    message: str
+    jours: List[int] = field(default_factory=list) # jours concernés (à partir de 0)
+
+    @property
+    def bloquant(self):
+        return self.gravite == ERREUR
+
+    def __str__(self):
+        if self.bloquant:
+            entete = "\033[1m\033[31m[ERREUR]\033[0m"
+        else:
+            entete = "\033[1m\033[33m[GARDIEN]\033[0m"
+        texte = f"{entete} \033[1m\033[34mÉquipe {self.equipe+1}\033[0m (\033[1m\033[33m{self.fichier}\033[0m) : {self.message}"
+        if self.jours:
+            texte += " (jours " + ", ".join(f"\033[1m{jour+1}\033[0m" for jour in self.jours) + ")"
+        return texte
+
+def _occupations(problemes, registre, D_max):
+    """
+    Cases fixées de chaque équipe, sous forme de tableaux (médecin global x jour) :
+    charge (nombre de créneaux) et gardes, pour les cases soulignées d'une part,
+    et pour toutes les cases qui ne bougeront pas (soulignées + plannings non optimisés) d'autre part.
+    """
+
+    G = len(registre)
+    occupations = []
+    for eq, probleme in enumerate(problemes):
+        D = probleme.D
+        planning = np.asarray(probleme.planning_initial, dtype=int).reshape(2, D)
+        planning_global = registre.vers_global(eq, planning)
+        jours = np.broadcast_to(np.arange(D), planning.shape)
+
+        souligne = masque_jours(probleme.jours_soulignes, D) & (planning != -1)
+        fixe = (planning != -1) if probleme.skip_optim else souligne
+
+        occupation = {}
+        for nom, masque in (('souligne', souligne), ('fixe', fixe)):
+            charge = np.zeros((G, D_max), dtype=int)
+            np.add.at(charge, (planning_global[masque], jours[masque]), 1)
+            gardes = np.zeros((G, D_max), dtype=bool)
+            gardes[planning_global[0][masque[0]], np.flatnonzero(masque[0])] = True
+            occupation[nom] = (charge, gardes)
+        occupations.append(occupation)
+    return occupations
+
+def _capacite_gardes(eligible):
+    """
+    Nombre maximal de gardes sur les jours eligible (D,) bool, avec au moins un jour d'écart entre deux gardes si
+    le jour OFF après la garde est actif (glouton : on prend chaque jour possible dès qu'on peut).
+    """
+
+    if not ENABLE_OFF_AFTER_GARDE:
+        return int(eligible.sum())
+    capacite = 0
+    dernier = -2
+    for jour in np.flatnonzero(eligible):
+        if jour > dernier + 1:
+            capacite += 1
+            dernier = jour
+    return capacite
+
+def _eligibles(exclu, charge, gardes, planning, gras, souligne):
+    """
+    Médecins possibles (N, D) pour les gardes et pour les astreintes d'une équipe.
+    exclu: (N, D) médecins exclus d'office
+    charge, gardes: (N, D) occupation fixée des médecins (nombre de créneaux, gardes), pour le jour OFF après la garde
+    planning: (2, D) planning initial, gras et souligne: (2, D) masques des jours en gras et soulignés
+    """
+
+    N, D = exclu.shape
+    exclu_gardes = exclu.copy()
+    exclu_astreintes = exclu.copy()
+    if ENABLE_OFF_AFTER_GARDE:
+        exclu_gardes[:, 1:] |= gardes[:, :-1] # de garde la veille
+        exclu_astreintes[:, 1:] |= gardes[:, :-1]
+        exclu_gardes[:, :-1] |= charge[:, 1:] > 0 # travaille le lendemain
+
+    eligibles = [~exclu_gardes, ~exclu_astreintes]
+    for s in range(2):
+        jours_gras = np.flatnonzero(gras[s])
+        eligibles[s][planning[s, jours_gras], jours_gras] = False # le médecin initial d'un jour en gras doit changer
+    for s in range(2):
+        # créneau souligné : seul le médecin fixé (les conflits sont signalés à part), qui est pris pour l'autre créneau
+        jours_fixes = np.flatnonzero(souligne[s])
+        eligibles[s][:, jours_fixes] = False
+        eligibles[s][planning[s, jours_fixes], jours_fixes] = True
+        eligibles[1 - s][planning[s, jours_fixes], jours_fixes] = False
+    return eligibles
+
+def _jours_sans_enchainement(eligible_gardes, eligible_astreintes):
+    """
+    Programmation dynamique sur les jours : atteignable[g] = il existe une affectation des jours 0..t (garde ≠ astreinte,
+    jour OFF après la garde) dont la garde du jour t est g.
+    Renvoie les jours sans couple possible, et ceux dont aucun couple n'est compatible avec la veille.
+    (après un tel jour, on repart de zéro pour signaler aussi les suivants)
+    """
+
+    N, D = eligible_gardes.shape
+    sans_couple = []
+    sans_enchainement = []
+    autres = ~np.eye(N, dtype=bool) # autres[g, g'] = g != g'
+
+    atteignable = None
+    for t in range(D):
+        G_t = eligible_gardes[:, t]
+        A_t = eligible_astreintes[:, t]
+        nb_A = A_t.sum()
+
+        # couples du jour seul : une astreinte possible différente de la garde
+        possible = G_t & (nb_A - A_t >= 1)
+        if not possible.any():
+            sans_couple.append(t)
+            atteignable = None
+            continue
+
+        if atteignable is None or not ENABLE_OFF_AFTER_GARDE:
+            atteignable = possible
+            continue
+
+        # garde g le jour t après la garde p la veille : g != p, et une astreinte différente de g et de p
+        nb_astreintes = nb_A - A_t[:, None] - A_t[None, :] # [g, p]
+        compatible = autres & G_t[:, None] & atteignable[None, :] & (nb_astreintes >= 1)
+        suivant = compatible.any(axis=1)
+        if not suivant.any():
+            sans_enchainement.append(t)
+            suivant = possible
+        atteignable = suivant
+
+    return sans_couple, sans_enchainement
+
+def analyser(problemes, registre):
+    """
+    Analyse de faisabilité de toutes les équipes (cf en haut du fichier).
+
+    problemes: ProblemeEquipe de chaque équipe (cf probleme.py)
+    registre: RegistreMedecins (cf registre.py)
+
+    Renvoie la liste des Diagnostic (vide si rien à signaler), erreurs d'abord.
+    """
+
+    diagnostics = []
+    if not problemes:
+        return diagnostics
+
+    D_max = max(probleme.D for probleme in problemes)
+    occupations = _occupations(problemes, registre, D_max)
+
+    charge_souligne = sum(occupation['souligne'][0] for occupation in occupations)
+    gardes_souligne = np.any([occupation['souligne'][1] for occupation in occupations], axis=0)
+    charge_fixe = sum(occupation['fixe'][0] for occupation in occupations)
+    gardes_fixe = np.any([occupation['fixe'][1] for occupation in occupations], axis=0)
+
+    # conflits entre cases fixées, dont au moins une soulignée : (médecin global, jour)
+    collisions = (charge_fixe >= 2) & (charge_souligne >= 1)
+    off = np.zeros_like(collisions) # off[g, t] : garde le jour t puis travail le jour t+1, l'un des deux souligné
+    if ENABLE_OFF_AFTER_GARDE:
+        off[:, :-1] = gardes_fixe[:, :-1] & (charge_fixe[:, 1:] > 0) & (gardes_souligne[:, :-1] | (charge_souligne[:, 1:] > 0))
+
+    for eq, (probleme, occupation) in enumerate(zip(problemes, occupations)):
+        if probleme.skip_optim:
+            continue
+
+        N, D = probleme.N, probleme.D
+        fichier = probleme.fichier
+        mdc_global = registre.local_vers_global[eq]
+        preferences = np.asarray(probleme.preferences, dtype=float)
+        planning = np.asarray(probleme.planning_initial, dtype=int).reshape(2, D)
+
+        minimum = 3 if ENABLE_OFF_AFTER_GARDE and D > 1 else 2
+        if N < minimum:
+            diagnostics.append(Diagnostic(ERREUR, eq, fichier, f"au moins \033[1m{minimum}\033[0m médecins sont nécessaires (\033[1m{N}\033[0m trouvés)"))
+            continue
+
+        # cases soulignées en conflit : entre elles (erreur), ou avec les cases fixées des autres équipes (collision inévitable)
+        souligne = masque_jours(probleme.jours_soulignes, D) & (planning != -1)
+        planning_global = np.where(planning != -1, mdc_global[planning], 0)
+        charge_eq, gardes_eq = occupation['souligne']
+        collisions_eq = charge_eq >= 2
+        off_eq = np.zeros_like(collisions_eq)
+        if ENABLE_OFF_AFTER_GARDE:
+            off_eq[:, :-1] = gardes_eq[:, :-1] & (charge_eq[:, 1:] > 0)
+
+        def jours_conflit(collisions, off):
+            conflit = souligne & collisions[planning_global, np.arange(D)]
+            conflit[0] |= souligne[0] & off[planning_global[0], np.arange(D)]
+            veille = np.zeros((2, D), dtype=bool)
+            veille[:, 1:] = off[planning_global[:, 1:], np.arange(D - 1)]
+            conflit |= souligne & veille
+            return conflit.any(axis=0)
+
+        conflit_equipe = jours_conflit(collisions_eq, off_eq)
+        conflit_autres = jours_conflit(collisions, off) & ~conflit_equipe
+        if conflit_equipe.any():
+            diagnostics.append(Diagnostic(ERREUR, eq, fichier, "cases soulignées incompatibles (même médecin deux fois le même jour, ou le lendemain d'une garde)", np.flatnonzero(conflit_equipe).tolist()))
+        if conflit_autres.any():
+            diagnostics.append(Diagnostic(AVERTISSEMENT, eq, fichier, "cases soulignées en collision avec les cases fixées d'une autre équipe", np.flatnonzero(conflit_autres).tolist()))
+
+        # disponibilités (N, D) de chaque créneau, deux fois :
+        # -contraintes dures seulement (jour OFF après les cases fixées de l'équipe, jours en gras, cases soulignées) :
+        #  ce sont celles que forcer_contrainte impose, un jour impossible ici fait échouer l'optimisation (erreur)
+        # -en plus, médecins pris dans les autres équipes ou de préférence NEG_PREF_TEAM : l'optimisation ne fait que
+        #  les pénaliser, un jour impossible ici donnera une collision ou une garde non souhaitée (avertissement)
+        gras = masque_jours(probleme.jours_gras, D) & (planning != -1)
+        charge_equipe, gardes_equipe = occupation['fixe'][0][mdc_global, :D], occupation['fixe'][1][mdc_global, :D]
+        charge_autres = charge_fixe[mdc_global, :D] - charge_equipe
+
+        eligible_gardes_dures, eligible_astreintes_dures = _eligibles(np.zeros((N, D), dtype=bool), charge_equipe, gardes_equipe, planning, gras, souligne)
+        eligible_gardes, eligible_astreintes = _eligibles((preferences <= NEG_PREF_TEAM) | (charge_autres > 0), charge_fixe[mdc_global, :D], gardes_fixe[mdc_global, :D], planning, gras, souligne)
+
+        sans_couple, sans_enchainement = _jours_sans_enchainement(eligible_gardes_dures, eligible_astreintes_dures)
+        if sans_couple:
+            diagnostics.append(Diagnostic(ERREUR, eq, fichier, "aucun couple (garde, astreinte) de médecins possible", sans_couple))
+        if sans_enchainement:
+            diagnostics.append(Diagnostic(ERREUR, eq, fichier, "aucun couple (garde, astreinte) compatible avec le jour OFF après les gardes de la veille", sans_enchainement))
+
+        if not sans_couple and not sans_enchainement:
+            jours_bloques = sorted(set().union(*_jours_sans_enchainement(eligible_gardes, eligible_astreintes)))
+            if jours_bloques:
+                diagnostics.append(Diagnostic(AVERTISSEMENT, eq, fichier, "pas assez de médecins libres (pris dans une autre équipe ou indisponibles) : collisions inévitables", jours_bloques))
+
+        # gardes sur préférence négative inévitables (jours non soulignés)
+        pref_negative = ~np.any(eligible_gardes & (preferences >= 0), axis=0) & eligible_gardes.any(axis=0) & ~souligne[0]
+        if pref_negative.any():
+            diagnostics.append(Diagnostic(AVERTISSEMENT, eq, fichier, "tous les médecins disponibles pour la garde ont une préférence négative", np.flatnonzero(pref_negative).tolist()))
+
+        # attributs
+        for nom_attribut, avec_attribut in (probleme.attributs or {}).items():
+            avec_attribut = np.asarray(avec_attribut, dtype=bool)
+            if not avec_attribut.any():
+                diagnostics.append(Diagnostic(AVERTISSEMENT, eq, fichier, f"aucun médecin n'a l'attribut \033[1m\033[35m{nom_attribut}\033[0m"))
+                continue
+            couvert = np.any((eligible_gardes | eligible_astreintes) & avec_attribut[:, None], axis=0)
+            if not couvert.all():
+                diagnostics.append(Diagnostic(AVERTISSEMENT, eq, fichier, f"aucun médecin disponible avec l'attribut \033[1m\033[35m{nom_attribut}\033[0m", np.flatnonzero(~couvert).tolist()))
+
+        # nombres cibles (implications)
+        implications = probleme.implications
+        if implications:
+            cibles_gardes = np.asarray(implications['gardes'], dtype=float)
+            cibles_astreintes = np.asarray(implications['astreintes'], dtype=float)
+            if (cibles_gardes < 0).any() or (cibles_astreintes < 0).any():
+                diagnostics.append(Diagnostic(AVERTISSEMENT, eq, fichier, "nombres cibles négatifs : les cibles données dépassent le nombre de jours"))
+
+            capacites = np.array([_capacite_gardes(eligible_gardes[i]) for i in range(N)])
+            jours_travaillables = np.sum(eligible_gardes | eligible_astreintes, axis=1)
+            trop = (cibles_gardes > capacites + 0.5) | (cibles_gardes + cibles_astreintes > jours_travaillables + 0.5)
+            if trop.any():
+                noms = ", ".join(f"\033[1m\033[36m{probleme.mdc[i]}\033[0m" for i in np.flatnonzero(trop))
+                diagnostics.append(Diagnostic(AVERTISSEMENT, eq, fichier, f"nombres cibles supérieurs aux jours disponibles pour : {noms}"))
+
+    diagnostics.sort(key=lambda diagnostic: not diagnostic.bloquant)
+    return diagnostics
+
+def verifier(problemes, registre):
+    """
+    Comme analyser, mais lève ErreurFaisabilite s'il y a au moins une erreur. Renvoie les avertissements.
+    """
+
+    diagnostics = analyser(problemes, registre)
+    erreurs = [diagnostic for diagnostic in diagnostics if diagnostic.bloquant]
+    if erreurs:
+        raise ErreurFaisabilite("\n".join(str(erreur) for erreur in erreurs))
+    return diagnostics
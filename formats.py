@@ -0,0 +1,295 @@
+import os
+import csv
+import numpy as np
+
+from probleme import ProblemeEquipe, ErreurLecture, completer_implications, erreur_mdc, masque_jours, jours_masque
+from registre import RegistreMedecins
+from solve import solve_multi
+from faisabilite import verifier
+
+"""
+Formats d'entrée/sortie sans Excel, pour les traitements automatisés (pas d'openpyxl ni de pandas).
+
+Ils contiennent les mêmes informations que les fichiers Excel, mais le gras et le soulignage
+sont remplacés par des colonnes explicites ("à modifier" et "fixée").
+
+CSV : une table principale <equipe>.csv, avec les colonnes
+    jour, garde, astreinte, garde_a_modifier, astreinte_a_modifier, garde_fixee, astreinte_fixee, <mdc 1>, ..., <mdc N>
+  (garde/astreinte : nom du médecin, vide si non attribuée ; colonnes booléennes : 1/0 ; préférences : vide = 0)
+  et deux tables optionnelles, au même format que les feuilles Excel correspondantes :
+    <equipe>.attributs.csv : attribut, <mdc 1>, ..., <mdc N> (1/0)
+    <equipe>.implications.csv : type, <mdc 1>, ..., <mdc N> (lignes "gardes" et "astreintes", vide = non renseigné)
+
+NPZ : une archive <equipe>.npz avec les tableaux
+    mdc (N,), preferences (N, D), planning (2D,) (indices, -1 si vide), a_modifier (2, D), fixes (2, D),
+    noms_attributs (A,), attributs (A, N), implications (2, N) (nan = non renseigné)
+"""
+
+COLONNES_CSV = ['jour', 'garde', 'astreinte', 'garde_a_modifier', 'astreinte_a_modifier', 'garde_fixee', 'astreinte_fixee']
+
+def _booleen(valeur):
+    return str(valeur).strip().lower() in ('1', 'true', 'vrai', 'x', 'oui', 'yes')
+
+def _nombre(valeur, fichier, description):
+    valeur = valeur.strip()
+    if valeur == '':
+        return None
+    try:
+        return float(valeur)
+    except ValueError:
+        raise ErreurLecture(f"\033[1m\033[31m[ERREUR]\033[0m Dans le fichier \033[1m\033[33m{fichier}\033[0m : valeur non numérique (\033[1m{valeur}\033[0m) pour {description}")
+
+def _texte_nombre(valeur):
+    valeur = float(valeur)
+    return str(int(valeur)) if valeur.is_integer() else repr(valeur) # repr : pas de perte de précision
+
+def _chemins_annexes(chemin):
+    base = os.path.splitext(chemin)[0]
+    return f"{base}.attributs.csv", f"{base}.implications.csv"
+
+def _lire_table(chemin):
+    """
+    Lignes non vides d'une table CSV. Lève ErreurLecture si le fichier n'en a aucune (pas même la ligne d'en-tête).
+    """
+
+    with open(chemin, newline='', encoding='utf-8') as f:
+        lignes = [ligne for ligne in csv.reader(f) if any(cellule.strip() for cellule in ligne)]
+    if not lignes:
+        raise ErreurLecture(f"\033[1m\033[31m[ERREUR]\033[0m Le fichier \033[1m\033[33m{os.path.basename(chemin)}\033[0m est vide")
+    return lignes
+
+def charger_csv(chemin):
+    """
+    Lit une équipe au format CSV (table principale + tables attributs/implications si elles existent).
+    """
+
+    fichier = os.path.basename(chemin)
+    lignes = _lire_table(chemin)
+    entetes = lignes[0]
+    if [entete.strip() for entete in entetes[:len(COLONNES_CSV)]] != COLONNES_CSV:
+        raise ErreurLecture(f"\033[1m\033[31m[ERREUR]\033[0m Dans le fichier \033[1m\033[33m{fichier}\033[0m : les premières colonnes doivent être {', '.join(COLONNES_CSV)}")
+
+    mdc = entetes[len(COLONNES_CSV):]
+    indices_mdc = {}
+    for i, nom in enumerate(mdc):
+        indices_mdc.setdefault(nom, i)
+
+    lignes = lignes[1:]
+    N, D = len(mdc), len(lignes)
+
+    preferences = np.zeros((N, D))
+    planning = np.full(2*D, -1, dtype=int)
+    masque_gras = np.zeros((2, D), dtype=bool)
+    masque_fixes = np.zeros((2, D), dtype=bool)
+    toutes_cases_remplies = True
+
+    for jour, ligne in enumerate(lignes):
+        ligne = ligne + [''] * (len(entetes) - len(ligne))
+        garde, astreinte = ligne[1].strip(), ligne[2].strip()
+
+        planning[jour] = indices_mdc.get(garde, -1) if garde else -1
+        planning[D + jour] = indices_mdc.get(astreinte, -1) if astreinte else -1
+        if not garde or not astreinte:
+            toutes_cases_remplies = False
+
+        masque_gras[:, jour] = _booleen(ligne[3]), _booleen(ligne[4])
+        masque_fixes[:, jour] = _booleen(ligne[5]), _booleen(ligne[6])
+
+        for i in range(N):
+            pref = _nombre(ligne[len(COLONNES_CSV) + i], fichier, f"le médecin {mdc[i]} au jour {jour+1}")
+            if pref is not None:
+                preferences[i, jour] = pref
+
+    probleme = ProblemeEquipe(
+        fichier=fichier,
+        mdc=mdc,
+        preferences=preferences,
+        planning_initial=planning.tolist(),
+        jours_gras=jours_masque(masque_gras),
+        jours_soulignes=jours_masque(masque_fixes),
+        toutes_cases_remplies=toutes_cases_remplies,
+        aucune_case_gras=not masque_gras.any(),
+    )
+
+    chemin_attributs, chemin_implications = _chemins_annexes(chemin)
+    implications = {'gardes': np.full(N, np.nan), 'astreintes': np.full(N, np.nan)}
+
+    if os.path.exists(chemin_attributs):
+        lignes = _lire_table(chemin_attributs)
+        if lignes[0][1:] != mdc:
+            raise erreur_mdc(fichier, "attributs", mdc, lignes[0][1:])
+        for ligne in lignes[1:]:
+            probleme.attributs[ligne[0]] = [_booleen(valeur) for valeur in (ligne[1:] + [''] * N)[:N]]
+
+    if os.path.exists(chemin_implications):
+        lignes = _lire_table(chemin_implications)
+        if lignes[0][1:] != mdc:
+            raise erreur_mdc(fichier, "implications", mdc, lignes[0][1:])
+        for ligne in lignes[1:]:
+            cle = ligne[0].lower().strip()
+            if cle in implications:
+                valeurs = [_nombre(valeur, fichier, f"les implications ({cle})") for valeur in (ligne[1:] + [''] * N)[:N]]
+                implications[cle] = np.array([np.nan if valeur is None else valeur for valeur in valeurs])
+
+    probleme.implications = completer_implications(implications, preferences)
+    return probleme
+
+def _planning_a_ecrire(probleme, planning):
+    """
+    Renvoie (planning, masque des jours à modifier) à écrire : le planning initial tel quel,
+    ou un planning optimisé (dans ce cas, plus rien n'est à modifier, comme à l'export Excel).
+    """
+
+    if planning is None:
+        return np.asarray(probleme.planning_initial), masque_jours(probleme.jours_gras, probleme.D)
+    return np.asarray(planning), np.zeros((2, probleme.D), dtype=bool)
+
+def ecrire_csv(chemin, probleme: ProblemeEquipe, planning=None):
+    """
+    Écrit une équipe au format CSV (table principale + tables attributs et implications).
+    Si planning est donné (par exemple le résultat de solve_multi), il remplace le planning initial.
+    """
+
+    D = probleme.D
+    planning, masque_gras = _planning_a_ecrire(probleme, planning)
+    masque_fixes = masque_jours(probleme.jours_soulignes, D)
+
+    def nom(mdc):
+        return probleme.mdc[mdc] if mdc != -1 else ''
+
+    with open(chemin, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLONNES_CSV + list(probleme.mdc))
+        for jour in range(D):
+            writer.writerow(
+                [jour + 1, nom(planning[jour]), nom(planning[D + jour])]
+                + [int(masque_gras[0, jour]), int(masque_gras[1, jour]), int(masque_fixes[0, jour]), int(masque_fixes[1, jour])]
+                + [_texte_nombre(pref) for pref in probleme.preferences[:, jour]]
+            )
+
+    chemin_attributs, chemin_implications = _chemins_annexes(chemin)
+
+    # table écrite même sans attribut (en-tête seul) : sinon, une ancienne table resterait à côté et serait relue
+    with open(chemin_attributs, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['attribut'] + list(probleme.mdc))
+        for nom_attribut, valeurs in probleme.attributs.items():
+            writer.writerow([nom_attribut] + [int(valeur) for valeur in valeurs])
+
+    with open(chemin_implications, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['type'] + list(probleme.mdc))
+        for cle in ('gardes', 'astreintes'):
+            writer.writerow([cle] + [_texte_nombre(valeur) for valeur in probleme.implications[cle]])
+
+def charger_npz(chemin):
+    """
+    Lit une équipe au format NPZ.
+    """
+
+    with np.load(chemin, allow_pickle=False) as archive:
+        mdc = archive['mdc'].tolist()
+        preferences = archive['preferences'].astype(float)
+        planning = archive['planning'].astype(int)
+        masque_gras = archive['a_modifier']
+        masque_fixes = archive['fixes']
+        attributs = {nom: valeurs.tolist() for nom, valeurs in zip(archive['noms_attributs'].tolist(), archive['attributs'])}
+        implications = {'gardes': archive['implications'][0].astype(float), 'astreintes': archive['implications'][1].astype(float)}
+
+    return ProblemeEquipe(
+        fichier=os.path.basename(chemin),
+        mdc=mdc,
+        preferences=preferences,
+        planning_initial=planning.tolist(),
+        jours_gras=jours_masque(masque_gras),
+        jours_soulignes=jours_masque(masque_fixes),
+        toutes_cases_remplies=bool(np.all(planning != -1)),
+        aucune_case_gras=not masque_gras.any(),
+        attributs=attributs,
+        implications=completer_implications(implications, preferences),
+    )
+
+def ecrire_npz(chemin, probleme: ProblemeEquipe, planning=None):
+    """
+    Écrit une équipe au format NPZ (compressé).
+    Si planning est donné (par exemple le résultat de solve_multi), il remplace le planning initial.
+    """
+
+    planning, masque_gras = _planning_a_ecrire(probleme, planning)
+
+    np.savez_compressed(
+        chemin,
+        mdc=np.array(probleme.mdc, dtype=str),
+        preferences=np.asarray(probleme.preferences, dtype=float),
+        planning=planning.astype(np.int64),
+        a_modifier=masque_gras,
+        fixes=masque_jours(probleme.jours_soulignes, probleme.D),
+        noms_attributs=np.array(list(probleme.attributs.keys()), dtype=str),
+        attributs=np.array(list(probleme.attributs.values()), dtype=bool).reshape(len(probleme.attributs), probleme.N),
+        implications=np.stack([probleme.implications['gardes'], probleme.implications['astreintes']]).astype(float),
+    )
+
+def charger_probleme(chemin):
+    """
+    Lit une équipe en fonction de l'extension du fichier (.csv, .npz ou .xlsx).
+    """
+
+    extension = os.path.splitext(chemin)[1].lower()
+    if extension == '.csv':
+        return charger_csv(chemin)
+    if extension == '.npz':
+        return charger_npz(chemin)
+    if extension == '.xlsx':
+        from lecture import charger_classeur # import local : openpyxl n'est nécessaire que pour les fichiers Excel
+        return charger_classeur(chemin)
+    raise ErreurLecture(f"\033[1m\033[31m[ERREUR]\033[0m Format de fichier non supporté : \033[1m\033[33m{os.path.basename(chemin)}\033[0m")
+
+def ecrire_probleme(chemin, probleme: ProblemeEquipe, planning=None):
+    """
+    Écrit une équipe en fonction de l'extension du fichier (.csv ou .npz).
+    """
+
+    extension = os.path.splitext(chemin)[1].lower()
+    if extension == '.csv':
+        return ecrire_csv(chemin, probleme, planning)
+    if extension == '.npz':
+        return ecrire_npz(chemin, probleme, planning)
+    raise ValueError(f"Format de sortie non supporté : {extension}")
+
+def resoudre_fichiers(chemins, dossier_sortie, format_sortie='.csv', options_portfolio=None, afficher=True):
+    """
+    Chaîne complète sans Excel : lecture des équipes, optimisation (solve_multi) et écriture des résultats
+    dans dossier_sortie (un fichier par équipe, au format format_sortie).
+    afficher: affiche ou non les barres de progression de l'optimisation.
+    Renvoie les chemins des fichiers écrits et les scores finaux.
+    Lève ErreurFaisabilite si l'analyse de faisabilité trouve une erreur (cf faisabilite.py).
+    """
+
+    problemes = [charger_probleme(chemin) for chemin in chemins]
+    registre = RegistreMedecins([probleme.mdc for probleme in problemes])
+    verifier(problemes, registre) # lève ErreurFaisabilite si une équipe ne peut pas être optimisée (cf faisabilite.py)
+
+    resultat_eqs, scores_eqs = solve_multi(
+        [probleme.N for probleme in problemes],
+        [probleme.D for probleme in problemes],
+        [probleme.preferences for probleme in problemes],
+        [registre.reductions(eq) for eq in range(len(problemes))],
+        [probleme.attributs for probleme in problemes],
+        [probleme.implications for probleme in problemes],
+        registre,
+        [probleme.planning_initial for probleme in problemes],
+        [probleme.jours_gras for probleme in problemes],
+        [probleme.jours_soulignes for probleme in problemes],
+        [probleme.skip_optim for probleme in problemes],
+        options_portfolio=options_portfolio,
+        afficher=afficher,
+    )
+
+    os.makedirs(dossier_sortie, exist_ok=True)
+    chemins_sortie = []
+    for chemin, probleme, resultat in zip(chemins, problemes, resultat_eqs):
+        chemin_sortie = os.path.join(dossier_sortie, os.path.splitext(os.path.basename(chemin))[0] + format_sortie)
+        ecrire_probleme(chemin_sortie, probleme, resultat)
+        chemins_sortie.append(chemin_sortie)
+
+    return chemins_sortie, scores_eqs
@@ -1,15 +1,23 @@
 import os
-import pandas as pd
+import sys
+import argparse
 import random
 import numpy as np
 import time
 from typing import Dict, List
 
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill, Font
-from openpyxl.utils import get_column_letter
-
 from solve import solve_multi
+from probleme import ErreurLecture
+from registre import RegistreMedecins
+from cache import charger_classeurs_caches, DOSSIER_CACHE
+from reprise import FICHIER_REPRISE
+from replanification import RAYON_FENETRE, FICHIER_PREFERENCES, charger_preferences_plans, enregistrer_preferences_plans
+from definition import ErreurReparation
+from export import exporter_classeurs
+from validation import valider
+from traces import Trace
+from faisabilite import analyser
+import profilage
 
 MAX_DIST = 10
 
@@ -30,21 +38,61 @@ couleur_gardien = '\033[35m'
 def print_ascii():
     print(f"\033[1m\033[31m{ascii_art}\033[0m")
 
-def main():
-    dir = input(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Répertoire où se trouvent les fichiers Excel (.xlsx) : ")
-    dir = dir.strip()
-    dir = dir.replace("\\ ", " ")
-    dir = os.path.abspath(dir)
+def _silence(*args, **kwargs):
+    pass
 
-    verbose = True
+def run(repertoire, mode='N', options_portfolio=None, afficher=True, pauses=False, profil=None, dossier_traces=None, format_traces='.csv', fenetre=None):
+    """
+    Lance Gardien sur tous les fichiers Excel (.xlsx) de repertoire, sans aucune question posée
+    (utilisable depuis un script ou une tâche planifiée, cf aussi la ligne de commande en bas de ce fichier).
+
+    mode: 'R' pour remplacer les fichiers existants, 'N' pour créer de nouveaux fichiers (<nom>_resultat.xlsx)
+    options_portfolio: si donné, chaque planning est optimisé par solve_portfolio avec ces options (cf solve_multi)
+    afficher: affiche ou non la progression (messages, barres de progression). Les erreurs sont toujours affichées.
+    pauses: marque une courte pause entre les phases, pour laisser le temps de lire (mode interactif)
+
+    profil: chemin du rapport de profilage (JSON, cf profilage.py) à écrire à la fin.
+    Par défaut, celui donné par la variable d'environnement GARDIEN_PROFIL (pas de profilage si elle n'est pas définie).
+    dossier_traces: si donné, la trace de convergence de chaque équipe y est enregistrée (<fichier>_trace.csv, cf traces.py)
+    format_traces: '.csv' ou '.npz'
+    fenetre: si donné (rayon en jours), re-planification incrémentale : seuls les jours autour des créneaux concernés
+    (cases en gras, cases vides, médecins indisponibles) sont réoptimisés, le reste du planning ne change pas (cf replanification.py)
+
+    Renvoie un dictionnaire (fichiers, résultats, scores, fichiers créés et inchangés), ou None en cas d'erreur.
+    """
 
-    while True:
-        mode = input(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Remplacer les fichiers existants ou créer de Nouveaux fichiers ? (R/N) : ").strip().upper()
-        if mode in ['R', 'N']:
-            break
-        print(f"\033[1m\033[31m[ERREUR]\033[0m Veuillez répondre par 'R' (remplacer) ou 'N' (nouveaux fichiers)")
+    if profil is None:
+        profil = profilage.chemin_environnement()
+    if not profil:
+        return _run(repertoire, mode, options_portfolio, afficher, pauses, dossier_traces, format_traces, fenetre)
 
-    print()
+    profilage.activer()
+    try:
+        return _run(repertoire, mode, options_portfolio, afficher, pauses, dossier_traces, format_traces, fenetre)
+    finally:
+        # le rapport est écrit même si l'exécution s'est arrêtée en route (il dit jusqu'où elle est allée)
+        chemin = profilage.ecrire_rapport(profil)
+        profilage.activer(False)
+        if afficher:
+            print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Rapport de profilage : \033[1m\033[33m{chemin}\033[0m")
+
+def _run(repertoire, mode, options_portfolio, afficher, pauses, dossier_traces, format_traces, fenetre=None):
+    """
+    Corps de run (cf plus haut), chaque phase étant mesurée si le profilage est actif.
+    """
+
+    mode = mode.strip().upper()
+    if mode not in ['R', 'N']:
+        print(f"\033[1m\033[31m[ERREUR]\033[0m Mode inconnu : \033[1m{mode}\033[0m (attendu : 'R' pour remplacer ou 'N' pour nouveaux fichiers)")
+        return None
+
+    dir = os.path.abspath(repertoire)
+    dire = print if afficher else _silence
+    verbose = afficher
+
+    def pause():
+        if pauses:
+            time.sleep(1)
 
     try:
         excel_files = [
@@ -67,274 +115,71 @@ def main():
         return
 
     if len(excel_files) == 1:
-        print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m \033[1m{len(excel_files)}\033[0m fichier trouvé: \033[1m\033[33m{', '.join(excel_files)}\033[0m")
+        dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m \033[1m{len(excel_files)}\033[0m fichier trouvé: \033[1m\033[33m{', '.join(excel_files)}\033[0m")
     else:
-        print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m \033[1m{len(excel_files)}\033[0m fichiers trouvés: \033[1m\033[33m{', '.join(excel_files)}\033[0m")
+        dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m \033[1m{len(excel_files)}\033[0m fichiers trouvés: \033[1m\033[33m{', '.join(excel_files)}\033[0m")
 
-    eqs_to_global = []
-    global_to_eqs = []
     preferences_eqs = []
-    reductions_eqs = []
     attributs_eqs: List[Dict[str, List[bool]]] = []
     implications_eqs = []
     Ns = []
     Ds = []
     mdc_eqs = []
 
-    global_mdc = set()
-
     planning_initiaux = [] # stocke les valeurs initiales de chaque planning (si non vide)
     jours_a_modifier = [] # stocke les jours mis en gras (ie, à modifier)
     jours_fixes = [] # stocke les jours soulignés (ie, à fixer)
     doit_modifier = [] # pour chaque planning, dit si une optimisation doit être faite sur ce planning
     skip_optims = [] # idem (on skip l'optimisation si toutes les cases sont remplies et qu'aucune modif n'est demandée)
 
-    for file in excel_files:
-        df = pd.read_excel(os.path.join(dir, file)) # lecture première feuille
-        df = df.drop(df.columns[:3], axis=1) # lecture des préférences : on enlève les 3 premières colonnes ("jour", "garde", "astreinte")
-        df = df.fillna(0) # on remplace les cases vides par des 0
-
-        mdc = df.columns.to_list()
-        preferences = df.to_numpy().T
-        N, D = preferences.shape
-
-        wb = load_workbook(os.path.join(dir, file)) # on va parcourir la première feuille
-        ws = wb.worksheets[0]
-
-        gardes = [] # on collecte les valeurs dans la colonne "garde" (-1 si vide)
-        astreintes = [] # idem avec les astreintes
-        jours_gras = {'garde': [], 'astreinte': []} # stocker les jours en gros (à modifier)
-        jours_soulignes = {'garde': [], 'astreinte': []} # stocker les jours soulignés (à fixer)
-        
-        # parcours de la colonne "jour"
-        # si on détecte un jour souligné, on ajoute à jours_soulignes toutes les gardes et astreintes précédentes
-        for row in range(2, ws.max_row + 1):
-            if row == D+2:
-                break
-
-            if ws.cell(row=row, column=1).font.underline:
-                jours_soulignes['garde'].extend(range(row - 1))
-                jours_soulignes['garde'] = list(set(jours_soulignes['garde'])) # on évite ici les doublons en passant par set() puis list()
-                jours_soulignes['astreinte'].extend(range(row - 1))
-                jours_soulignes['astreinte'] = list(set(jours_soulignes['astreinte']))
-                break
-        
-        # parcours des colonnes "garde" et "astreinte"
-        for row in range(2, ws.max_row + 1):
-            if row == D+2:
-                break
-
-            garde = ws.cell(row=row, column=2).value
-            astreinte = ws.cell(row=row, column=3).value
-            
-            # check si les cellules sont en gras (=à modifier)
-            if astreinte and ws.cell(row=row, column=2).font.bold:
-                jours_gras['garde'].append(row-2)
-            if garde and ws.cell(row=row, column=3).font.bold:
-                jours_gras['astreinte'].append(row-2)
-
-            # check si les cellules sont soulignées (=à fixer)
-            if garde and ws.cell(row=row, column=2).font.underline:
-                jours_soulignes['garde'].append(row-2)
-            if astreinte and ws.cell(row=row, column=3).font.underline:
-                jours_soulignes['astreinte'].append(row-2)
-            
-            # conversion des noms en indices (on utilise -1 pour les cases vides)
-            garde_idx = next((i for i, name in enumerate(mdc) if name == garde), -1) if garde else -1
-            astreinte_idx = next((i for i, name in enumerate(mdc) if name == astreinte), -1) if astreinte else -1
-            gardes.append(garde_idx)
-            astreintes.append(astreinte_idx)
-
-        toutes_cases_remplies = True
-        for row in range(2, ws.max_row + 1):
-            if row == D+2:
-                break
-
-            if (ws.cell(row=row, column=2).value is None or 
-                ws.cell(row=row, column=3).value is None):
-                toutes_cases_remplies = False
-                break
-        
-        aucune_case_gras = True
-        for row in range(2, ws.max_row + 1):
-            if row == D+2:
-                break
-
-            if (ws.cell(row=row, column=2).font.bold or 
-                ws.cell(row=row, column=3).font.bold):
-                aucune_case_gras = False
-                break
-        
-        wb.close()
+    # lecture des fichiers : un classeur par processus, chaque classeur est ouvert une seule fois (cf lecture.py)
+    # les fichiers qui n'ont pas changé depuis la dernière exécution sont lus depuis le cache (cf cache.py)
+    try:
+        with profilage.phase('lecture'):
+            problemes = charger_classeurs_caches([os.path.join(dir, file) for file in excel_files])
+    except ErreurLecture as e:
+        print(e)
+        return
 
-        planning_vide = all(g == -1 for g in gardes) and all(a == -1 for a in astreintes) # si que des -1 -> on a un planning vide
-        planning_initial = gardes + astreintes # construction du planning initiale (si vide, on aura ici que des -1)
-        skip_optim = not planning_vide and toutes_cases_remplies and aucune_case_gras # condition pour skipper l'optimisation
-        
-        planning_initiaux.append(planning_initial)
-        jours_a_modifier.append(jours_gras)
-        jours_fixes.append(jours_soulignes)
-        doit_modifier.append(not skip_optim)
-        skip_optims.append(skip_optim)
+    for file, probleme in zip(excel_files, problemes):
+        planning_initiaux.append(probleme.planning_initial)
+        jours_a_modifier.append(probleme.jours_gras)
+        jours_fixes.append(probleme.jours_soulignes)
+        doit_modifier.append(not probleme.skip_optim or fenetre is not None) # (en re-planification, cf solve_mono)
+        skip_optims.append(probleme.skip_optim)
         
-        if skip_optim and verbose:
-            print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m \033[1m\033[34m{file}\033[0m : Planning complet et sans modification demandée -> pas d'optimisation")
-
-        # tentative de lecture de la feuille "attributs"
-        try:
-            df_attributs = pd.read_excel(os.path.join(dir, file), sheet_name='attributs')
-
-            mdc_attributs = df_attributs.columns.tolist()[1:]
-            if mdc != mdc_attributs: # si les médecins ne correspondent pas entre feuille principale et feuille attributs
-                mdc_manquants = set(mdc) - set(mdc_attributs)
-                mdc_supplementaires = set(mdc_attributs) - set(mdc)
-                
-                error_msg = f"\033[1m\033[31m[ERREUR]\033[0m Dans le fichier \033[1m\033[33m{file}\033[0m :"
-                if mdc_manquants:
-                    error_msg += f"\nMédecins présents dans la feuille principale mais absents de la feuille attributs : \033[1m\033[36m{', '.join(mdc_manquants)}\033[0m"
-                if mdc_supplementaires:
-                    error_msg += f"\nMédecins présents dans la feuille attributs mais absents de la feuille principale : \033[1m\033[36m{', '.join(mdc_supplementaires)}\033[0m"
-                
-                print(error_msg)
-                return
-
-            attributs_eq = {}
-
-            # parcours de la feuille "attributs"
-            for _, row in df_attributs.iterrows():
-                nom_attribut = row.iloc[0]
-                valeurs = row.iloc[1:].astype(bool).tolist()
-                attributs_eq[nom_attribut] = valeurs
-                
-            attributs_eqs.append(attributs_eq)
-
-            if verbose:
-                print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Attributs trouvés pour \033[1m\033[34m{file}\033[0m :")
-                for attr, vals in attributs_eq.items():
-                    medecins_avec_attr = [m for m, v in zip(mdc, vals) if v]
-                    print(f"  - {attr}: {', '.join(medecins_avec_attr)}")
-        except ValueError: # si la feuille attributs n'exsite pas pour ce planning, on ajoute quand même {}
-            attributs_eqs.append({})
-
-        Ns.append(N)
-        Ds.append(D)
-        preferences_eqs.append(preferences)
-        mdc_eqs.append(mdc)
-        global_mdc.update(mdc)
-
-    global_mdc = list(global_mdc)
-
-    # à ce point, on a des indices propres à chaque équipe pour chaque médecin
-    # par exemple, si JMR apapartient à 2 équipes, son indice dans la 1ere peut être 6 mais dans la 2e ça peut être 2
-    # donc, ici, on construit deux objets eqs_to_global et global_to_eqs pour passer d'un indice exprimé dans une équipe à un indice exprimé dans une autre
-    # pour cela, on passe par les indices "global"
-    for mdc_eq in mdc_eqs:
-        eq_to_global = {i: global_mdc.index(member) for i, member in enumerate(mdc_eq)}
-        global_to_eq = {global_mdc.index(member): i for i, member in enumerate(mdc_eq)}
-
-        eqs_to_global.append(eq_to_global)
-        global_to_eqs.append(global_to_eq)
-
-    # ici, on calcule pour chaque médecin le nombre d'équipes auquel il appartient, et on stocke ça dans reductions.
-    # cela permet, si jamais on n'a pas d'implication donnée, de réduire l'implication de médecins qui sont dans plusieurs équipes
-    # cf FAQ pour plus de détails
-    nombre_equipes_global = {idx: sum([1 for mdc_eq in mdc_eqs if member in mdc_eq]) for idx, member in enumerate(global_mdc)}
-
-    for mdc_eq, global_to_eq in zip(mdc_eqs, global_to_eqs):
-        reductions = [None] * len(mdc_eq)
-        for mdc in nombre_equipes_global:
-            if mdc in global_to_eq:
-                reductions[global_to_eq[mdc]] = nombre_equipes_global[mdc]
-        reductions_eqs.append(np.array(reductions))
-
-    # nouvelle lecture des fichiers, pour lire la feuille "implications"
-    for file in excel_files:
-        df = pd.read_excel(os.path.join(dir, file))
-        df = df.drop(df.columns[:3], axis=1)
-        df = df.fillna(0)
-
-        mdc = df.columns.to_list()
-        preferences = df.to_numpy().T
-        N, D = preferences.shape
-
-        implications = {
-            'gardes': np.full(N, np.nan),
-            'astreintes': np.full(N, np.nan)
-        }
-
-        # tentative de lecture de la feuille "implications"
-        try:
-            df_implications = pd.read_excel(os.path.join(dir, file), sheet_name='implications')
-
-            mdc_implications = df_implications.columns.tolist()[1:]
-
-            # si les médecins ne correspondent pas (idem que "attributs")
-            if mdc != mdc_implications:
-                mdc_manquants = set(mdc) - set(mdc_implications)
-                mdc_supplementaires = set(mdc_implications) - set(mdc)
-                
-                error_msg = f"\033[1m\033[31m[ERREUR]\033[0m Dans le fichier \033[1m\033[33m{file}\033[0m :"
-                if mdc_manquants:
-                    error_msg += f"\nMédecins présents dans la feuille principale mais absents de la feuille implications : \033[1m\033[36m{', '.join(mdc_manquants)}\033[0m"
-                if mdc_supplementaires:
-                    error_msg += f"\nMédecins présents dans la feuille implications mais absents de la feuille principale : \033[1m\033[36m{', '.join(mdc_supplementaires)}\033[0m"
-                
-                print(error_msg)
-                return
-            
-            # on essaie de lire les valeurs des lignes "gardes" et "astreintes"
-            # pour plus de flexibilité, on va localiser ces lignes (plutot que de supposer que gardes est en 1er et astreintes en 2nd)
-            indices = {
-                'gardes': None,
-                'astreintes': None
-            }
-            for idx, row in df_implications.iterrows():
-                if str(row.iloc[0]).lower().strip() == 'gardes':
-                    indices['gardes'] = idx
-                elif str(row.iloc[0]).lower().strip() == 'astreintes':
-                    indices['astreintes'] = idx
-
-            implications['gardes'] = np.full(N, np.nan)
-            implications['astreintes'] = np.full(N, np.nan)
-
-            if indices['gardes'] is not None:
-                implications['gardes'] = df_implications.iloc[indices['gardes'], 1:].astype(float).values
-            if indices['astreintes'] is not None:
-                implications['astreintes'] = df_implications.iloc[indices['astreintes'], 1:].astype(float).values
-
-        except ValueError:
-            pass
-
-        # gestion des trous dans les implications (incluant le cas où tout est vide) (cf FAQ)
-        # pour les astreintes
-        masque_trous_astreintes = np.isnan(implications['astreintes'])
-        if masque_trous_astreintes.any():
-            nb_astreintes_manquantes = D - np.nansum(implications['astreintes'])
-            nb_medecins_sans_astreintes = np.sum(masque_trous_astreintes)
-            # distribution équitable des astreintes manquantes
-            implications['astreintes'][masque_trous_astreintes] = nb_astreintes_manquantes / nb_medecins_sans_astreintes
-
-        # Pour les gardes
-        masque_trous_gardes = np.isnan(implications['gardes'])
-        # on va calculer un poids pour chaque médecin, avec lequel on va pondéré les gardes qu'on lui donne (en nombre cible)
-        if masque_trous_gardes.any():
-            nb_gardes_manquantes = D - np.nansum(implications['gardes'])
-            # calculer les poids basés sur les préférences positives
-            poids = (preferences > 0).sum(axis=1)
-            poids_medecins_sans_gardes = poids[masque_trous_gardes]
-            if poids_medecins_sans_gardes.sum() > 0:
-                poids_medecins_sans_gardes = poids_medecins_sans_gardes / poids_medecins_sans_gardes.sum()
-            else:
-                # si aucune préférence positive, distribution uniforme
-                poids_medecins_sans_gardes = 1/reductions[masque_trous_gardes]
-                poids_medecins_sans_gardes = np.ones_like(poids_medecins_sans_gardes) / len(poids_medecins_sans_gardes)
-            implications['gardes'][masque_trous_gardes] = nb_gardes_manquantes * poids_medecins_sans_gardes
-
-        # normalisation (il faut que la somme des gardes cibles soit effectivement égale à la somme des gardes à attribuer)
-        implications['gardes'] = implications['gardes'] * (D / implications['gardes'].sum())
-        implications['astreintes'] = implications['astreintes'] * (D / implications['astreintes'].sum()) # idem pour les astreintes
-
-        implications_eqs.append(implications)
+        if probleme.skip_optim and fenetre is None and verbose:
+            dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m \033[1m\033[34m{file}\033[0m : Planning complet et sans modification demandée -> pas d'optimisation")
+
+        if probleme.attributs and verbose:
+            dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Attributs trouvés pour \033[1m\033[34m{file}\033[0m :")
+            for attr, vals in probleme.attributs.items():
+                medecins_avec_attr = [m for m, v in zip(probleme.mdc, vals) if v]
+                dire(f"  - {attr}: {', '.join(medecins_avec_attr)}")
+
+        attributs_eqs.append(probleme.attributs)
+        implications_eqs.append(probleme.implications)
+        Ns.append(probleme.N)
+        Ds.append(probleme.D)
+        preferences_eqs.append(probleme.preferences)
+        mdc_eqs.append(probleme.mdc)
+
+    # identifiants globaux des médecins (communs à toutes les équipes) et réductions (cf registre.py)
+    registre = RegistreMedecins(mdc_eqs)
+    reductions_eqs = [registre.reductions(eq) for eq in range(len(mdc_eqs))]
+
+    # analyse de faisabilité (cf faisabilite.py) : on s'arrête ici si une équipe ne peut pas être optimisée,
+    # plutôt qu'au milieu de l'optimisation
+    with profilage.phase('faisabilite'):
+        diagnostics = analyser(problemes, registre)
+    for diagnostic in diagnostics:
+        if diagnostic.bloquant:
+            print(diagnostic)
+        else:
+            dire(diagnostic)
+    if any(diagnostic.bloquant for diagnostic in diagnostics):
+        print(f"\033[1m\033[31m[ERREUR]\033[0m Planning impossible à optimiser : corrigez les fichiers avant de relancer Gardien.")
+        return
 
     # des prints
     for i, (planning_initial, jours_gras, doit_modif) in enumerate(zip(planning_initiaux, jours_a_modifier, doit_modifier)):
@@ -344,40 +189,66 @@ def main():
         if not jours_gras['garde'] and not jours_gras['astreinte']:
             continue
         
-        print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Modifications demandées pour \033[1m\033[34mÉquipe {i+1}\033[0m:")
+        dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Modifications demandées pour \033[1m\033[34mÉquipe {i+1}\033[0m:")
 
         if jours_gras['garde']:
-            print("  - Gardes à modifier aux jours :", end=" ")
-            print(", ".join([f"\033[1m{j+1}\033[0m" for j in jours_gras['garde']]))
+            dire("  - Gardes à modifier aux jours :", end=" ")
+            dire(", ".join([f"\033[1m{j+1}\033[0m" for j in jours_gras['garde']]))
             
         if jours_gras['astreinte']:
-            print("  - Astreintes à modifier aux jours :", end=" ")
-            print(", ".join([f"\033[1m{j+1}\033[0m" for j in jours_gras['astreinte']]))
+            dire("  - Astreintes à modifier aux jours :", end=" ")
+            dire(", ".join([f"\033[1m{j+1}\033[0m" for j in jours_gras['astreinte']]))
 
     if any(bool(jours_gras['garde']) or bool(jours_gras['astreinte']) for jours_gras in jours_a_modifier if jours_gras):
-        print()
+        dire()
 
-    print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m \033[1m{len(global_mdc)}\033[0m médecins uniques trouvés: ", end="")
-    print(", ".join([f"\033[1m\033[36m{mdc}\033[0m" for mdc in global_mdc]))
+    dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m \033[1m{len(registre)}\033[0m médecins uniques trouvés: ", end="")
+    dire(", ".join([f"\033[1m\033[36m{mdc}\033[0m" for mdc in registre.noms]))
 
     for i, (mdc_eq, file) in enumerate(zip(mdc_eqs, excel_files), 1):
-        print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m \033[1m\033[34mÉquipe {i}\033[0m (\033[1m\033[33m{file}\033[0m) : ", end="")
-        print(", ".join([f"\033[1m\033[36m{mdc}\033[0m" for mdc in mdc_eq]))
+        dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m \033[1m\033[34mÉquipe {i}\033[0m (\033[1m\033[33m{file}\033[0m) : ", end="")
+        dire(", ".join([f"\033[1m\033[36m{mdc}\033[0m" for mdc in mdc_eq]))
 
-    print()
-    print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Début de l'optimisation.")
+    dire()
+    dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Début de l'optimisation.")
 
     # LANCEMENT DE L'OPTIMISATION : 
     # -on passe toutes les donénes qu'on vient de lire.
     # -on reçoit les plannings et les scores finaux.
-    resultat_eqs, score_final_eqs = solve_multi(Ns, Ds, preferences_eqs, reductions_eqs, attributs_eqs, implications_eqs, eqs_to_global, global_to_eqs, planning_initiaux, jours_a_modifier, jours_fixes, skip_optims)
+    # traces de convergence (une par équipe), enregistrées après l'optimisation
+    traces = [Trace() for _ in excel_files] if dossier_traces is not None else None
 
-    print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Scores finaux par équipe : ", end="")
-    print(", ".join([f"\033[1m\033[34mÉquipe {i+1}\033[0m : \033[1m\033[36m{score:.0f}\033[0m" for i, score in enumerate(score_final_eqs)]))
+    # en re-planification, on compare les préférences à celles avec lesquelles chaque planning avait été fait (cf replanification.py)
+    chemin_preferences = os.path.join(dir, DOSSIER_CACHE, FICHIER_PREFERENCES)
+    preferences_precedentes = charger_preferences_plans(chemin_preferences, excel_files, preferences_eqs) if fenetre is not None else None
 
-    time.sleep(1)
+    # les équipes terminées sont enregistrées au fur et à mesure (cf reprise.py) : si l'exécution s'arrête en route,
+    # la suivante reprend à la première équipe non terminée
+    try:
+        with profilage.phase('optimisation'):
+            resultat_eqs, score_final_eqs = solve_multi(Ns, Ds, preferences_eqs, reductions_eqs, attributs_eqs, implications_eqs, registre, planning_initiaux, jours_a_modifier, jours_fixes, skip_optims, options_portfolio=options_portfolio, afficher=afficher, traces=traces, reprise=os.path.join(dir, DOSSIER_CACHE, FICHIER_REPRISE), fenetre=fenetre, preferences_precedentes=preferences_precedentes)
+    except ErreurReparation as e:
+        print(e)
+        terminees = getattr(e, 'equipes_terminees', [])
+        if terminees:
+            print(f"\033[1m\033[31m[ERREUR]\033[0m Équipes déjà optimisées, conservées dans \033[1m\033[33m{os.path.join(DOSSIER_CACHE, FICHIER_REPRISE)}\033[0m : \033[1m\033[33m{', '.join(excel_files[eq] for eq in terminees)}\033[0m")
+            print(f"\033[1m\033[31m[ERREUR]\033[0m Elles ne seront pas réoptimisées au prochain lancement si leurs fichiers ne changent pas et si les options sont les mêmes (portfolio, fenêtre).")
+        return
 
-    print()
+    enregistrer_preferences_plans(chemin_preferences, excel_files, preferences_eqs)
+
+    if traces is not None:
+        os.makedirs(dossier_traces, exist_ok=True)
+        chemins_traces = [trace.sauvegarder(os.path.join(dossier_traces, f"{os.path.splitext(file)[0]}_trace{format_traces}")) for file, trace in zip(excel_files, traces) if len(trace) > 0]
+        if chemins_traces:
+            dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Traces de convergence enregistrées dans \033[1m\033[33m{os.path.abspath(dossier_traces)}\033[0m")
+
+    dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Scores finaux par équipe : ", end="")
+    dire(", ".join([f"\033[1m\033[34mÉquipe {i+1}\033[0m : \033[1m\033[36m{score:.0f}\033[0m" for i, score in enumerate(score_final_eqs)]))
+
+    pause()
+
+    dire()
     # affichage des modifications par rapport au planning initial (si il y a)
     for i, (resultat_eq, planning_initial, doit_modif) in enumerate(zip(resultat_eqs, planning_initiaux, doit_modifier)):
         if not doit_modif:
@@ -388,7 +259,7 @@ def main():
         distance = np.sum(np.array(resultat_eq)[masque] != np.array(planning_initial)[masque])
         
         if distance > 0:
-            print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m \033[1m\033[34mÉquipe {i+1}\033[0m : \033[1m{distance}\033[0m changements par rapport au planning initial")
+            dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m \033[1m\033[34mÉquipe {i+1}\033[0m : \033[1m{distance}\033[0m changements par rapport au planning initial")
         
         if verbose:
             D = Ds[i]
@@ -397,427 +268,206 @@ def main():
                 if planning_initial[jour] != -1 and resultat_eq[jour] != planning_initial[jour]:
                     ancien_mdc = mdc_eqs[i][planning_initial[jour]]
                     nouveau_mdc = mdc_eqs[i][resultat_eq[jour]]
-                    print(f"  - Jour {jour+1}, garde : \033[1m\033[36m{ancien_mdc}\033[0m → \033[1m\033[36m{nouveau_mdc}\033[0m")
+                    dire(f"  - Jour {jour+1}, garde : \033[1m\033[36m{ancien_mdc}\033[0m → \033[1m\033[36m{nouveau_mdc}\033[0m")
                 
                 # changements d'astreinte
                 if planning_initial[D + jour] != -1 and resultat_eq[D + jour] != planning_initial[D + jour]:
                     ancien_mdc = mdc_eqs[i][planning_initial[D + jour]]
                     nouveau_mdc = mdc_eqs[i][resultat_eq[D + jour]]
-                    print(f"  - Jour {jour+1}, astreinte : \033[1m\033[36m{ancien_mdc}\033[0m → \033[1m\033[36m{nouveau_mdc}\033[0m")
+                    dire(f"  - Jour {jour+1}, astreinte : \033[1m\033[36m{ancien_mdc}\033[0m → \033[1m\033[36m{nouveau_mdc}\033[0m")
 
-    time.sleep(1)
+    pause()
+
+    # vérification de tous les plannings en une seule passe (cf validation.py) :
+    # le rapport ci-dessous et la coloration des fichiers exportés lisent ce même résultat
+    with profilage.phase('validation'):
+        validation = valider(resultat_eqs, Ds, registre, preferences_eqs, attributs_eqs)
 
     # fonction qui check les contraintes dures ainsi que les préférences attribuées
     # et print les jours où des problèmes sont detectés (ils seront aussi affichés dans le Excel, voir plus tard)
-    check_coherence(resultat_eqs, Ds, global_mdc, eqs_to_global)
+    check_coherence(validation, registre, afficher=afficher, pauses=pauses)
 
-    time.sleep(1)
+    pause()
 
-    # ici on parcours les plannings et on signales les "jours problématiques"
+    # ici on signale les "jours problématiques"
     # (ie les jours où une préférence négative a été attribuée)
-    total_jours_problemes = 0
-    for i, (resultat_eq, preferences_eq) in enumerate(zip(resultat_eqs, preferences_eqs)):
-        jours_problemes_eq = 0
-        for jour in range(Ds[i]):
-            mdc_garde = resultat_eq[jour]
-            preference = preferences_eq[mdc_garde, jour]
-
-            if preference < 0:
-                jours_problemes_eq += 1
-                total_jours_problemes += 1
-                if verbose:
-                    if total_jours_problemes == 1:
-                        print(f"\033[1m\033[31m[GARDIEN]\033[0m Jours problématiques (médecins affectés avec préférence négative) :")
-                        print(f"\033[1m\033[34mÉquipe {i+1}\033[0m :")
-                    print(f"  - Jour {jour+1}: Médecin \033[1m\033[36m{mdc_eqs[i][mdc_garde]}\033[0m affecté avec préférence de \033[1m\033[31m{preference}\033[0m")
+    total_jours_problemes = int(sum(np.sum(masque) for masque in validation.preferences_negatives))
+    if total_jours_problemes > 0 and verbose:
+        dire(f"\033[1m\033[31m[GARDIEN]\033[0m Jours problématiques (médecins affectés avec préférence négative) :")
+        for i, (resultat_eq, preferences_eq, masque) in enumerate(zip(resultat_eqs, preferences_eqs, validation.preferences_negatives)):
+            if not masque.any():
+                continue
+            dire(f"\033[1m\033[34mÉquipe {i+1}\033[0m :")
+            for jour in np.flatnonzero(masque):
+                mdc_garde = resultat_eq[jour]
+                dire(f"  - Jour {jour+1}: Médecin \033[1m\033[36m{mdc_eqs[i][mdc_garde]}\033[0m affecté avec préférence de \033[1m\033[31m{preferences_eq[mdc_garde, jour]}\033[0m")
 
-    print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Vérification des jours problématiques...")
+    dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Vérification des jours problématiques...")
     if total_jours_problemes > 0:
-        print(f"\033[1m\033[31m[GARDIEN]\033[0m Total de jours problématiques (préférence non respectée): \033[1m\033[31m{total_jours_problemes}\033[0m")
+        dire(f"\033[1m\033[31m[GARDIEN]\033[0m Total de jours problématiques (préférence non respectée): \033[1m\033[31m{total_jours_problemes}\033[0m")
     else:
-        print(f"\033[1m\033[32m[GARDIEN]\033[0m Total de jours problématiques (préférence non respectée): \033[1m\033[32m{total_jours_problemes}\033[0m")
+        dire(f"\033[1m\033[32m[GARDIEN]\033[0m Total de jours problématiques (préférence non respectée): \033[1m\033[32m{total_jours_problemes}\033[0m")
 
-    # ici on va parcourir les plannings pour vérifier que les attributs sont représentés chaque jour
-    # si ce n'est pas le cas, on signe le jour fautif
-    time.sleep(1)
-    print()
-    print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Vérification des attributs des médecins...")
+    # ici on vérifie que les attributs sont représentés chaque jour
+    # si ce n'est pas le cas, on signale le jour fautif
+    pause()
+    dire()
+    dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Vérification des attributs des médecins...")
 
     total_jours_sans_attributs = 0
-    for i, (resultat_eq, attributs_eq) in enumerate(zip(resultat_eqs, attributs_eqs)):
-        if not attributs_eq:  # Si pas d'attributs pour cette équipe, on passe
+    for i, (resultat_eq, manquants_eq) in enumerate(zip(resultat_eqs, validation.attributs_manquants)):
+        if not any(masque.any() for masque in manquants_eq.values()): # pas d'attributs (ou aucun manquant) pour cette équipe
             continue
 
-        jours_problemes_eq = 0
-        for jour in range(Ds[i]):
-            mdc_garde = resultat_eq[jour]
-            mdc_astreinte = resultat_eq[Ds[i] + jour]
-            
-            for nom_attribut, mdc_avec_attribut in attributs_eq.items():
-                if not (mdc_avec_attribut[mdc_garde] or mdc_avec_attribut[mdc_astreinte]):
-                    jours_problemes_eq += 1
-                    total_jours_sans_attributs += 1
-                    if verbose:
-                        if total_jours_sans_attributs == 1:
-                            print(f"\033[1m\033[34mÉquipe {i+1}\033[0m :")
-                        print(f"  - Jour {jour+1}: Attribut \033[1m\033[35m{nom_attribut}\033[0m manquant")
-                        print(f"    Garde: \033[1m\033[36m{mdc_eqs[i][mdc_garde]}\033[0m")
-                        print(f"    Astreinte: \033[1m\033[36m{mdc_eqs[i][mdc_astreinte]}\033[0m")
+        D = Ds[i]
+        noms = list(mdc_eqs[i]) + ["-"] # l'indice -1 (case vide) donne "-"
+        if verbose:
+            dire(f"\033[1m\033[34mÉquipe {i+1}\033[0m :")
+        for jour in range(D):
+            for nom_attribut, masque in manquants_eq.items():
+                if not masque[jour]:
+                    continue
+                total_jours_sans_attributs += 1
+                if verbose:
+                    dire(f"  - Jour {jour+1}: Attribut \033[1m\033[35m{nom_attribut}\033[0m manquant")
+                    dire(f"    Garde: \033[1m\033[36m{noms[resultat_eq[jour]]}\033[0m")
+                    dire(f"    Astreinte: \033[1m\033[36m{noms[resultat_eq[D + jour]]}\033[0m")
 
     if total_jours_sans_attributs > 0:
-        print(f"\033[1m\033[31m[GARDIEN]\033[0m Total de jours avec attributs manquants: \033[1m\033[31m{total_jours_sans_attributs}\033[0m")
+        dire(f"\033[1m\033[31m[GARDIEN]\033[0m Total de jours avec attributs manquants: \033[1m\033[31m{total_jours_sans_attributs}\033[0m")
     else:
-        print(f"\033[1m\033[32m[GARDIEN]\033[0m Tous les jours ont les attributs requis.")
-
-    time.sleep(1)
-    print()
-    print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Enregistrement des plannings en cours...")
-
-    # début de la phase d'exportation : un fichier par équipe
-    blue_fill = PatternFill(start_color="6c9beb", end_color="6c9beb", fill_type="solid")
-    red_fill = PatternFill(start_color="DB7C6C", end_color="DB7C6C", fill_type="solid")
-    green_fill = PatternFill(start_color="99c57a", end_color="99c57a", fill_type="solid")
-    gray_fill = PatternFill(start_color="9a9796", end_color="9a9796", fill_type="solid")
-    yellow_fill = PatternFill(start_color="FFEB99", end_color="FFEB99", fill_type="solid")
-    collision_fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
-    jour_off_fill = PatternFill(start_color="FFB366", end_color="FFB366", fill_type="solid")
-    attribut_fill = PatternFill(start_color="FFA07A", end_color="FFA07A", fill_type="solid")
-    modification_fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
-    nonassigne_fill = PatternFill(start_color="FF69B4", end_color="FF69B4", fill_type="solid")
-
-    # check des collisions, problèmes de jour OFF, problèmes d'attributs manquants
-    schedule = np.zeros((len(global_mdc), max(Ds)), dtype=int) # planning global en fonction des médecins uniques
-    # (0=rien, 1= garde, 2=astreinte; pour chaque médecin "unique" ie la réunion sans répétition des médecins de chaque planning)
-    collisions = {i: set() for i in range(len(excel_files))} # jours avec collision par équipe
-    jours_off = {i: set() for i in range(len(excel_files))}  # jours avec problème de jour off
-    jours_attributs = {i: set() for i in range(len(excel_files))} # jours avec attribut manquant
-
-    for i, (resultat_eq, eq_to_global) in enumerate(zip(resultat_eqs, eqs_to_global)):
-        planning_gardes = resultat_eq[:Ds[i]]
-        planning_astreintes = resultat_eq[Ds[i]:]
-
-        # collisions ?
-        for day, mdc_local in enumerate(planning_gardes):
-            if mdc_local == -1: # case non remplie par l'optimisation: on passe
-                continue
-            mdc_global = eq_to_global[mdc_local]
-            if schedule[mdc_global, day] != 0:
-                collisions[i].add(day)
-            schedule[mdc_global, day] = 1
-
-        # collisions ?
-        for day, mdc_local in enumerate(planning_astreintes):
-            if mdc_local == -1: # case non remplie par l'optimisation: on passe
-                continue
-            mdc_global = eq_to_global[mdc_local]
-            if schedule[mdc_global, day] != 0:
-                collisions[i].add(day)
-            schedule[mdc_global, day] = 2
-
-        # jours off ok?
-        for day in range(Ds[i] - 1):
-            if planning_gardes[day] == planning_gardes[day + 1] or \
-            planning_gardes[day] == planning_astreintes[day + 1]:
-                jours_off[i].add(day + 1)
-
-        # attributs ok ?
-        if attributs_eqs[i]:
-            for jour in range(Ds[i]):
-                mdc_garde = planning_gardes[jour]
-                mdc_astreinte = planning_astreintes[jour]
-                for nom_attribut, mdc_avec_attribut in attributs_eqs[i].items():
-                    if not (mdc_avec_attribut[mdc_garde] or mdc_avec_attribut[mdc_astreinte]):
-                        jours_attributs[i].add(jour)
-
-    fichiers_crees = []
-    for i, file in enumerate(excel_files):
-        wb = load_workbook(os.path.join(dir, file))
-
-        # création de la feuille où l'on place le résumé
-
-        # suppression 
-        if "résumé" in wb.sheetnames:
-            del wb["résumé"]
-        ws_resume = wb.create_sheet("résumé")
-
-        headers = ["Médecin", "Gardes effectuées", "Gardes ciblées", "Astreintes effectuées", 
-               "Astreintes ciblées", "Écart moyen entre gardes", "Gardes sur préf. négatives", 
-               "Gardes sur préf. nulles"]
-        for col, header in enumerate(headers, 1):
-            cell = ws_resume.cell(row=1, column=col, value=header)
-            cell.font = Font(bold=True)
-            # Colorer les entêtes des colonnes de préférences
-            if header == "Gardes sur préf. négatives":
-                cell.fill = yellow_fill
-            elif header == "Gardes sur préf. nulles":
-                cell.fill = yellow_fill
-
-        # on va récupérer les données du planning pour faire un "résumé" : combien de gardes, etc...
-        # (ce résumé concerne CE planning seulement, pas le planning global sur plusieurs équipes)
-        resultat_eq = resultat_eqs[i]
-        planning_gardes = resultat_eq[:Ds[i]]
-        planning_astreintes = resultat_eq[Ds[i]:]
-        
-        # on parcourt les médecins de l'équipe
-        for j, mdc_name in enumerate(mdc_eqs[i]):
-            # on compte les gardes et astreintes
-            nb_gardes = sum(1 for x in planning_gardes if x == j)
-            nb_astreintes = sum(1 for x in planning_astreintes if x == j)
-            
-            # on récupère les valeurs cibles
-            target_gardes = implications_eqs[i]['gardes'][j]
-            target_astreintes = implications_eqs[i]['astreintes'][j]
-            
-            # écart moyen entre les gardes
-            jours_garde = np.where(planning_gardes == j)[0]
-            if len(jours_garde) > 1:
-                ecart_moyen = np.mean(np.diff(jours_garde))
-            else:
-                ecart_moyen = "-"
-                
-            # nombre de gardes sur préférences négatives ou nulles
-            gardes_pref_neg = sum(1 for day in range(Ds[i]) if planning_gardes[day] == j 
-                                and preferences_eqs[i][j][day] < 0)
-            gardes_pref_null = sum(1 for day in range(Ds[i]) if planning_gardes[day] == j 
-                                and preferences_eqs[i][j][day] == 0)
-            
-            # remplissage de la ligne
-            row = j + 2
-            ws_resume.cell(row=row, column=1, value=mdc_name)
-            ws_resume.cell(row=row, column=2, value=nb_gardes)
-            # Pour les nombres avec décimales, on garde les nombres et on formate la cellule
-            cell_target_gardes = ws_resume.cell(row=row, column=3, value=target_gardes)
-            cell_target_gardes.number_format = '#,##0.0'  # Format français avec 1 décimale
-            ws_resume.cell(row=row, column=4, value=nb_astreintes)
-            cell_target_astreintes = ws_resume.cell(row=row, column=5, value=target_astreintes)
-            cell_target_astreintes.number_format = '#,##0.0'
-            if isinstance(ecart_moyen, float):
-                cell_ecart = ws_resume.cell(row=row, column=6, value=ecart_moyen)
-                cell_ecart.number_format = '#,##0.0'
-            else:
-                ws_resume.cell(row=row, column=6, value=ecart_moyen)
-            ws_resume.cell(row=row, column=7, value=gardes_pref_neg)
-            ws_resume.cell(row=row, column=8, value=gardes_pref_null)
-        
-        for col in range(1, len(headers) + 1):
-            ws_resume.column_dimensions[get_column_letter(col)].width = 25 # largeur colonne (esthétique)
-
-        # création de la feuille où l'on place les légendes
-        # c'est essentiellement du formatage/esthétisme
-        # suppression 
-        if "légende" in wb.sheetnames:
-            del wb["légende"]
-        ws_legende = wb.create_sheet("légende")
-
-        title_font = Font(bold=True, size=12)
-        subtitle_font = Font(bold=True)
-
-        # titre
-        ws_legende['A1'] = "LÉGENDE DES COULEURS"
-        ws_legende['A1'].font = title_font
-        
-        # légende des problèmes "graves"
-        ws_legende['A3'] = "Problèmes graves :"
-        ws_legende['A3'].font = subtitle_font
-        
-        ws_legende['B4'] = "Collision (médecin assigné à plusieurs équipes)"
-        ws_legende['A4'].fill = collision_fill
-        
-        ws_legende['B5'] = "Jour OFF après garde non respecté"
-        ws_legende['A5'].fill = jour_off_fill
-        
-        ws_legende['B6'] = "Attribut manquant ce jour-là"
-        ws_legende['A6'].fill = attribut_fill
+        dire(f"\033[1m\033[32m[GARDIEN]\033[0m Tous les jours ont les attributs requis.")
 
-        ws_legende['B7'] = "Garde ou astreinte non attribuée"
-        ws_legende['A7'].fill = nonassigne_fill
+    pause()
+    dire()
+    dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Enregistrement des plannings en cours...")
 
-        # légende des préférences
-        ws_legende['A9'] = "Préférences :"
-        ws_legende['A9'].font = subtitle_font
-        
-        ws_legende['B10'] = "Préférence positive ou nulle (assignée à une garde)"
-        ws_legende['A10'].fill = blue_fill
-        
-        ws_legende['B11'] = "Préférence négative (assignée à une garde)"
-        ws_legende['A11'].fill = yellow_fill
-        
-        ws_legende['B12'] = "Préférence positive"
-        ws_legende['A12'].fill = green_fill
-        
-        ws_legende['B13'] = "Préférence négative"
-        ws_legende['A13'].fill = red_fill
-        
-        ws_legende['B14'] = "Préférence nulle"
-        ws_legende['A14'].fill = gray_fill
-
-        # légende des modifications
-        ws_legende['A16'] = "Modifications :"
-        ws_legende['A16'].font = subtitle_font
-        
-        ws_legende['B17'] = "Garde ou astreinte modifiée par rapport au planning initial"
-        ws_legende['A17'].fill = modification_fill
-
-        ws_legende.column_dimensions['B'].width = 50
-        ws_legende.column_dimensions['A'].width = 4
-
-        for k in range(1, 18):
-            ws_legende.row_dimensions[k].height = 20
-
-        # modification de la feuille principale (remplissage colonne garde+astreinte, colorations)
-        ws = wb.worksheets[0]
-
-        for day in range(Ds[i]):
-            mdc_garde = resultat_eqs[i][day]
-            mdc_astreinte = resultat_eqs[i][Ds[i]:][day]
-
-            # on récupere les cellules correspondante au jour, garde, astreinte de la ligne
-            garde_cell = ws.cell(row=day+2, column=2)
-            astreinte_cell = ws.cell(row=day+2, column=3)
-            jour_cell = ws.cell(row=day+2, column=1)
-
-            # coloration des gardes/astreintes si problèmes détectés
-            if day in collisions[i]:
-                jour_cell.fill = collision_fill
-            if day in jours_off[i]:
-                jour_cell.fill = jour_off_fill
-            if day in jours_attributs[i]:
-                jour_cell.fill = attribut_fill
-            if (mdc_garde==-1) or (mdc_astreinte==-1): # case vide: on le signale
-                jour_cell.fill = nonassigne_fill
-
-            # coloration des changements si une modification par rapport au planning initial
-            if planning_initiaux[i] is not None:
-                if planning_initiaux[i][day] != -1 and mdc_garde != planning_initiaux[i][day]:
-                    garde_cell.fill = modification_fill
-                if planning_initiaux[i][Ds[i] + day] != -1 and mdc_astreinte != planning_initiaux[i][Ds[i] + day]:
-                    astreinte_cell.fill = modification_fill
-            
-            # remplir et colorer les préférences
-            for j in range(Ns[i]):
-                pref_cell = ws.cell(row=day+2, column=4+j)
-                preference = pref_cell.value
-                
-                if preference is None:
-                    pref_cell.fill = gray_fill
-                elif preference < 0:
-                    if j == mdc_garde:
-                        pref_cell.fill = yellow_fill # pref négative assignée
-                    else:
-                        pref_cell.fill = red_fill # pref négative non assignée
-                elif preference >= 0:
-                    if j == mdc_garde:
-                        pref_cell.fill = blue_fill # pref positive assignée
-                    else:
-                        pref_cell.fill = green_fill # pref positive non assignée
-
-            # update colonne "garde" et "astreinte" pour ce jour
-            garde_cell.value = mdc_eqs[i][mdc_garde] if mdc_garde != -1 else ""
-            astreinte_cell.value = mdc_eqs[i][mdc_astreinte] if mdc_astreinte != -1 else ""
-
-            # on enlève le gras de garde et astreinte
-            # (gras=valeur à modifier, or, ça y est on a modifié)
-            garde_cell.font = Font(bold=False)
-            astreinte_cell.font = Font(bold=False)
-            ws.cell(row=day+2, column=1).font = Font(bold=False)
-
-            # par contre, on garde le soulignage pour les valeurs fixés
-            if day in jours_fixes[i]['garde']:
-                garde_cell.font = Font(underline='single')
-            if day in jours_fixes[i]['astreinte']:
-                astreinte_cell.font = Font(underline='single')
+    # début de la phase d'exportation : un fichier par équipe (cf export.py)
+    # les jours de collision, de jour OFF non respecté et d'attribut manquant sont colorés (cf validation plus haut)
+    collisions = [np.flatnonzero(masque) for masque in validation.collisions]
+    jours_off = [np.flatnonzero(masque) for masque in validation.jours_off]
+    jours_attributs = [np.flatnonzero(validation.jours_attributs(i)) for i in range(len(excel_files))]
 
+    taches = []
+    for i, file in enumerate(excel_files):
         if mode == 'R':
             output_filename = os.path.join(dir, file)
         else:
             output_filename = os.path.join(dir, f"{os.path.splitext(file)[0]}_resultat.xlsx")
-        wb.save(output_filename)
-        wb.close()
-        fichiers_crees.append(os.path.basename(output_filename))
+        taches.append((os.path.join(dir, file), output_filename, resultat_eqs[i], planning_initiaux[i], mdc_eqs[i], preferences_eqs[i], implications_eqs[i], jours_fixes[i], collisions[i], jours_off[i], jours_attributs[i]))
+
+    # un classeur par processus (l'ordre des fichiers est conservé)
+    # (les classeurs qui affichent déjà ce planning ne sont pas réécrits)
+    with profilage.phase('export'):
+        fichiers_crees = exporter_classeurs(taches)
+    fichiers_inchanges = [os.path.basename(tache[1]) for tache, fichier in zip(taches, fichiers_crees) if fichier is None]
+    fichiers_crees = [fichier for fichier in fichiers_crees if fichier is not None]
+
+    if fichiers_crees:
+        dire(f"\033[1m\033[32m[GARDIEN]\033[0m Enregistrement réussi: \033[1m\033[33m{', '.join([f'{fichier}' for fichier in fichiers_crees])}\033[0m")
+    if fichiers_inchanges:
+        dire(f"\033[1m\033[32m[GARDIEN]\033[0m Fichiers déjà à jour (non réécrits): \033[1m\033[33m{', '.join(fichiers_inchanges)}\033[0m")
+
+    return {
+        'fichiers': excel_files,
+        'resultats': resultat_eqs,
+        'scores': score_final_eqs,
+        'fichiers_crees': fichiers_crees,
+        'fichiers_inchanges': fichiers_inchanges,
+    }
 
-    print(f"\033[1m\033[32m[GARDIEN]\033[0m Enregistrement réussi: \033[1m\033[33m{', '.join([f'{fichier}' for fichier in fichiers_crees])}\033[0m")
+def main():
+    dir = input(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Répertoire où se trouvent les fichiers Excel (.xlsx) : ")
+    dir = dir.strip()
+    dir = dir.replace("\\ ", " ")
+    dir = os.path.abspath(dir)
 
-def check_coherence(resultat_eqs, Ds, global_mdc, eqs_to_global):
-    """
-    Vérification des collisions et du respect des jours OFF après les gardes
-    """
-   
-    print()
-    print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Vérification des collisions et des jours OFF après les gardes...")
+    while True:
+        mode = input(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Remplacer les fichiers existants ou créer de Nouveaux fichiers ? (R/N) : ").strip().upper()
+        if mode in ['R', 'N']:
+            break
+        print(f"\033[1m\033[31m[ERREUR]\033[0m Veuillez répondre par 'R' (remplacer) ou 'N' (nouveaux fichiers)")
 
-    schedule = np.zeros((len(global_mdc), max(Ds)), dtype=int)
-    detecte = False
+    print()
 
-    for i, (resultat_eq, eq_to_global) in enumerate(zip(resultat_eqs, eqs_to_global)):
-        planning_gardes = resultat_eq[:Ds[i]]  # première moitié pour les gardes
-        planning_astreintes = resultat_eq[Ds[i]:] # seconde moitié pour les astreintes
+    run(dir, mode, pauses=True)
 
-        # on remplit les gardes
-        for day, mdc_local in enumerate(planning_gardes):
-            if mdc_local == -1: # case non remplie par l'optimisation: on passe (problématique)
-                continue
-            mdc_global = eq_to_global[mdc_local] # conversion en ID global du mdc
+def check_coherence(validation, registre, afficher=True, pauses=False):
+    """
+    Vérification des collisions et du respect des jours OFF après les gardes
+    validation: résultat de valider (cf validation.py)
+    """
 
-            if schedule[mdc_global, day] != 0:
-                print(f"\033[1m\033[31m[ERREUR]\033[0m Collision pour le médecin \033[1m\033[36m{global_mdc[mdc_global]}\033[0m au jour {day+1}")
-                detecte = True
-            schedule[mdc_global, day] = 1 # 1=garde
+    dire = print if afficher else _silence
 
-        # on remplit les astreintes
-        for day, mdc_local in enumerate(planning_astreintes):
-            if mdc_local == -1: # case non remplie par l'optimisation: on passe (problématique)
-                continue
-            mdc_global = eq_to_global[mdc_local] # conversion en ID global du mdc
+    dire()
+    dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Vérification des collisions et des jours OFF après les gardes...")
 
-            if schedule[mdc_global, day] != 0:
-                print(f"\033[1m\033[31m[ERREUR]\033[0m Collision pour le médecin \033[1m\033[36m{global_mdc[mdc_global]}\033[0m au jour {day+1}")
-                detecte = True
-            schedule[mdc_global, day] = 2 # 2=astreinte
+    collisions = validation.collisions_globales()
+    for mdc_global, day in collisions:
+        dire(f"\033[1m\033[31m[ERREUR]\033[0m Collision pour le médecin \033[1m\033[36m{registre.noms[mdc_global]}\033[0m au jour {day+1}")
 
     # vérification jour OFF
-    for mdc_global in range(len(global_mdc)):
-        for day in range(max(Ds) - 1):
-            if schedule[mdc_global, day] == 1 and schedule[mdc_global, day + 1] != 0:
-                print(f"\033[1m\033[31m[ERREUR]\033[0m Le médecin \033[1m\033[36m{global_mdc[mdc_global]}\033[0m travaille le jour {day+2} après une garde au jour {day+1}")
-                detecte = True
-
-    if not detecte:
-        print("\033[1m\033[32m[GARDIEN]\033[0m Aucun problème de collision ou de jour OFF détecté.")
-    print()
+    jours_off = validation.jours_off_globaux()
+    for mdc_global, day in jours_off:
+        dire(f"\033[1m\033[31m[ERREUR]\033[0m Le médecin \033[1m\033[36m{registre.noms[mdc_global]}\033[0m travaille le jour {day+2} après une garde au jour {day+1}")
+
+    if len(collisions) == 0 and len(jours_off) == 0:
+        dire("\033[1m\033[32m[GARDIEN]\033[0m Aucun problème de collision ou de jour OFF détecté.")
+    dire()
 
-    time.sleep(1)
-    print(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Vérification des gardes/astreintes non attribuées...")
+    if pauses:
+        time.sleep(1)
+    dire(f"\033[1m{couleur_gardien}[GARDIEN]\033[0m Vérification des gardes/astreintes non attribuées...")
 
     total_non_attribues = 0
-    for i, resultat_eq in enumerate(resultat_eqs):
-        jours_non_attribues_eq = {'garde': [], 'astreinte': []}
-        
-        # pour les gardes
-        for jour, mdc in enumerate(resultat_eq[:Ds[i]]):
-            if mdc == -1: # -1 = case vide (non remplie par l'optimisation)
-                total_non_attribues += 1
-                jours_non_attribues_eq['garde'].append(jour + 1)
-        
-        # pour les astreintes        
-        for jour, mdc in enumerate(resultat_eq[Ds[i]:]):
-            if mdc == -1:
-                total_non_attribues += 1
-                jours_non_attribues_eq['astreinte'].append(jour + 1)
-                
-        if jours_non_attribues_eq['garde'] or jours_non_attribues_eq['astreinte']:
-            print(f"\033[1m\033[34mÉquipe {i+1}\033[0m :")
-            if jours_non_attribues_eq['garde']:
-                print(f"  - Gardes non attribuées aux jours : {', '.join(map(str, jours_non_attribues_eq['garde']))}")
-            if jours_non_attribues_eq['astreinte']:
-                print(f"  - Astreintes non attribuées aux jours : {', '.join(map(str, jours_non_attribues_eq['astreinte']))}")
+    for i, non_assignes in enumerate(validation.non_assignes):
+        total_non_attribues += int(non_assignes.sum())
+        if not non_assignes.any():
+            continue
+
+        dire(f"\033[1m\033[34mÉquipe {i+1}\033[0m :")
+        if non_assignes[0].any():
+            dire(f"  - Gardes non attribuées aux jours : {', '.join(map(str, np.flatnonzero(non_assignes[0]) + 1))}")
+        if non_assignes[1].any():
+            dire(f"  - Astreintes non attribuées aux jours : {', '.join(map(str, np.flatnonzero(non_assignes[1]) + 1))}")
 
     if total_non_attribues > 0:
-        print(f"\033[1m\033[31m[GARDIEN]\033[0m Total de gardes/astreintes non attribuées: \033[1m\033[31m{total_non_attribues}\033[0m")
+        dire(f"\033[1m\033[31m[GARDIEN]\033[0m Total de gardes/astreintes non attribuées: \033[1m\033[31m{total_non_attribues}\033[0m")
     else:
-        print(f"\033[1m\033[32m[GARDIEN]\033[0m Toutes les gardes et astreintes ont été attribuées.")
-    print()
+        dire(f"\033[1m\033[32m[GARDIEN]\033[0m Toutes les gardes et astreintes ont été attribuées.")
+    dire()
+
+def cli(argv=None):
+    """
+    Ligne de commande. Sans répertoire, Gardien pose ses questions comme avant (main).
+    Avec un répertoire, tout est donné en arguments (aucune question, aucune pause), par exemple :
+        python gardien.py plannings/ --mode R --silencieux
+    Renvoie le code de sortie (0 si tout s'est bien passé).
+    """
+
+    parser = argparse.ArgumentParser(description="Gardien : optimisation des plannings de gardes et d'astreintes.")
+    parser.add_argument('repertoire', nargs='?', help="répertoire où se trouvent les fichiers Excel (.xlsx). Si absent, mode interactif.")
+    parser.add_argument('--mode', type=str.upper, choices=['R', 'N'], default='N', help="R: remplacer les fichiers existants, N: créer de nouveaux fichiers (par défaut)")
+    parser.add_argument('--portfolio', action='store_true', help="optimiser chaque planning en faisant courir plusieurs méthodes en parallèle (cf solve_portfolio)")
+    parser.add_argument('--duree', type=float, default=60, help="durée de la course par équipe en secondes, avec --portfolio (60 par défaut)")
+    parser.add_argument('--cible', type=float, default=None, help="score à atteindre pour arrêter la course plus tôt, avec --portfolio")
+    parser.add_argument('--silencieux', '-q', action='store_true', help="n'afficher que les erreurs")
+    parser.add_argument('--profil', nargs='?', const=profilage.FICHIER_PROFIL, default=None, help=f"mesurer la durée de chaque phase et écrire un rapport JSON ({profilage.FICHIER_PROFIL} par défaut, cf profilage.py)")
+    parser.add_argument('--traces', metavar='DOSSIER', default=None, help="enregistrer la trace de convergence de chaque équipe dans DOSSIER (cf traces.py)")
+    parser.add_argument('--fenetre', metavar='RAYON', nargs='?', type=int, const=RAYON_FENETRE, default=None, help=f"re-planification incrémentale : ne réoptimiser que les jours à moins de RAYON jours des cases en gras ou des médecins indisponibles ({RAYON_FENETRE} par défaut, cf replanification.py)")
+    parser.add_argument('--format-traces', choices=['csv', 'npz'], default='csv', help="format des traces (csv par défaut)")
+    args = parser.parse_args(argv)
+
+    if args.repertoire is None:
+        print_ascii()
+        time.sleep(1)
+        main()
+        return 0
+
+    options_portfolio = {'duree': args.duree, 'cible': args.cible} if args.portfolio else None
+    resultat = run(args.repertoire, args.mode, options_portfolio=options_portfolio, afficher=not args.silencieux, profil=args.profil, dossier_traces=args.traces, format_traces='.' + args.format_traces, fenetre=args.fenetre)
+    return 0 if resultat is not None else 1
 
 if __name__ == "__main__":
-    print_ascii()
-    time.sleep(1)
-    main()
+    sys.exit(cli())
@@ -0,0 +1,267 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from openpyxl import load_workbook
+
+from probleme import ProblemeEquipe, ErreurLecture, completer_implications, erreur_mdc
+import profilage
+
+"""
+Lecture des fichiers Excel (un fichier = une équipe).
+
+Chaque classeur est ouvert une seule fois (openpyxl en lecture seule) et chaque feuille n'est parcourue qu'une fois :
+- feuille principale : colonnes "jour", "garde", "astreinte" puis une colonne de préférences par mdc.
+  on récupère en un seul parcours les valeurs, le gras (=à modifier) et le soulignage (=à fixer)
+- feuille "attributs" (optionnelle) : une ligne par attribut, une colonne par mdc
+- feuille "implications" (optionnelle) : lignes "gardes" et "astreintes", une colonne par mdc
+
+Le résultat est un ProblemeEquipe, qui contient tout ce dont solve_multi a besoin pour cette équipe.
+Les équipes lues sont mises en cache (cf cache.py) : si la lecture change de résultat pour un même fichier, incrémenter VERSION_CACHE.
+"""
+
+def _lignes(ws):
+    """
+    Renvoie les lignes d'une feuille sous forme de listes de cellules,
+    sans les cellules vides en fin de ligne ni les lignes vides en fin de feuille (comme pandas).
+    Une cellule vide mais en gras ou soulignée est gardée : sa mise en forme compte (ex: astreinte vide en gras = à remplir).
+    """
+
+    lignes = []
+    for row in ws.iter_rows():
+        cellules = list(row)
+        while cellules and cellules[-1].value is None and _police(cellules, len(cellules) - 1) == (False, False):
+            cellules.pop()
+        lignes.append(cellules)
+
+    while lignes and all(cellule.value is None for cellule in lignes[-1]):
+        lignes.pop()
+
+    return lignes
+
+def _largeur(lignes):
+    """
+    Nombre de colonnes de la feuille : jusqu'à la dernière cellule non vide (les cellules vides mises en forme n'ajoutent pas de colonne).
+    """
+
+    largeur = 0
+    for ligne in lignes:
+        for k in range(len(ligne) - 1, largeur - 1, -1):
+            if ligne[k].value is not None:
+                largeur = k + 1
+                break
+    return largeur
+
+def _entetes(ligne, largeur):
+    """
+    Noms des colonnes à partir de la première ligne (colonnes sans nom et doublons renommés comme le fait pandas).
+    """
+
+    entetes = []
+    vus = {}
+    for k in range(largeur):
+        valeur = ligne[k].value if k < len(ligne) else None
+        nom = valeur if valeur is not None else f"Unnamed: {k}"
+        if nom in vus:
+            vus[nom] += 1
+            nom = f"{nom}.{vus[nom]}"
+        else:
+            vus[nom] = 0
+        entetes.append(nom)
+    return entetes
+
+def _valeur(ligne, k):
+    return ligne[k].value if k < len(ligne) else None
+
+def _police(ligne, k):
+    """
+    Renvoie (gras, souligné) pour la cellule k de la ligne.
+    """
+
+    if k >= len(ligne) or ligne[k].font is None:
+        return False, False
+    return bool(ligne[k].font.bold), bool(ligne[k].font.underline)
+
+def _lecture_principale(ws, fichier):
+    """
+    Parcours unique de la feuille principale : préférences, noms, planning initial, gras et soulignage.
+    """
+
+    lignes = _lignes(ws)
+    if not lignes:
+        raise ErreurLecture(f"\033[1m\033[31m[ERREUR]\033[0m Dans le fichier \033[1m\033[33m{fichier}\033[0m : la première feuille est vide")
+    largeur = _largeur(lignes)
+    entetes = _entetes(lignes[0], largeur)
+    mdc = entetes[3:] # on enlève les 3 premières colonnes ("jour", "garde", "astreinte")
+    indices_mdc = {}
+    for i, nom in enumerate(mdc):
+        indices_mdc.setdefault(nom, i) # conversion des noms en indices (premier médecin de ce nom)
+
+    lignes = lignes[1:]
+    N, D = len(mdc), len(lignes)
+
+    preferences = np.zeros((N, D))
+    gardes = [] # on collecte les valeurs dans la colonne "garde" (-1 si vide)
+    astreintes = [] # idem avec les astreintes
+    jours_gras = {'garde': [], 'astreinte': []} # stocker les jours en gras (à modifier)
+    jours_soulignes = {'garde': [], 'astreinte': []} # stocker les jours soulignés (à fixer)
+    jour_souligne = None
+    toutes_cases_remplies = True
+    aucune_case_gras = True
+
+    for jour, ligne in enumerate(lignes):
+        # préférences (cases vides = 0)
+        for i in range(N):
+            pref = _valeur(ligne, 3 + i)
+            if pref is None:
+                continue
+            try:
+                preferences[i, jour] = float(pref)
+            except (TypeError, ValueError):
+                raise ErreurLecture(f"\033[1m\033[31m[ERREUR]\033[0m Dans le fichier \033[1m\033[33m{fichier}\033[0m : préférence non numérique (\033[1m{pref}\033[0m) pour le médecin \033[1m\033[36m{mdc[i]}\033[0m au jour {jour+1}")
+
+        # si on détecte un jour souligné (colonne "jour"), toutes les gardes et astreintes jusqu'à ce jour sont fixées
+        _, jour_est_souligne = _police(ligne, 0)
+        if jour_souligne is None and jour_est_souligne:
+            jour_souligne = jour
+
+        garde = _valeur(ligne, 1)
+        astreinte = _valeur(ligne, 2)
+        garde_gras, garde_souligne = _police(ligne, 1)
+        astreinte_gras, astreinte_souligne = _police(ligne, 2)
+
+        # check si les cellules sont en gras (=à modifier)
+        if astreinte and garde_gras:
+            jours_gras['garde'].append(jour)
+        if garde and astreinte_gras:
+            jours_gras['astreinte'].append(jour)
+
+        # check si les cellules sont soulignées (=à fixer)
+        if garde and garde_souligne:
+            jours_soulignes['garde'].append(jour)
+        if astreinte and astreinte_souligne:
+            jours_soulignes['astreinte'].append(jour)
+
+        gardes.append(indices_mdc.get(garde, -1) if garde else -1)
+        astreintes.append(indices_mdc.get(astreinte, -1) if astreinte else -1)
+
+        if garde is None or astreinte is None:
+            toutes_cases_remplies = False
+        if garde_gras or astreinte_gras:
+            aucune_case_gras = False
+
+    if jour_souligne is not None:
+        for shift in ('garde', 'astreinte'):
+            jours_soulignes[shift] = list(set(jours_soulignes[shift]) | set(range(jour_souligne + 1)))
+
+    return ProblemeEquipe(
+        fichier=fichier,
+        mdc=mdc,
+        preferences=preferences,
+        planning_initial=gardes + astreintes, # si vide, on aura ici que des -1
+        jours_gras=jours_gras,
+        jours_soulignes=jours_soulignes,
+        toutes_cases_remplies=toutes_cases_remplies,
+        aucune_case_gras=aucune_case_gras,
+    )
+
+def _lecture_attributs(ws, probleme):
+    lignes = _lignes(ws)
+    if not lignes:
+        return {}
+
+    largeur = _largeur(lignes)
+    mdc_attributs = _entetes(lignes[0], largeur)[1:]
+    if probleme.mdc != mdc_attributs: # si les médecins ne correspondent pas entre feuille principale et feuille attributs
+        raise erreur_mdc(probleme.fichier, "attributs", probleme.mdc, mdc_attributs)
+
+    attributs = {}
+    for ligne in lignes[1:]:
+        if not ligne:
+            continue
+        nom_attribut = _valeur(ligne, 0)
+        attributs[nom_attribut] = [bool(_valeur(ligne, 1 + i)) for i in range(probleme.N)] # case vide = pas l'attribut
+    return attributs
+
+def _lecture_implications(ws, probleme):
+    N = probleme.N
+    implications = {
+        'gardes': np.full(N, np.nan),
+        'astreintes': np.full(N, np.nan)
+    }
+
+    lignes = _lignes(ws)
+    if not lignes:
+        return implications
+
+    largeur = _largeur(lignes)
+    mdc_implications = _entetes(lignes[0], largeur)[1:]
+    if probleme.mdc != mdc_implications: # si les médecins ne correspondent pas (idem que "attributs")
+        raise erreur_mdc(probleme.fichier, "implications", probleme.mdc, mdc_implications)
+
+    # pour plus de flexibilité, on va localiser les lignes "gardes" et "astreintes"
+    # (plutot que de supposer que gardes est en 1er et astreintes en 2nd)
+    for ligne in lignes[1:]:
+        cle = str(_valeur(ligne, 0)).lower().strip()
+        if cle in implications:
+            implications[cle] = np.array([_valeur(ligne, 1 + i) for i in range(N)], dtype=float) # case vide -> nan
+
+    return implications
+
+def _completer(probleme):
+    """
+    Complète les implications lues (trous, normalisation, cf probleme.completer_implications), sur place.
+    """
+
+    with profilage.phase('implications'):
+        probleme.implications = completer_implications(probleme.implications, probleme.preferences)
+    return probleme
+
+def _charger_classeur_brut(chemin):
+    """
+    Lit un fichier Excel d'équipe en une seule ouverture et renvoie un ProblemeEquipe, implications non complétées (nan = non renseigné).
+    Lève ErreurLecture si le contenu du fichier est incohérent.
+    """
+
+    fichier = os.path.basename(chemin)
+    wb = load_workbook(chemin, read_only=True)
+
+    try:
+        probleme = _lecture_principale(wb.worksheets[0], fichier)
+
+        if 'attributs' in wb.sheetnames:
+            probleme.attributs = _lecture_attributs(wb['attributs'], probleme)
+
+        if 'implications' in wb.sheetnames:
+            probleme.implications = _lecture_implications(wb['implications'], probleme)
+        else:
+            probleme.implications = {'gardes': np.full(probleme.N, np.nan), 'astreintes': np.full(probleme.N, np.nan)}
+    finally:
+        wb.close()
+
+    return probleme
+
+def charger_classeur(chemin):
+    """
+    Lit un fichier Excel d'équipe en une seule ouverture et renvoie un ProblemeEquipe.
+    Lève ErreurLecture si le contenu du fichier est incohérent.
+    """
+
+    return _completer(_charger_classeur_brut(chemin))
+
+def charger_classeurs(chemins, nb_processus=None):
+    """
+    Lit plusieurs fichiers Excel, un classeur par processus.
+    Renvoie les ProblemeEquipe dans l'ordre des chemins donnés (quel que soit l'ordre de fin des processus).
+    Les implications sont complétées dans le processus principal, pour que le profilage mesure cette phase.
+    """
+
+    if nb_processus is None:
+        nb_processus = min(len(chemins), os.cpu_count() or 1)
+
+    if nb_processus <= 1 or len(chemins) <= 1:
+        return [charger_classeur(chemin) for chemin in chemins]
+
+    with ProcessPoolExecutor(max_workers=nb_processus) as executor:
+        problemes = list(executor.map(_charger_classeur_brut, chemins))
+    return [_completer(probleme) for probleme in problemes]
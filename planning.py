@@ -0,0 +1,109 @@
+import numpy as np
+
+"""
+Représentation compacte d'un planning : un seul tampon contigu d'entiers 16 bits (les gardes puis les astreintes),
+au lieu d'une liste Python ou d'un tableau int64 (4 fois plus petit, ce qui compte pour les populations du génétique
+et la liste tabou). Un médecin est codé par son indice local (-1 : case vide), donc N doit rester < 32768.
+
+gardes et astreintes sont des vues sur le tampon (pas de copie, pas de np.concatenate pour recoller les deux moitiés).
+
+instantane() renvoie une copie paresseuse (copy-on-write) : le tampon est partagé et passé en lecture seule,
+et le premier des deux plannings qui se modifie (deplacer, echanger, __setitem__) recopie le tampon avant d'écrire.
+C'est ce qu'il faut pour garder la meilleure solution du tabou, qui n'est presque jamais modifiée ensuite.
+
+Planning se comporte comme un tableau numpy (cf __array__), on peut donc le passer tel quel aux fonctions
+qui attendent un planning (calcule_critere, forcer_contrainte...).
+"""
+
+DTYPE_PLANNING = np.int16
+
+class Planning:
+    __slots__ = ('D', 'donnees')
+
+    def __init__(self, D, donnees=None):
+        """
+        D: nombre de jours
+        donnees: tampon (2D,) de type DTYPE_PLANNING, utilisé tel quel (None : planning vide, rempli de -1)
+        """
+
+        self.D = D
+        self.donnees = np.full(2 * D, -1, dtype=DTYPE_PLANNING) if donnees is None else donnees
+
+    @classmethod
+    def depuis(cls, planning, D=None):
+        """
+        Planning (copie) à partir d'une liste, d'un tableau ou d'un autre Planning.
+        """
+
+        if isinstance(planning, Planning):
+            return planning.copie()
+        donnees = np.array(planning, dtype=DTYPE_PLANNING)
+        return cls(len(donnees) // 2 if D is None else D, donnees)
+
+    @property
+    def gardes(self):
+        return self.donnees[:self.D]
+
+    @property
+    def astreintes(self):
+        return self.donnees[self.D:]
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None or np.dtype(dtype) == self.donnees.dtype:
+            return self.donnees.copy() if copy else self.donnees
+        return self.donnees.astype(dtype)
+
+    def __len__(self):
+        return len(self.donnees)
+
+    def __getitem__(self, index):
+        return self.donnees[index]
+
+    def __setitem__(self, index, valeur):
+        self._ecriture()
+        self.donnees[index] = valeur
+
+    def __repr__(self):
+        return f"Planning(gardes={self.gardes.tolist()}, astreintes={self.astreintes.tolist()})"
+
+    def _ecriture(self):
+        """
+        Avant toute modification : si le tampon est partagé (cf instantane), on en fait d'abord une copie privée.
+        """
+
+        if not self.donnees.flags.writeable:
+            self.donnees = self.donnees.copy()
+
+    def deplacer(self, s, t, mdc):
+        """
+        Affecte mdc au créneau (s: 0 garde, 1 astreinte ; jour t), sur place.
+        """
+
+        self._ecriture()
+        self.donnees[s * self.D + t] = mdc
+
+    def echanger(self, i, j):
+        """
+        Échange les médecins des cases i et j (indices dans le planning complet), sur place.
+        """
+
+        self._ecriture()
+        self.donnees[i], self.donnees[j] = self.donnees[j], self.donnees[i]
+
+    def copie(self):
+        return Planning(self.D, self.donnees.copy())
+
+    def instantane(self):
+        """
+        Copie paresseuse (copy-on-write) : le tampon n'est recopié qu'à la première modification de l'un des deux plannings.
+        """
+
+        self.donnees.flags.writeable = False
+        return Planning(self.D, self.donnees)
+
+    def cle(self):
+        """
+        Clé hachable du planning (octets du tampon), par exemple pour la liste tabou.
+        """
+
+        return self.donnees.tobytes()
@@ -0,0 +1,114 @@
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+"""
+Description d'un problème d'équipe, indépendamment du format de fichier d'où il a été lu
+(Excel : cf lecture.py, CSV/NPZ : cf formats.py, cache : cf cache.py).
+"""
+
+class ErreurLecture(Exception):
+    """
+    Erreur dans le contenu d'un fichier d'entrée (le message est déjà formaté pour l'affichage).
+    """
+
+@dataclass
+class ProblemeEquipe:
+    fichier: str # nom du fichier (sans le répertoire)
+    mdc: List[str] # noms des médecins, dans l'ordre des colonnes
+    preferences: np.ndarray # (N, D)
+    planning_initial: List[int] # gardes puis astreintes, indices locaux des médecins (-1 si case vide)
+    jours_gras: Dict[str, List[int]] # jours à modifier
+    jours_soulignes: Dict[str, List[int]] # jours à fixer
+    toutes_cases_remplies: bool
+    aucune_case_gras: bool
+    attributs: Dict[str, List[bool]] = field(default_factory=dict) # {nom_attribut: list[bool]} de taille N
+    implications: Dict[str, np.ndarray] = field(default_factory=dict) # nombres cibles de gardes et d'astreintes (trous complétés)
+
+    @property
+    def N(self):
+        return self.preferences.shape[0]
+
+    @property
+    def D(self):
+        return self.preferences.shape[1]
+
+    @property
+    def planning_vide(self):
+        return all(mdc == -1 for mdc in self.planning_initial) # si que des -1 -> on a un planning vide
+
+    @property
+    def skip_optim(self):
+        # on skip l'optimisation si toutes les cases sont remplies et qu'aucune modif n'est demandée
+        return not self.planning_vide and self.toutes_cases_remplies and self.aucune_case_gras
+
+def masque_jours(jours, D):
+    """
+    Convertit un dictionnaire de jours {'garde': [...], 'astreinte': [...]} en masque booléen (2, D) (gardes puis astreintes).
+    """
+
+    masque = np.zeros((2, D), dtype=bool)
+    masque[0, list(jours['garde'])] = True
+    masque[1, list(jours['astreinte'])] = True
+    return masque
+
+def jours_masque(masque):
+    """
+    Inverse de masque_jours.
+    """
+
+    return {'garde': np.flatnonzero(masque[0]).tolist(), 'astreinte': np.flatnonzero(masque[1]).tolist()}
+
+def erreur_mdc(fichier, feuille, mdc, mdc_feuille):
+    """
+    Erreur à lever quand les médecins d'une feuille (ou table) annexe ne correspondent pas à ceux de la table principale.
+    """
+
+    mdc_manquants = set(mdc) - set(mdc_feuille)
+    mdc_supplementaires = set(mdc_feuille) - set(mdc)
+
+    error_msg = f"\033[1m\033[31m[ERREUR]\033[0m Dans le fichier \033[1m\033[33m{fichier}\033[0m :"
+    if mdc_manquants:
+        error_msg += f"\nMédecins présents dans la feuille principale mais absents de la feuille {feuille} : \033[1m\033[36m{', '.join(map(str, mdc_manquants))}\033[0m"
+    if mdc_supplementaires:
+        error_msg += f"\nMédecins présents dans la feuille {feuille} mais absents de la feuille principale : \033[1m\033[36m{', '.join(map(str, mdc_supplementaires))}\033[0m"
+
+    return ErreurLecture(error_msg)
+
+def completer_implications(implications, preferences):
+    """
+    Gestion des trous dans les implications (incluant le cas où tout est vide) (cf FAQ),
+    puis normalisation pour que la somme des cibles soit égale au nombre de gardes (resp. astreintes) à attribuer.
+    """
+
+    D = preferences.shape[1]
+    implications = {cle: valeurs.copy() for cle, valeurs in implications.items()}
+
+    # pour les astreintes
+    masque_trous_astreintes = np.isnan(implications['astreintes'])
+    if masque_trous_astreintes.any():
+        nb_astreintes_manquantes = D - np.nansum(implications['astreintes'])
+        nb_medecins_sans_astreintes = np.sum(masque_trous_astreintes)
+        # distribution équitable des astreintes manquantes
+        implications['astreintes'][masque_trous_astreintes] = nb_astreintes_manquantes / nb_medecins_sans_astreintes
+
+    # pour les gardes
+    masque_trous_gardes = np.isnan(implications['gardes'])
+    # on va calculer un poids pour chaque médecin, avec lequel on va pondéré les gardes qu'on lui donne (en nombre cible)
+    if masque_trous_gardes.any():
+        nb_gardes_manquantes = D - np.nansum(implications['gardes'])
+        # calculer les poids basés sur les préférences positives
+        poids = (preferences > 0).sum(axis=1)
+        poids_medecins_sans_gardes = poids[masque_trous_gardes]
+        if poids_medecins_sans_gardes.sum() > 0:
+            poids_medecins_sans_gardes = poids_medecins_sans_gardes / poids_medecins_sans_gardes.sum()
+        else:
+            # si aucune préférence positive, distribution uniforme
+            poids_medecins_sans_gardes = np.ones_like(poids_medecins_sans_gardes) / len(poids_medecins_sans_gardes)
+        implications['gardes'][masque_trous_gardes] = nb_gardes_manquantes * poids_medecins_sans_gardes
+
+    # normalisation (il faut que la somme des gardes cibles soit effectivement égale à la somme des gardes à attribuer)
+    implications['gardes'] = implications['gardes'] * (D / implications['gardes'].sum())
+    implications['astreintes'] = implications['astreintes'] * (D / implications['astreintes'].sum()) # idem pour les astreintes
+
+    return implications
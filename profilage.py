@@ -0,0 +1,130 @@
+import os
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+"""
+Profilage de Gardien : durée de chaque phase et compteurs d'événements dans les boucles critiques.
+
+Désactivé par défaut. On l'active :
+-avec la variable d'environnement GARDIEN_PROFIL (=1 pour écrire le rapport dans gardien_profil.json, ou =<chemin du rapport>)
+-ou avec l'option --profil de la ligne de commande (cf gardien.py), ou l'argument profil de gardien.run
+
+Quand il est désactivé, chaque point de mesure se réduit à un test de profilage.ACTIF (aucun calcul, aucune allocation).
+Les boucles critiques testent donc ACTIF elles-mêmes avant d'appeler compter/histogramme.
+
+Les phases s'imbriquent : une phase ouverte dans une autre est nommée "parent/enfant" (ex: "optimisation/equipe 2/aco").
+Chaque compteur est cumulé globalement et dans la phase ouverte au moment de l'événement,
+ce qui permet de comparer les équipes entre elles (ex: fourmis par seconde de l'ACO de chaque équipe).
+
+Note: seuls les événements du processus principal sont comptés
+(pas ceux des processus de lecture ou du portfolio, dont on mesure seulement la durée totale).
+"""
+
+VARIABLE_PROFIL = 'GARDIEN_PROFIL'
+FICHIER_PROFIL = 'gardien_profil.json'
+
+ACTIF = False
+
+_pile = [] # noms complets des phases ouvertes
+_phases = {} # nom complet -> {'duree', 'appels', 'compteurs'}
+_compteurs = defaultdict(int)
+_histogrammes = defaultdict(lambda: defaultdict(int))
+
+def chemin_environnement():
+    """
+    Chemin du rapport demandé par la variable d'environnement GARDIEN_PROFIL, None si le profilage n'est pas demandé.
+    """
+
+    valeur = os.environ.get(VARIABLE_PROFIL, '').strip()
+    if valeur in ('', '0'):
+        return None
+    return FICHIER_PROFIL if valeur == '1' else valeur
+
+def activer(actif=True):
+    """
+    Active (ou désactive) le profilage, et remet toutes les mesures à zéro.
+    """
+
+    global ACTIF
+    ACTIF = actif
+    reinitialiser()
+
+def reinitialiser():
+    _pile.clear()
+    _phases.clear()
+    _compteurs.clear()
+    _histogrammes.clear()
+
+@contextmanager
+def phase(nom):
+    """
+    Mesure la durée du bloc (with phase('export'): ...). Sans effet si le profilage est désactivé.
+    """
+
+    if not ACTIF:
+        yield
+        return
+
+    nom_complet = f"{_pile[-1]}/{nom}" if _pile else nom
+    mesure = _phases.setdefault(nom_complet, {'duree': 0.0, 'appels': 0, 'compteurs': defaultdict(int)})
+    _pile.append(nom_complet)
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        mesure['duree'] += time.perf_counter() - debut
+        mesure['appels'] += 1
+        _pile.pop()
+
+def compter(nom, n=1):
+    """
+    Ajoute n à un compteur (globalement et dans la phase en cours). À appeler seulement si ACTIF.
+    """
+
+    _compteurs[nom] += n
+    if _pile:
+        _phases[_pile[-1]]['compteurs'][nom] += n
+
+def histogramme(nom, valeur):
+    """
+    Ajoute une observation (entière) à un histogramme. À appeler seulement si ACTIF.
+    """
+
+    _histogrammes[nom][int(valeur)] += 1
+
+def rapport():
+    """
+    Mesures collectées depuis l'activation, sous forme d'un dictionnaire sérialisable en JSON.
+    Pour chaque phase où l'ACO a tourné, on ajoute le débit en fourmis par seconde.
+    """
+
+    phases = {}
+    for nom, mesure in _phases.items():
+        compteurs = dict(mesure['compteurs'])
+        phases[nom] = {'duree': mesure['duree'], 'appels': mesure['appels'], 'compteurs': compteurs}
+        if compteurs.get('aco.fourmis') and mesure['duree'] > 0:
+            phases[nom]['aco.fourmis_par_seconde'] = compteurs['aco.fourmis'] / mesure['duree']
+
+    appels_forcer = _compteurs.get('forcer_contrainte.appels', 0)
+    derives = {}
+    if appels_forcer:
+        derives['forcer_contrainte.cases_modifiees_par_appel'] = _compteurs.get('forcer_contrainte.cases_modifiees', 0) / appels_forcer
+
+    return {
+        'phases': phases,
+        'compteurs': dict(_compteurs),
+        'histogrammes': {nom: {str(k): v for k, v in sorted(histo.items())} for nom, histo in _histogrammes.items()},
+        'derives': derives,
+    }
+
+def ecrire_rapport(chemin):
+    """
+    Écrit le rapport (cf rapport) au format JSON et renvoie son chemin absolu.
+    """
+
+    chemin = os.path.abspath(chemin)
+    with open(chemin, 'w', encoding='utf-8') as f:
+        json.dump(rapport(), f, indent=2, ensure_ascii=False)
+    return chemin
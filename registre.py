@@ -0,0 +1,75 @@
+import numpy as np
+
+"""
+Registre des médecins de toutes les équipes.
+
+Chaque équipe a ses propres indices de médecins (l'ordre des colonnes de son fichier).
+Un médecin qui appartient à plusieurs équipes a donc un indice différent dans chacune
+(par exemple, si JMR appartient à 2 équipes, son indice dans la 1ere peut être 6 mais dans la 2e ça peut être 2).
+Le registre attribue une fois pour toutes un identifiant global à chaque médecin (via un dictionnaire),
+et précalcule pour chaque équipe les tableaux de conversion local -> global et global -> local,
+ainsi que le nombre d'équipes auquel appartient chaque médecin (utilisé pour les réductions).
+"""
+
+class RegistreMedecins:
+    def __init__(self, mdc_eqs):
+        """
+        mdc_eqs: pour chaque équipe, la liste des noms de ses médecins (dans l'ordre des indices locaux)
+        """
+
+        self.ids = {} # nom -> identifiant global
+        self.noms = [] # identifiant global -> nom (ordre de première apparition)
+        for mdc_eq in mdc_eqs:
+            for nom in mdc_eq:
+                if nom not in self.ids:
+                    self.ids[nom] = len(self.noms)
+                    self.noms.append(nom)
+
+        G = len(self.noms)
+
+        # local_vers_global[eq][i] : identifiant global du médecin i de l'équipe eq
+        self.local_vers_global = [np.array([self.ids[nom] for nom in mdc_eq], dtype=np.intp) for mdc_eq in mdc_eqs]
+
+        # global_vers_local[eq][g] : indice du médecin g dans l'équipe eq (-1 s'il n'en fait pas partie)
+        self.global_vers_local = []
+        for l2g in self.local_vers_global:
+            g2l = np.full(G, -1, dtype=np.intp)
+            g2l[l2g] = np.arange(len(l2g))
+            self.global_vers_local.append(g2l)
+
+        # nombre d'équipes auquel appartient chaque médecin (identifiant global)
+        self.nombre_equipes = np.zeros(G, dtype=int)
+        for l2g in self.local_vers_global:
+            self.nombre_equipes[np.unique(l2g)] += 1
+
+    def __len__(self):
+        return len(self.noms)
+
+    @property
+    def E(self):
+        return len(self.local_vers_global)
+
+    def vers_global(self, eq, planning):
+        """
+        Convertit un planning (ou tout tableau d'indices) de l'équipe eq en identifiants globaux (-1 reste -1).
+        """
+
+        planning = np.asarray(planning, dtype=np.intp)
+        return np.where(planning == -1, -1, self.local_vers_global[eq][planning])
+
+    def vers_local(self, eq, planning_global):
+        """
+        Convertit des identifiants globaux en indices de l'équipe eq (-1 si vide ou si le médecin n'est pas dans l'équipe).
+        """
+
+        planning_global = np.asarray(planning_global, dtype=np.intp)
+        return np.where(planning_global == -1, -1, self.global_vers_local[eq][planning_global])
+
+    def reductions(self, eq):
+        """
+        Pour chaque médecin de l'équipe eq, le nombre d'équipes auquel il appartient.
+        Cela permet, si jamais on n'a pas d'implication donnée, de réduire l'implication de médecins qui sont dans plusieurs équipes
+        (cf FAQ pour plus de détails)
+        """
+
+        return self.nombre_equipes[self.local_vers_global[eq]]
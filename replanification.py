@@ -0,0 +1,201 @@
+import os
+import time
+import tempfile
+import numpy as np
+
+from definition import GestionnairePlanning
+from construction import solution_construite
+from algo_recuit_simule import recherche_recuit_simule, EtatRecuit
+from config import SEUIL_PREF_NEG_ASTREINTE, NEG_PREF_TEAM
+import profilage
+
+"""
+Re-planification incrémentale : après un petit changement (un médecin demande à être retiré de quelques jours,
+ce qui donne des cases en gras, ou ses préférences changent), on ne réoptimise qu'une fenêtre de jours
+autour des créneaux concernés, au lieu de relancer ACO+TS sur toute la période.
+
+-créneaux concernés (cf creneaux_affectes) : cases en gras, cases vides, et cases dont le médecin ne peut plus vraisemblablement
+ les tenir (préférence sous SEUIL_PREF_NEG_ASTREINTE, ou médecin pris dans une autre équipe, comme dans candidats.py),
+ ou dont la préférence a baissé si on donne les préférences précédentes.
+-fenêtre : les jours à moins de rayon jours d'un créneau concerné. Tous les autres jours sont figés :
+ ils sont traités comme des jours soulignés, donc ni la construction, ni la réparation, ni le recuit ne les modifient.
+-recherche dans la fenêtre : construction (cf construction.py), recuit simulé à évaluation incrémentale (cf algo_recuit_simule.py),
+ puis descente exhaustive sur le voisinage complet de la fenêtre (tous les changements de médecin d'un créneau
+ et tous les échanges de deux gardes), jusqu'à un optimum local.
+ (une énumération exhaustive de toutes les affectations de la fenêtre est hors de portée dès quelques créneaux : N^nb_creneaux)
+
+La re-planification ne prend que quelques dixièmes de seconde à une seconde, et rien ne change en dehors de la fenêtre.
+
+Les préférences avec lesquelles chaque planning a été fait sont enregistrées à chaque exécution (FICHIER_PREFERENCES,
+dans le dossier du cache, une entrée par fichier d'équipe) : à l'exécution suivante, on les compare aux nouvelles préférences
+pour repérer les créneaux dont la préférence a baissé (ex: +2 -> -3 sur un jour où le médecin est affecté).
+"""
+
+RAYON_FENETRE = 3 # nombre de jours de part et d'autre de chaque créneau concerné
+PARAMS_RECUIT_FENETRE = {'nb_iters_cycle': 500, 'T_0': None, 'a': 0.9, 'nb_iters_max': 20_000}
+DUREE_MAX_FENETRE = 1.0 # durée maximale de la recherche dans la fenêtre (secondes, hors construction)
+FICHIER_PREFERENCES = 'preferences_plans.npz'
+
+def charger_preferences_plans(chemin, fichiers, preferences_eqs):
+    """
+    Pour chaque fichier d'équipe, préférences avec lesquelles son planning avait été fait lors d'une exécution précédente,
+    ou None si on ne les a pas (ou si leur forme (N, D) ne correspond plus aux préférences actuelles).
+    """
+
+    try:
+        with np.load(chemin) as archive:
+            enregistrees = {nom: archive[nom].copy() for nom in archive.files}
+    except (OSError, ValueError):
+        return [None] * len(fichiers)
+
+    precedentes = []
+    for fichier, preferences in zip(fichiers, preferences_eqs):
+        anciennes = enregistrees.get(fichier)
+        precedentes.append(anciennes if anciennes is not None and anciennes.shape == np.shape(preferences) else None)
+    return precedentes
+
+def enregistrer_preferences_plans(chemin, fichiers, preferences_eqs):
+    """
+    Enregistre les préférences avec lesquelles les plannings de ces fichiers viennent d'être faits (les entrées
+    des autres fichiers sont conservées). Écrit dans un fichier temporaire puis renommé, comme le point de reprise.
+    """
+
+    tableaux = {}
+    try:
+        with np.load(chemin) as archive:
+            tableaux = {nom: archive[nom].copy() for nom in archive.files}
+    except (OSError, ValueError):
+        pass
+    for fichier, preferences in zip(fichiers, preferences_eqs):
+        tableaux[fichier] = np.asarray(preferences, dtype=float)
+
+    dossier = os.path.dirname(os.path.abspath(chemin))
+    chemin_tmp = None
+    try:
+        os.makedirs(dossier, exist_ok=True)
+        descripteur, chemin_tmp = tempfile.mkstemp(dir=dossier, prefix='.tmp-', suffix='.npz')
+        with os.fdopen(descripteur, 'wb') as f:
+            np.savez(f, **tableaux)
+        os.replace(chemin_tmp, chemin)
+    except OSError:
+        # comme le cache, ce n'est qu'une aide à la re-planification : on ne bloque pas l'exécution
+        if chemin_tmp is not None and os.path.exists(chemin_tmp):
+            os.remove(chemin_tmp)
+
+def creneaux_affectes(gplan, planning_initial, preferences_precedentes=None):
+    """
+    Créneaux (s: 0 garde, 1 astreinte ; jour t) à réoptimiser (cf commentaire en haut du fichier), hors cases soulignées.
+    """
+
+    D = gplan.D
+    planning_initial = np.asarray(planning_initial)
+    preferences = np.asarray(gplan.preferences, dtype=float)
+
+    creneaux = set()
+    for s, type_creneau in enumerate(['garde', 'astreinte']):
+        for t in gplan.jours_gras[type_creneau]:
+            creneaux.add((s, t))
+        for t in range(D):
+            mdc = planning_initial[s * D + t]
+            if mdc == -1:
+                creneaux.add((s, t))
+                continue
+            pref = preferences[mdc, t]
+            if pref <= NEG_PREF_TEAM or pref < SEUIL_PREF_NEG_ASTREINTE:
+                creneaux.add((s, t))
+            elif preferences_precedentes is not None and pref < preferences_precedentes[mdc][t]:
+                creneaux.add((s, t))
+
+    soulignes = (set(gplan.jours_soulignes['garde']), set(gplan.jours_soulignes['astreinte']))
+    return sorted((s, t) for s, t in creneaux if t not in soulignes[s])
+
+def jours_fenetre(creneaux, D, rayon=RAYON_FENETRE):
+    """
+    Jours (triés) à moins de rayon jours d'un des créneaux.
+    """
+
+    jours = set()
+    for _, t in creneaux:
+        jours.update(range(max(t - rayon, 0), min(t + rayon + 1, D)))
+    return sorted(jours)
+
+def _descente_exhaustive(etat, temps_limite):
+    """
+    Descente sur le voisinage complet de la fenêtre (créneaux modifiables de etat) : à chaque passe, on essaie tous les médecins
+    de chaque créneau et tous les échanges de deux gardes, et on applique chaque amélioration trouvée. S'arrête à un optimum local.
+    """
+
+    ameliore = True
+    while ameliore and time.time() < temps_limite:
+        ameliore = False
+        for s in (0, 1):
+            for t in etat.modifiables[s]:
+                for mdc in range(etat.N):
+                    actuel = etat.gardes[t] if s == 0 else etat.astreintes[t]
+                    if mdc == actuel or not etat.faisable(s, t, mdc):
+                        continue
+                    d = etat.delta(s, t, mdc)
+                    if d < -1e-9:
+                        etat.appliquer(s, t, mdc, d)
+                        ameliore = True
+
+        gardes = etat.modifiables[0]
+        for i, t in enumerate(gardes):
+            for u in gardes[i + 1:]:
+                mdc_t, mdc_u = etat.gardes[t], etat.gardes[u]
+                if mdc_t == mdc_u:
+                    continue
+                etat.gardes[t], etat.gardes[u] = mdc_u, mdc_t # (provisoirement, pour tester les contraintes)
+                ok = etat.faisable(0, t, mdc_u) and etat.faisable(0, u, mdc_t)
+                etat.gardes[t], etat.gardes[u] = mdc_t, mdc_u
+                if not ok:
+                    continue
+                d1 = etat.delta(0, t, mdc_u)
+                etat.appliquer(0, t, mdc_u, d1)
+                d2 = etat.delta(0, u, mdc_t)
+                if d1 + d2 < -1e-9:
+                    etat.appliquer(0, u, mdc_t, d2)
+                    ameliore = True
+                else:
+                    etat.appliquer(0, t, mdc_t, -d1)
+
+def replanifier(gplan, planning_initial, preferences_precedentes=None, rayon=RAYON_FENETRE, eq=None, afficher=False, trace=None):
+    """
+    Re-planification incrémentale de planning_initial (cf commentaire en haut du fichier).
+    gplan: GestionnairePlanning de l'équipe (préférences à jour, jours en gras et soulignés)
+    preferences_precedentes: préférences (N, D) avec lesquelles planning_initial avait été fait, si on les a
+    Renvoie le planning, son critère (calcule_critere de gplan), et les jours de la fenêtre.
+    """
+
+    D = gplan.D
+    planning_initial = np.array(planning_initial, dtype=int)
+
+    creneaux = creneaux_affectes(gplan, planning_initial, preferences_precedentes)
+    if not creneaux: # rien à changer
+        return planning_initial, gplan.calcule_critere(planning_initial), []
+    jours = jours_fenetre(creneaux, D, rayon)
+
+    # hors de la fenêtre, tout est figé : on le traite comme des jours soulignés
+    dans_fenetre = np.zeros(D, dtype=bool)
+    dans_fenetre[jours] = True
+    figes = [int(t) for t in np.flatnonzero(~dans_fenetre)]
+    jours_soulignes = {type_creneau: sorted(set(gplan.jours_soulignes[type_creneau]) | set(figes)) for type_creneau in ['garde', 'astreinte']}
+    gfenetre = GestionnairePlanning(gplan.N, D, gplan.preferences, gplan.reductions, gplan.attributs, gplan.implications, gplan.jours_gras, jours_soulignes, planning_initial.tolist(), gplan.k_candidats)
+
+    with profilage.phase('construction'):
+        depart = solution_construite(gfenetre, planning_initial, gplan.jours_gras)
+
+    temps_limite = time.time() + DUREE_MAX_FENETRE
+    with profilage.phase('recuit'):
+        resultat, _ = recherche_recuit_simule(gplan=gfenetre, sol=depart, planning_initial=planning_initial, jours_gras=gplan.jours_gras, eq=eq, temps_limite=temps_limite, afficher=afficher, trace=trace, **PARAMS_RECUIT_FENETRE)
+
+        etat = EtatRecuit(gfenetre, resultat, planning_initial, gplan.jours_gras)
+        _descente_exhaustive(etat, temps_limite)
+        resultat = etat.vers_planning()
+
+    # garantie : rien n'a changé en dehors de la fenêtre
+    hors_fenetre = np.concatenate((~dans_fenetre, ~dans_fenetre))
+    if np.any(resultat[hors_fenetre] != planning_initial[hors_fenetre]):
+        raise Exception(f"\033[1m\033[31m[ERREUR]\033[0m La re-planification de l'équipe {eq} a modifié des jours hors de la fenêtre.")
+
+    return resultat, gplan.calcule_critere(resultat), jours
@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+"""
+Point de reprise de solve_multi : les résultats des équipes déjà optimisées sont enregistrés au fur et à mesure.
+
+Si l'exécution s'arrête en route (erreur sur une équipe, interruption...), la suivante ne réoptimise pas les équipes
+déjà terminées au lieu de tout recommencer. Chaque équipe terminée est enregistrée avec une clé qui lui est propre
+(hash de ses données : médecins, préférences, planning initial...), et le point de reprise entier avec une clé des options
+(portfolio, fenêtre) : l'ordre des équipes peut donc changer d'une exécution à l'autre (gardien.py les mélange).
+Les équipes terminées sont rejouées en premier, dans l'ordre où elles avaient été optimisées, ce qui redonne exactement
+les mêmes préférences bloquées aux équipes suivantes (cf solve_multi). Le point de reprise est supprimé une fois
+toutes les équipes optimisées.
+
+Format : une archive .npz (clé des options, clés des équipes terminées dans l'ordre, puis résultat et score de chacune),
+écrite dans un fichier temporaire puis renommée, pour ne jamais laisser de point de reprise à moitié écrit.
+"""
+
+FICHIER_REPRISE = 'reprise.npz'
+
+def cle_reprise(*donnees):
+    """
+    Hash (sha256) de données quelconques : tableaux numpy, listes, dictionnaires, nombres, chaînes.
+    """
+
+    h = hashlib.sha256()
+
+    def ajouter(valeur):
+        if isinstance(valeur, np.ndarray):
+            h.update(str((valeur.dtype.str, valeur.shape)).encode())
+            h.update(np.ascontiguousarray(valeur).tobytes())
+        elif isinstance(valeur, dict):
+            h.update(b'{')
+            for cle in sorted(valeur, key=str):
+                ajouter(str(cle))
+                ajouter(valeur[cle])
+            h.update(b'}')
+        elif isinstance(valeur, (list, tuple)):
+            h.update(b'[')
+            for element in valeur:
+                ajouter(element)
+            h.update(b']')
+        else:
+            h.update(json.dumps(valeur, default=str).encode())
+
+    for valeur in donnees:
+        ajouter(valeur)
+    return h.hexdigest()
+
+def charger_reprise(chemin, cle):
+    """
+    Équipes terminées [(clé de l'équipe, planning, score)], dans l'ordre où elles ont été optimisées,
+    ou [] si pas de point de reprise (ou s'il a été fait avec d'autres options).
+    """
+
+    try:
+        with np.load(chemin) as archive:
+            if str(archive['cle']) != cle:
+                return []
+            return [(str(cle_equipe), archive[f"resultat_{k}"].copy(), float(archive[f"score_{k}"])) for k, cle_equipe in enumerate(archive['equipes'])]
+    except (OSError, KeyError, ValueError):
+        return []
+
+def enregistrer_reprise(chemin, cle, termines):
+    """
+    Enregistre les équipes terminées [(clé de l'équipe, planning, score)], dans l'ordre où elles ont été optimisées.
+    """
+
+    tableaux = {'cle': np.array(cle), 'equipes': np.array([cle_equipe for cle_equipe, _, _ in termines], dtype=str)}
+    for k, (_, resultat, score) in enumerate(termines):
+        tableaux[f"resultat_{k}"] = np.asarray(resultat)
+        tableaux[f"score_{k}"] = np.array(score, dtype=float)
+
+    dossier = os.path.dirname(os.path.abspath(chemin))
+    chemin_tmp = None
+    try:
+        os.makedirs(dossier, exist_ok=True)
+        descripteur, chemin_tmp = tempfile.mkstemp(dir=dossier, prefix='.tmp-', suffix='.npz')
+        with os.fdopen(descripteur, 'wb') as f:
+            np.savez(f, **tableaux)
+        os.replace(chemin_tmp, chemin)
+    except OSError:
+        # comme le cache, le point de reprise n'est qu'une optimisation : on ne bloque pas l'exécution
+        if chemin_tmp is not None and os.path.exists(chemin_tmp):
+            os.remove(chemin_tmp)
+
+def supprimer_reprise(chemin):
+    try:
+        os.remove(chemin)
+    except OSError:
+        pass
@@ -1,109 +1,448 @@
-import copy
+import os
+import random
+import time
+import multiprocessing as mp
 import numpy as np
+import tqdm
 
-from definition import GestionnairePlanning
+from definition import GestionnairePlanning, ErreurReparation
 from algo_ant_colony import recherche_ant_colony
 from algo_tabou import recherche_tabou
+from algo_recuit_simule import recherche_recuit_simule
+from algo_genetique import recherche_algo_genetique
+from construction import solution_construite
+from borne import borne_inferieure, borne_atteinte
 from config import *
+import profilage
+from replanification import replanifier
+from reprise import cle_reprise, charger_reprise, enregistrer_reprise, supprimer_reprise
 
-def solve_mono(nombre_jours, nombre_mdc, preferences, reductions=None, attributs=None, implications=None, eq=None, planning_initial=None, jours_gras=None, jours_soulignes=None, skip_optim=False):
+# méthodes mises en concurrence par solve_portfolio (une par processus)
+METHODES_PORTFOLIO = ['aco_ts', 'recuit', 'genetique']
+
+# paramètres du recuit simulé et de l'algorithme génétique lorsqu'ils tournent dans le portfolio
+# (ils ne sont pas utilisés par solve_mono, donc n'ont pas d'équivalent dans config.py)
+# T_0=None : température initiale calibrée automatiquement (cf algo_recuit_simule.py)
+PARAMS_RECUIT_PORTFOLIO = {'nb_iters_cycle': 1000, 'T_0': None, 'a': 0.95}
+PARAMS_GENETIQUE_PORTFOLIO = {'taille_population': 30, 'nb_generations': 20, 'taux_mutation': 0.3}
+
+NB_ESSAIS_EQUIPE = 3 # solve_multi : nombre d'essais (avec une nouvelle graine à chaque fois) d'une équipe dont la réparation échoue
+
+# les recherches partent d'un planning construit par affectations de coût minimal (cf construction.py)
+# plutôt que d'un planning aléatoire ; l'ACO a alors besoin de beaucoup moins d'itérations (NUM_ITERS_AC)
+CONSTRUCTION_INITIALE = True
+
+# méthode de solve_mono : 'aco_ts' (ACO puis TS), 'aco_recuit' (ACO puis recuit simulé, cf algo_recuit_simule.py)
+# ou 'genetique' (algorithme génétique vectorisé, cf algo_genetique.py)
+# le génétique de solve_mono tourne en îles (une population par processus, au plus 4)
+METHODE_MONO = 'aco_ts'
+PARAMS_RECUIT_MONO = {'nb_iters_cycle': 1000, 'T_0': None, 'a': 0.95, 'nb_iters_max': 100_000}
+PARAMS_GENETIQUE_MONO = {'taille_population': 100, 'nb_generations': 300, 'taux_mutation': 0.3, 'nb_iles': min(4, os.cpu_count() or 1)}
+
+def solve_mono(nombre_jours, nombre_mdc, preferences, reductions=None, attributs=None, implications=None, eq=None, planning_initial=None, jours_gras=None, jours_soulignes=None, skip_optim=False, afficher=True, trace=None, fenetre=None, preferences_precedentes=None):
     """
-    Optimise un seul planning avec ACO+TS
+    Optimise un seul planning avec ACO+TS (ou ACO+recuit, ou avec l'algorithme génétique, selon METHODE_MONO)
+    afficher: affiche ou non les barres de progression
+    trace: fonction appelée à chaque itération de l'ACO puis du TS (cf traces.py)
+    fenetre: si donné (rayon en jours), re-planification incrémentale d'un planning initial déjà rempli :
+    seuls les jours à moins de fenetre jours des créneaux concernés sont réoptimisés (cf replanification.py)
+    preferences_precedentes: avec fenetre, préférences (N, D) avec lesquelles planning_initial avait été fait, si on les a
+    (les créneaux dont la préférence a baissé sont alors aussi réoptimisés)
     """
 
-    if skip_optim and planning_initial is not None:
+    # en re-planification, même un planning complet sans case en gras est examiné (préférences qui ont baissé, cf replanification.py)
+    incremental = fenetre is not None and planning_initial is not None and np.any(np.array(planning_initial) != -1)
+    if skip_optim and planning_initial is not None and not incremental:
         return np.array(planning_initial), 0
     
     gplan = GestionnairePlanning(nombre_mdc, nombre_jours, preferences, reductions, attributs, implications, jours_gras, jours_soulignes, planning_initial)
 
+    if incremental:
+        resultat, score, _ = replanifier(gplan, planning_initial, preferences_precedentes, rayon=fenetre, eq=eq, afficher=afficher, trace=trace)
+        return resultat, score
+
+    if METHODE_MONO == 'genetique':
+        return resoudre_genetique(gplan, planning_initial, jours_gras, eq=eq, afficher=afficher, trace=trace)
+    seconde_etape = 'recuit' if METHODE_MONO == 'aco_recuit' else 'tabou'
+    return resoudre_aco_tabou(gplan, planning_initial, jours_gras, eq=eq, afficher=afficher, trace=trace, seconde_etape=seconde_etape)
+
+def resoudre_aco_tabou(gplan, planning_initial=None, jours_gras=None, eq=None, temps_limite=None, afficher=True, trace=None, seconde_etape='tabou'):
+    """
+    Les deux étapes de solve_mono (ACO puis TS) sur un GestionnairePlanning déjà construit.
+    temps_limite: instant (time.time()) après lequel on arrête la recherche (commun aux deux étapes)
+    seconde_etape: 'tabou', ou 'recuit' pour remplacer le TS par le recuit simulé (PARAMS_RECUIT_MONO)
+    Les deux étapes s'arrêtent aussi dès que le critère est assez proche de la borne inférieure (cf borne.py).
+    """
+
     if planning_initial is not None:
         planning_initial = np.array(planning_initial)
-        nb_vides = np.sum(np.array(planning_initial) == -1)
-        
-        nb_gras = len(jours_gras['garde']) + len(jours_gras['astreinte'])
-        max_dist = MAX_DIST + nb_gras + nb_vides # on rajoute à max_dist les jours en gras et les cases vides (non comptées dans la distance)
-    else:
-        planning_initial = None
-        max_dist = None
+    max_dist = _max_dist(planning_initial, jours_gras)
+    borne = borne_inferieure(gplan)
+
+    # solution de départ, qui amorce l'ACO (et donc le TS, qui part du meilleur planning de l'ACO)
+    sol_depart = None
+    if CONSTRUCTION_INITIALE:
+        with profilage.phase('construction'):
+            sol_depart = solution_construite(gplan, planning_initial, jours_gras)
 
     # PREMIERE ETAPE : ANT COLONY OPTIMIZATION (ACO)
-    resultat_aoc, _, _ = recherche_ant_colony(NUM_ANTS, NUM_ITERS_AC, ALPHA, BETA, RHO, gplan, eq=eq, sol_initiale=planning_initial, jours_gras=jours_gras)
+    with profilage.phase('aco'):
+        resultat_aoc, _, _ = recherche_ant_colony(NUM_ANTS, NUM_ITERS_AC, ALPHA, BETA, RHO, gplan, eq=eq, sol_initiale=planning_initial, jours_gras=jours_gras, temps_limite=temps_limite, afficher=afficher, trace=trace, sol_depart=sol_depart, borne=borne)
+
+    # DEUXIEME ETAPE : TABOU SEARCH (TS), ou recuit simulé
+    if seconde_etape == 'recuit':
+        with profilage.phase('recuit'):
+            resultat_tabou, scores = recherche_recuit_simule(gplan=gplan, sol=resultat_aoc, eq=eq, max_dist=max_dist, planning_initial=planning_initial, jours_gras=jours_gras, temps_limite=temps_limite, afficher=afficher, trace=trace, borne=borne, **PARAMS_RECUIT_MONO)
+    else:
+        with profilage.phase('tabou'):
+            resultat_tabou, scores = recherche_tabou(NUM_ITERS_T, NUM_VOISINS, MAX_STAGNATION, LEN_TABOU, gplan, sol=resultat_aoc, eq=eq, max_dist=max_dist, planning_initial=planning_initial, jours_gras=jours_gras, temps_limite=temps_limite, afficher=afficher, trace=trace, borne=borne)
+
+    return np.asarray(resultat_tabou, dtype=int), gplan.calcule_critere(resultat_tabou) # (scores est le critère de la solution courante du TS, pas celui de la meilleure)
+
+def resoudre_genetique(gplan, planning_initial=None, jours_gras=None, eq=None, temps_limite=None, afficher=True, trace=None):
+    """
+    solve_mono avec l'algorithme génétique (PARAMS_GENETIQUE_MONO), à partir de la solution de départ de _solution_depart.
+    Le génétique ne limite pas la distance au planning initial : si son résultat est trop éloigné (cf _max_dist),
+    on garde la solution de départ.
+    """
+
+    if planning_initial is not None:
+        planning_initial = np.array(planning_initial)
+    max_dist = _max_dist(planning_initial, jours_gras)
+    borne = borne_inferieure(gplan)
+
+    with profilage.phase('construction'):
+        depart = _solution_depart(gplan, planning_initial)
+
+    with profilage.phase('genetique'):
+        resultat, _ = recherche_algo_genetique(gplan=gplan, sol=depart, temps_limite=temps_limite, trace=trace, borne=borne, eq=eq, afficher=afficher, **PARAMS_GENETIQUE_MONO)
+
+    if max_dist is not None:
+        masque = planning_initial != -1
+        if np.sum(resultat[masque] != planning_initial[masque]) > max_dist:
+            resultat = depart
+
+    return np.asarray(resultat, dtype=int), gplan.calcule_critere(resultat)
+
+def _max_dist(planning_initial, jours_gras):
+    """
+    Distance maximale autorisée au planning initial (cf solve_mono), None si pas de planning initial.
+    """
+
+    if planning_initial is None:
+        return None
+
+    nb_vides = np.sum(np.array(planning_initial) == -1)
+    nb_gras = len(jours_gras['garde']) + len(jours_gras['astreinte']) if jours_gras else 0
+    return MAX_DIST + nb_gras + nb_vides # on rajoute à max_dist les jours en gras et les cases vides (non comptées dans la distance)
+
+def _solution_depart(gplan, planning_initial):
+    """
+    Solution de départ pour le recuit et le génétique : le planning initial dont on remplit les cases vides
+    (par construction, cf construction.py, ou au hasard si CONSTRUCTION_INITIALE est désactivée).
+    (ces deux méthodes ne savent pas gérer les -1, contrairement à l'ACO)
+    """
+
+    if CONSTRUCTION_INITIALE:
+        return solution_construite(gplan, planning_initial, gplan.jours_gras)
+
+    if planning_initial is None:
+        return gplan.solution_initiale()
+
+    sol = np.array(planning_initial).copy()
+    for i in np.where(sol == -1)[0]:
+        sol[i] = gplan.random_mdc()
+    return gplan.forcer_contrainte(sol)
+
+def _worker_portfolio(id_methode, gplan, planning_initial, jours_gras, max_dist, borne, temps_fin, periode_echange, cible, max_stagnation_portfolio, graine, meilleur_planning, meilleur_score, meilleure_methode, verrou, arret, jour_echec):
+    """
+    Processus du portfolio (cf _course_portfolio). Si la réparation échoue (ErreurReparation), le processus s'arrête
+    et le jour bloqué est publié dans jour_echec, pour que solve_portfolio puisse relever l'erreur.
+    """
+
+    try:
+        _course_portfolio(id_methode, gplan, planning_initial, jours_gras, max_dist, borne, temps_fin, periode_echange, cible, max_stagnation_portfolio, graine, meilleur_planning, meilleur_score, meilleure_methode, verrou, arret)
+    except ErreurReparation as erreur:
+        with verrou:
+            jour_echec.value = erreur.jour
+
+def _course_portfolio(id_methode, gplan, planning_initial, jours_gras, max_dist, borne, temps_fin, periode_echange, cible, max_stagnation_portfolio, graine, meilleur_planning, meilleur_score, meilleure_methode, verrou, arret):
+    """
+    Course d'un processus du portfolio : fait tourner une méthode par tranches de periode_echange secondes.
+    Entre deux tranches, on publie notre meilleure solution dans la mémoire partagée si elle bat celle des autres,
+    ou au contraire on repart de la solution partagée si elle est meilleure que la nôtre.
+    """
+
+    random.seed(graine)
+    np.random.seed(graine)
+
+    methode = METHODES_PORTFOLIO[id_methode]
+    D = gplan.D
+
+    if planning_initial is not None:
+        planning_initial = np.array(planning_initial)
+        masque = planning_initial != -1
+
+    sol = None
+    sol_score = float('inf')
+    stagnation = 0
+    tranche = 0
+
+    while not arret.is_set() and time.time() < temps_fin:
+        temps_limite = min(temps_fin, time.time() + periode_echange)
+
+        if methode == 'aco_ts':
+            if tranche == 0: # première tranche : ACO (comme solve_mono), puis TS sur les tranches suivantes
+                sol_depart = solution_construite(gplan, planning_initial, jours_gras) if CONSTRUCTION_INITIALE else None
+                resultat, _, _ = recherche_ant_colony(NUM_ANTS, NUM_ITERS_AC, ALPHA, BETA, RHO, gplan, sol_initiale=planning_initial, jours_gras=jours_gras, temps_limite=temps_limite, afficher=False, sol_depart=sol_depart, borne=borne)
+            else:
+                resultat, _ = recherche_tabou(NUM_ITERS_T, NUM_VOISINS, MAX_STAGNATION, LEN_TABOU, gplan, sol=sol, max_dist=max_dist, planning_initial=planning_initial, jours_gras=jours_gras, temps_limite=temps_limite, afficher=False, borne=borne)
+        elif methode == 'recuit':
+            depart = sol if sol is not None else _solution_depart(gplan, planning_initial)
+            resultat, _ = recherche_recuit_simule(gplan=gplan, sol=depart, max_dist=max_dist, planning_initial=planning_initial, jours_gras=jours_gras, temps_limite=temps_limite, borne=borne, **PARAMS_RECUIT_PORTFOLIO)
+        else:
+            depart = sol if sol is not None else _solution_depart(gplan, planning_initial)
+            resultat, _ = recherche_algo_genetique(gplan=gplan, sol=depart, temps_limite=temps_limite, borne=borne, **PARAMS_GENETIQUE_PORTFOLIO)
+
+        tranche += 1
+        resultat_score = gplan.calcule_critere(resultat)
+
+        # le génétique ne limite pas la distance au planning initial : on ignore ses solutions trop éloignées
+        if max_dist is not None and np.sum(resultat[masque] != planning_initial[masque]) > max_dist:
+            resultat_score = float('inf')
+
+        if resultat_score < sol_score:
+            sol, sol_score = resultat.copy(), resultat_score
+            stagnation = 0
+        else:
+            stagnation += 1
+
+        # échange avec les autres processus
+        with verrou:
+            if sol_score < meilleur_score.value:
+                meilleur_planning[:] = sol.tolist()
+                meilleur_score.value = sol_score
+                meilleure_methode.value = id_methode
+            elif meilleur_score.value < sol_score:
+                sol = np.array(meilleur_planning[:], dtype=int)
+                sol_score = meilleur_score.value
+
+        # arrêt global dès qu'une méthode stagne sous la cible, ou dès que la borne inférieure est (presque) atteinte
+        if cible is not None and sol_score <= cible and stagnation >= max_stagnation_portfolio:
+            arret.set()
+        if borne_atteinte(sol_score, borne):
+            arret.set()
+
+def solve_portfolio(nombre_jours, nombre_mdc, preferences, reductions=None, attributs=None, implications=None, eq=None, planning_initial=None, jours_gras=None, jours_soulignes=None, skip_optim=False, afficher=True, duree=60, periode_echange=5, cible=None, max_stagnation_portfolio=3, methodes=None):
+    """
+    Optimise un seul planning en faisant courir plusieurs méthodes en parallèle (ACO+TS, recuit simulé, génétique),
+    chacune dans son processus, sur le même GestionnairePlanning et avec un temps commun de duree secondes.
+
+    Toutes les periode_echange secondes, chaque méthode compare sa meilleure solution à la meilleure solution commune :
+    elle la remplace si elle est meilleure, sinon elle repart de la solution commune.
+    La course s'arrête à la fin du temps imparti, ou dès qu'une méthode a un score <= cible
+    et n'améliore plus sa solution depuis max_stagnation_portfolio tranches,
+    ou dès que le meilleur score est assez proche de la borne inférieure (cf borne.py).
+
+    Même signature et même retour que solve_mono (+ paramètres de la course).
+    """
+
+    if skip_optim and planning_initial is not None:
+        return np.array(planning_initial), 0
+
+    gplan = GestionnairePlanning(nombre_mdc, nombre_jours, preferences, reductions, attributs, implications, jours_gras, jours_soulignes, planning_initial)
+    max_dist = _max_dist(planning_initial, jours_gras)
+    borne = borne_inferieure(gplan)
+
+    if methodes is None:
+        methodes = METHODES_PORTFOLIO
+
+    ctx = mp.get_context()
+    meilleur_planning = ctx.Array('q', 2*nombre_jours, lock=False)
+    meilleur_score = ctx.Value('d', float('inf'), lock=False)
+    meilleure_methode = ctx.Value('i', -1, lock=False)
+    jour_echec = ctx.Value('i', -1, lock=False) # jour bloqué si la réparation d'une méthode a échoué (cf _worker_portfolio)
+    verrou = ctx.Lock()
+    arret = ctx.Event()
+
+    debut = time.time()
+    temps_fin = debut + duree
+    graine = np.random.randint(0, 2**31 - 1 - len(METHODES_PORTFOLIO))
+
+    processus = []
+    for methode in methodes:
+        id_methode = METHODES_PORTFOLIO.index(methode)
+        p = ctx.Process(target=_worker_portfolio, args=(id_methode, gplan, planning_initial, jours_gras, max_dist, borne, temps_fin, periode_echange, cible, max_stagnation_portfolio, graine + id_methode, meilleur_planning, meilleur_score, meilleure_methode, verrou, arret, jour_echec), daemon=True)
+        p.start()
+        processus.append(p)
+
+    # suivi de la course (le processus principal ne fait qu'afficher)
+    pbar = tqdm.tqdm(total=int(duree), bar_format="{desc} {bar} {n_fmt}/{total_fmt}s", disable=not afficher)
+    while any(p.is_alive() for p in processus) and time.time() < temps_fin + periode_echange:
+        time.sleep(0.2)
+        pbar.n = min(int(time.time() - debut), int(duree))
+        if meilleure_methode.value != -1:
+            pbar.set_description(f"\033[1m\033[35m[GARDIEN]\033[0m [\033[34mÉquipe {eq}\033[0m \033[1m\033[35mportfolio\033[0m] \033[32mmeilleur score: \033[1m{meilleur_score.value:.0f}\033[0m ({METHODES_PORTFOLIO[meilleure_methode.value]})")
+        pbar.refresh()
+    pbar.close()
 
-    # DEUXIEME ETAPE : TABOU SEARCH (TS)
-    resultat_tabou, scores = recherche_tabou(NUM_ITERS_T, NUM_VOISINS, MAX_STAGNATION, LEN_TABOU, gplan, sol=resultat_aoc, eq=eq, max_dist=max_dist, planning_initial=planning_initial, jours_gras=jours_gras)
+    # une itération peut déborder du temps imparti : au-delà d'une période d'échange, on arrête les processus de force
+    arret.set()
+    for p in processus:
+        p.join(timeout=periode_echange)
+        if p.is_alive():
+            p.terminate()
+            p.join()
 
-    return resultat_tabou, scores[-1]
+    if meilleure_methode.value == -1:
+        if jour_echec.value != -1: # (relevée comme pour solve_mono : solve_multi relance alors l'équipe)
+            raise ErreurReparation(jour_echec.value)
+        raise Exception(f"\033[1m\033[31m[ERREUR]\033[0m Aucune méthode du portfolio n'a produit de planning pour l'équipe {eq}. Vous pouvez essayer d'augmenter la durée.")
 
-def solve_multi(Ns, Ds, preferences_eqs, reductions_eqs, attributs_eqs, implications_eqs, eqs_to_global, global_to_eqs, planning_initiaux=None, jours_a_modifier=None, jours_fixes=None, skip_optims=None):
+    return np.array(meilleur_planning[:], dtype=int), meilleur_score.value
+
+def _bloquer_autres_equipes(preferences_eqs, eq, resultat_eq, Ds, registre):
+    """
+    Modifie les préférences de toutes les équipes pour empêcher les autres plannings d'employer les mdc de resultat_eq
+    (planning de l'équipe eq) les mêmes jours, ou en violant le jour OFF après une garde.
+    """
+
+    D = Ds[eq]
+    resultat_eq = np.asarray(resultat_eq)
+    gardes_globales = registre.vers_global(eq, resultat_eq[:D])
+    astreintes_globales = registre.vers_global(eq, resultat_eq[D:])
+
+    for eqb in range(registre.E):
+        if eqb == eq: # (ses propres préférences restent intactes : en re-planification, un planning complet peut encore être réoptimisé)
+            continue
+        nb_jours = min(D, Ds[eqb])
+        jours = np.arange(nb_jours)
+        gardes = registre.vers_local(eqb, gardes_globales[:nb_jours])
+        astreintes = registre.vers_local(eqb, astreintes_globales[:nb_jours])
+        preferences = preferences_eqs[eqb]
+
+        g = gardes != -1
+        a = astreintes != -1
+        g_veille = g & (jours >= 1)
+        a_veille = a & (jours >= 1)
+        g_lendemain = g & (jours + 1 < Ds[eqb])
+
+        # on empêche l'assignation d'une garde le jour d'avant une garde ou une astreinte
+        np.minimum.at(preferences, (gardes[g_veille], jours[g_veille] - 1), SEUIL_PREF_NEG_ASTREINTE)
+        np.minimum.at(preferences, (astreintes[a_veille], jours[a_veille] - 1), SEUIL_PREF_NEG_ASTREINTE)
+
+        # on empeche l'assignation le même jour d'une garde ou d'une astreinte, et le lendemain d'une garde
+        # (minimum aussi : une préférence déjà plus négative que NEG_PREF_TEAM n'est pas remontée)
+        np.minimum.at(preferences, (gardes[g], jours[g]), NEG_PREF_TEAM)
+        np.minimum.at(preferences, (gardes[g_lendemain], jours[g_lendemain] + 1), NEG_PREF_TEAM)
+        np.minimum.at(preferences, (astreintes[a], jours[a]), NEG_PREF_TEAM)
+
+        # note : SEUIL_PREF_NEG_ASTREINTE (-5 de base) est le seuil de préférence en dessous duquel on n'affecte pas d'astreinte (strictement)
+        # donc si la préférence est -5, on peut affecter de astreintes, si -6 non.
+        # donc lorsqu'on place à SEUIL_PREF_NEG_ASTREINTE un jour, on empêche l'assignation d'une garde mais pas d'une astreinte
+
+def solve_multi(Ns, Ds, preferences_eqs, reductions_eqs, attributs_eqs, implications_eqs, registre, planning_initiaux=None, jours_a_modifier=None, jours_fixes=None, skip_optims=None, options_portfolio=None, afficher=True, traces=None, reprise=None, fenetre=None, preferences_precedentes=None):
     """
     Optimise plusieurs plannings séquentiellement.
     Optimise d'abord le premier planning, puis modifie les préférences des autres plannings pour empêcher les collisions.
     Modifie ensuite le second, modifie les préférences etc. Cela empêche les collisions.
+
+    registre: RegistreMedecins (cf registre.py), pour passer des indices d'une équipe à ceux d'une autre
+    options_portfolio: si donné (dict, éventuellement vide), chaque planning est optimisé par solve_portfolio
+    avec ces options (duree, periode_echange, cible...) au lieu de solve_mono
+    fenetre: si donné, re-planification incrémentale de chaque planning déjà rempli (cf solve_mono), même avec options_portfolio
+    preferences_precedentes: pour chaque équipe, préférences avec lesquelles son planning initial avait été fait, ou None (cf solve_mono)
+    afficher: affiche ou non les barres de progression
+    traces: pour chaque équipe, fonction appelée à chaque itération de ses recherches (cf traces.py)
+    (seulement avec solve_mono : les méthodes du portfolio tournent dans d'autres processus)
+    reprise: chemin du point de reprise (cf reprise.py). Les équipes déjà optimisées lors d'une exécution interrompue
+    (avec les mêmes données et les mêmes options, quel que soit l'ordre des équipes) ne sont pas réoptimisées.
+
+    Si la réparation d'un planning échoue (ErreurReparation, cf definition.py), seule cette équipe est relancée,
+    avec une nouvelle graine (NB_ESSAIS_EQUIPE essais au total).
     """
 
     E = len(Ns) # nombre d'équipes
 
-    preferences_eqs = copy.deepcopy(preferences_eqs)
+    preferences_eqs = [np.array(preferences) for preferences in preferences_eqs] # copies (on va les modifier)
+
+    # équipes déjà terminées lors d'une exécution précédente (cf reprise.py) : reconnues par la clé de leurs données,
+    # quel que soit leur rang dans cette exécution
+    termines = [] # (clé de l'équipe, planning, score), dans l'ordre d'optimisation
+    eqs_termines = []
+    if reprise is not None:
+        cle = cle_reprise(options_portfolio, fenetre)
+        cles_equipes = [cle_reprise(Ns[eq], Ds[eq], preferences_eqs[eq], reductions_eqs[eq], attributs_eqs[eq], implications_eqs[eq],
+                                    [registre.noms[g] for g in registre.local_vers_global[eq]],
+                                    planning_initiaux[eq] if planning_initiaux else None, jours_a_modifier[eq] if jours_a_modifier else None,
+                                    jours_fixes[eq] if jours_fixes else None, skip_optims[eq] if skip_optims else False,
+                                    preferences_precedentes[eq] if preferences_precedentes else None) for eq in range(E)]
+        for cle_equipe, resultat_eq, score_eq in charger_reprise(reprise, cle):
+            eq = next((eq for eq in range(E) if eq not in eqs_termines and cles_equipes[eq] == cle_equipe), None)
+            if eq is None: # équipe retirée ou modifiée depuis : les suivantes avaient été optimisées après elle, on les refait
+                break
+            eqs_termines.append(eq)
+            termines.append((cle_equipe, resultat_eq, score_eq))
+        if termines and afficher:
+            print(f"\033[1m\033[35m[GARDIEN]\033[0m Reprise de l'exécution interrompue : équipes \033[1m{', '.join(str(eq+1) for eq in sorted(eqs_termines))}\033[0m déjà optimisées")
 
-    resultat_eqs = []
-    scores_eqs = []
+    resultat_eqs = [None] * E
+    scores_eqs = [None] * E
 
     # ici, on ne fait pas encore d'optimisation
     # on boucle sur les équipes, et si jamais certaines ont des plannings déjà pleins (avec skip_optim)
     # on va modifie les préférences des autres équipes pour empêcher les autres plannings d'employer des mdc déjà employés
     for eq in range(E):
-        if not skip_optims[eq]:
+        if not skip_optims or not skip_optims[eq]:
             continue
 
-        resultat_eq = planning_initiaux[eq]
-        
-        # modification des preferences de toutes les autres equipes
-        for eqb in range(E):
-            resultat_eq_global = [eqs_to_global[eq][mdc] for mdc in resultat_eq]
-            resultat_eq_eqb = [global_to_eqs[eqb][mdc] if mdc in global_to_eqs[eqb] else -1 for mdc in resultat_eq_global]
-
-            for jour, (mdc_garde, mdc_astreinte) in enumerate(zip(resultat_eq_eqb[:Ds[eq]], resultat_eq_eqb[Ds[eq]:])):
-                if jour >= Ds[eqb]:
-                    break
-                if mdc_garde != -1:
-                    preferences_eqs[eqb][mdc_garde, jour] = NEG_PREF_TEAM # on empeche l'assignation le même jour d'une garde
-                if mdc_garde != -1 and jour+1 < Ds[eqb]:
-                    preferences_eqs[eqb][mdc_garde, jour+1] = NEG_PREF_TEAM # on empeche l'assignation de lendemain d'une garde
-                if mdc_garde != -1 and jour-1 >= 0:
-                    preferences_eqs[eqb][mdc_garde, jour-1] = min(SEUIL_PREF_NEG_ASTREINTE, preferences_eqs[eqb][mdc_garde, jour-1]) # on empêche l'assignation d'une garde le jour d'avant une garde
-                if mdc_astreinte != -1 and jour-1 >= 0:
-                    preferences_eqs[eqb][mdc_astreinte, jour-1] = min(SEUIL_PREF_NEG_ASTREINTE, preferences_eqs[eqb][mdc_astreinte, jour-1]) # on empêche l'assignation d'une garde le jour d'avant une astreinte
-                if mdc_astreinte != -1:
-                    preferences_eqs[eqb][mdc_astreinte, jour] = NEG_PREF_TEAM # on empche l'assignation le même jour d'une astreinte
-
-                # note : SEUIL_PREF_NEG_ASTREINTE (-5 de base) est le seuil de préférence en dessous duquel on n'affecte pas d'astreinte (strictement)
-                # donc si la préférence est -5, on peut affecter de astreintes, si -6 non.
-                # donc lorsqu'on place à SEUIL_PREF_NEG_ASTREINTE un jour, on empêche l'assignation d'une garde mais pas d'une astreinte
+        _bloquer_autres_equipes(preferences_eqs, eq, planning_initiaux[eq], Ds, registre)
 
     # deuxième boucle : optimisation de chaque planning, séquentiellement
-    for eq in range(E):
-        # résolution planning eq
-        resultat_eq, score_final_eq = solve_mono(Ds[eq], Ns[eq], preferences_eqs[eq], reductions_eqs[eq], attributs_eqs[eq], implications_eqs[eq], eq=eq+1, planning_initial=planning_initiaux[eq] if planning_initiaux else None, jours_gras=jours_a_modifier[eq] if jours_a_modifier else None, jours_soulignes=jours_fixes[eq] if jours_fixes else None, skip_optim=skip_optims[eq] if skip_optims else False)
-        resultat_eqs.append(resultat_eq)
-        scores_eqs.append(score_final_eq)
-
-        # modification des preferences de toutes les autres equipes (cf boucle d'avant, c'est le même code)
-        for eqb in range(E):
-            resultat_eq_global = [eqs_to_global[eq][mdc] if mdc != -1 else -1 for mdc in resultat_eq]
-            resultat_eq_eqb = [global_to_eqs[eqb][mdc] if mdc in global_to_eqs[eqb] else -1 for mdc in resultat_eq_global]
-
-            for jour, (mdc_garde, mdc_astreinte) in enumerate(zip(resultat_eq_eqb[:Ds[eq]], resultat_eq_eqb[Ds[eq]:])):
-                if jour >= Ds[eqb]:
-                    break
-                if mdc_garde != -1:
-                    preferences_eqs[eqb][mdc_garde, jour] = NEG_PREF_TEAM
-                if mdc_garde != -1 and jour+1 < Ds[eqb]:
-                    preferences_eqs[eqb][mdc_garde, jour+1] = NEG_PREF_TEAM
-                if mdc_garde != -1 and jour-1 >= 0:
-                    preferences_eqs[eqb][mdc_garde, jour-1] = min(SEUIL_PREF_NEG_ASTREINTE, preferences_eqs[eqb][mdc_garde, jour-1])
-                if mdc_astreinte != -1 and jour-1 >= 0:
-                    preferences_eqs[eqb][mdc_astreinte, jour-1] = min(SEUIL_PREF_NEG_ASTREINTE, preferences_eqs[eqb][mdc_astreinte, jour-1])
-                if mdc_astreinte != -1:
-                    preferences_eqs[eqb][mdc_astreinte, jour] = NEG_PREF_TEAM
-    
+    # (les équipes terminées lors d'une exécution précédente d'abord, dans leur ordre : les suivantes retrouvent ainsi les mêmes préférences bloquées)
+    ordre = eqs_termines + [eq for eq in range(E) if eq not in eqs_termines]
+    for rang, eq in enumerate(ordre):
+        if rang < len(termines):
+            _, resultat_eq, score_final_eq = termines[rang]
+        else:
+            try:
+                resultat_eq, score_final_eq = _optimiser_equipe(eq, Ns, Ds, preferences_eqs, reductions_eqs, attributs_eqs, implications_eqs, planning_initiaux, jours_a_modifier, jours_fixes, skip_optims, options_portfolio, afficher, traces, fenetre, preferences_precedentes)
+            except ErreurReparation as erreur:
+                erreur.equipes_terminees = ordre[:rang] # (pour le message de gardien.py)
+                raise
+            if reprise is not None:
+                termines.append((cles_equipes[eq], resultat_eq, score_final_eq))
+                enregistrer_reprise(reprise, cle, termines)
+
+        resultat_eqs[eq] = resultat_eq
+        scores_eqs[eq] = score_final_eq
+
+        # modification des preferences de toutes les autres equipes (cf boucle d'avant)
+        _bloquer_autres_equipes(preferences_eqs, eq, resultat_eq, Ds, registre)
+
+    if reprise is not None:
+        supprimer_reprise(reprise) # toutes les équipes sont terminées
+
     return resultat_eqs, scores_eqs
+
+def _optimiser_equipe(eq, Ns, Ds, preferences_eqs, reductions_eqs, attributs_eqs, implications_eqs, planning_initiaux, jours_a_modifier, jours_fixes, skip_optims, options_portfolio, afficher, traces, fenetre=None, preferences_precedentes=None):
+    """
+    Optimisation de l'équipe eq dans solve_multi, relancée avec une nouvelle graine si la réparation échoue.
+    """
+
+    for essai in range(NB_ESSAIS_EQUIPE):
+        try:
+            # résolution planning eq (durée mesurée par équipe si le profilage est actif, cf profilage.py)
+            with profilage.phase(f"equipe {eq+1}"):
+                if options_portfolio is None or fenetre is not None:
+                    return solve_mono(Ds[eq], Ns[eq], preferences_eqs[eq], reductions_eqs[eq], attributs_eqs[eq], implications_eqs[eq], eq=eq+1, planning_initial=planning_initiaux[eq] if planning_initiaux else None, jours_gras=jours_a_modifier[eq] if jours_a_modifier else None, jours_soulignes=jours_fixes[eq] if jours_fixes else None, skip_optim=skip_optims[eq] if skip_optims else False, afficher=afficher, trace=traces[eq] if traces else None, fenetre=fenetre, preferences_precedentes=preferences_precedentes[eq] if preferences_precedentes else None)
+                else:
+                    return solve_portfolio(Ds[eq], Ns[eq], preferences_eqs[eq], reductions_eqs[eq], attributs_eqs[eq], implications_eqs[eq], eq=eq+1, planning_initial=planning_initiaux[eq] if planning_initiaux else None, jours_gras=jours_a_modifier[eq] if jours_a_modifier else None, jours_soulignes=jours_fixes[eq] if jours_fixes else None, skip_optim=skip_optims[eq] if skip_optims else False, afficher=afficher, **options_portfolio)
+        except ErreurReparation as erreur:
+            if essai == NB_ESSAIS_EQUIPE - 1:
+                raise
+            graine = random.randrange(2**32)
+            random.seed(graine)
+            np.random.seed(graine)
+            if afficher:
+                print(f"\033[1m\033[33m[GARDIEN]\033[0m \033[1m\033[34mÉquipe {eq+1}\033[0m : réparation impossible au jour {erreur.jour+1}, nouvel essai ({essai+2}/{NB_ESSAIS_EQUIPE})")
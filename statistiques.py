@@ -0,0 +1,77 @@
+import numpy as np
+
+"""
+Statistiques d'un planning (ou d'un lot de plannings de même taille), calculées en une seule passe NumPy :
+nombre de gardes et d'astreintes par mdc, écart moyen entre les gardes, gardes sur préférences négatives/nulles,
+écart aux nombres cibles (implications).
+
+Utilisé par la feuille "résumé" des fichiers exportés (cf export.py) et par GestionnairePlanning.infos_planning.
+"""
+
+def statistiques_planning(plannings, preferences, implications=None):
+    """
+    plannings: un planning (2D,) ou un lot de plannings (B, 2D) : gardes puis astreintes, indices des mdc (-1 si case vide)
+    preferences: (N, D)
+    implications: nombres cibles {'gardes': (N,), 'astreintes': (N,)} (optionnel)
+
+    Renvoie un dictionnaire de tableaux, de forme (N,) pour un planning ou (B, N) pour un lot :
+    - nb_gardes, nb_astreintes : nombre de gardes/astreintes de chaque mdc
+    - ecart_moyen_gardes : écart moyen (en jours) entre deux gardes successives du mdc (nan si moins de 2 gardes)
+    - gardes_pref_neg, gardes_pref_moins1, gardes_pref_nulle : nombre de gardes sur une préférence < 0, == -1, == 0
+    - nb_vides : nombre de gardes et d'astreintes non attribuées, de forme (2,) ou (B, 2)
+    - ecart_cible_gardes, ecart_cible_astreintes : nombre effectué - nombre ciblé (seulement si implications est donné)
+    Les cases vides (-1) ne sont comptées pour aucun mdc.
+    """
+
+    plannings = np.asarray(plannings)
+    preferences = np.asarray(preferences)
+    seul = plannings.ndim == 1
+    plannings = np.atleast_2d(plannings)
+
+    N, D = preferences.shape
+    B = plannings.shape[0]
+    gardes = plannings[:, :D]
+    astreintes = plannings[:, D:]
+
+    assigne_gardes = gardes != -1
+    assigne_astreintes = astreintes != -1
+
+    # comptages : un seul bincount pour tout le lot (le planning b occupe les indices b*N à (b+1)*N - 1)
+    decalage = (np.arange(B) * N)[:, None]
+
+    def compte(mdc, masque):
+        return np.bincount((mdc + decalage)[masque], minlength=B * N).reshape(B, N)
+
+    nb_gardes = compte(gardes, assigne_gardes)
+    nb_astreintes = compte(astreintes, assigne_astreintes)
+
+    # préférences des mdc de garde (les cases vides sont masquées)
+    prefs_gardes = preferences[np.where(assigne_gardes, gardes, 0), np.arange(D)]
+    gardes_pref_neg = compte(gardes, assigne_gardes & (prefs_gardes < 0))
+    gardes_pref_moins1 = compte(gardes, assigne_gardes & (prefs_gardes == -1))
+    gardes_pref_nulle = compte(gardes, assigne_gardes & (prefs_gardes == 0))
+
+    # écart moyen entre gardes successives = (dernière garde - première garde) / (nombre de gardes - 1)
+    une_hot = gardes[:, :, None] == np.arange(N) # (B, D, N)
+    premiere = np.argmax(une_hot, axis=1)
+    derniere = D - 1 - np.argmax(une_hot[:, ::-1], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ecart_moyen_gardes = np.where(nb_gardes > 1, (derniere - premiere) / (nb_gardes - 1), np.nan)
+
+    stats = {
+        'nb_gardes': nb_gardes,
+        'nb_astreintes': nb_astreintes,
+        'ecart_moyen_gardes': ecart_moyen_gardes,
+        'gardes_pref_neg': gardes_pref_neg,
+        'gardes_pref_moins1': gardes_pref_moins1,
+        'gardes_pref_nulle': gardes_pref_nulle,
+        'nb_vides': np.stack([(~assigne_gardes).sum(axis=1), (~assigne_astreintes).sum(axis=1)], axis=1),
+    }
+
+    if implications is not None:
+        stats['ecart_cible_gardes'] = nb_gardes - np.asarray(implications['gardes'])
+        stats['ecart_cible_astreintes'] = nb_astreintes - np.asarray(implications['astreintes'])
+
+    if seul:
+        stats = {cle: valeur[0] for cle, valeur in stats.items()}
+    return stats
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# les modules de Gardien sont à la racine du dépôt (pas de paquet) : on la rend importable depuis les tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from benchmark import generer_instance
+from formats import ecrire_probleme, charger_probleme, charger_csv, ecrire_csv
+from probleme import ErreurLecture
+
+@pytest.fixture
+def probleme():
+    probleme, = generer_instance(nb_mdc=6, nb_jours=21, densite_attributs=0.4, densite_gras=0.1, densite_soulignes=0.1, graine=2)
+    return probleme
+
+def _memes_problemes(a, b):
+    assert a.mdc == b.mdc
+    assert np.array_equal(a.preferences, b.preferences)
+    assert list(a.planning_initial) == list(b.planning_initial)
+    for type_creneau in ('garde', 'astreinte'):
+        assert sorted(a.jours_gras[type_creneau]) == sorted(b.jours_gras[type_creneau])
+        assert sorted(a.jours_soulignes[type_creneau]) == sorted(b.jours_soulignes[type_creneau])
+    assert a.attributs == b.attributs
+    for cle in ('gardes', 'astreintes'):
+        assert np.allclose(a.implications[cle], b.implications[cle])
+    assert a.skip_optim == b.skip_optim
+
+@pytest.mark.parametrize('extension', ['.csv', '.npz'])
+def test_aller_retour(probleme, tmp_path, extension):
+    chemin = str(tmp_path / f"equipe{extension}")
+    ecrire_probleme(chemin, probleme)
+    _memes_problemes(charger_probleme(chemin), probleme)
+
+@pytest.mark.parametrize('extension', ['.csv', '.npz'])
+def test_aller_retour_avec_planning(probleme, tmp_path, extension):
+    # un planning optimisé remplace le planning initial, et plus rien n'est à modifier
+    chemin = str(tmp_path / f"equipe{extension}")
+    planning = np.arange(2 * probleme.D) % probleme.N
+    ecrire_probleme(chemin, probleme, planning)
+    relu = charger_probleme(chemin)
+    assert list(relu.planning_initial) == planning.tolist()
+    assert relu.jours_gras == {'garde': [], 'astreinte': []}
+
+@pytest.mark.parametrize('table', ['', '.attributs', '.implications'])
+def test_csv_vide(probleme, tmp_path, table):
+    chemin = str(tmp_path / 'equipe.csv')
+    ecrire_csv(chemin, probleme)
+    (tmp_path / f"equipe{table}.csv").write_text('\n\n', encoding='utf-8')
+    with pytest.raises(ErreurLecture):
+        charger_csv(chemin)
+
+def test_csv_attributs_retires(probleme, tmp_path):
+    # une équipe qui n'a plus d'attribut ne doit pas relire l'ancienne table des attributs
+    chemin = str(tmp_path / 'equipe.csv')
+    ecrire_csv(chemin, probleme)
+    assert charger_csv(chemin).attributs
+    probleme.attributs = {}
+    ecrire_csv(chemin, probleme)
+    assert charger_csv(chemin).attributs == {}
@@ -0,0 +1,42 @@
+import pytest
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+from lecture import charger_classeur
+from probleme import ErreurLecture
+
+def _classeur(chemin, lignes):
+    wb = Workbook()
+    ws = wb.active
+    for ligne in lignes:
+        ws.append(ligne)
+    wb.save(chemin)
+    return wb
+
+def test_feuille_vide(tmp_path):
+    chemin = str(tmp_path / 'vide.xlsx')
+    _classeur(chemin, [])
+    with pytest.raises(ErreurLecture):
+        charger_classeur(chemin)
+
+def test_cellules_vides_mises_en_forme_en_fin_de_ligne(tmp_path):
+    chemin = str(tmp_path / 'equipe.xlsx')
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['jour', 'garde', 'astreinte', 'A', 'B'])
+    for jour in range(4):
+        ws.append([jour + 1, 'A', 'B', 1, 1])
+    # jour 2 : astreinte vide en gras, sans préférence après elle (c'est la dernière cellule de la ligne)
+    for colonne in (3, 4, 5):
+        ws.cell(row=3, column=colonne).value = None
+    ws.cell(row=3, column=3).font = Font(bold=True)
+    # cellules vides mises en forme loin à droite et sous le tableau : ni médecin ni jour en plus
+    ws.cell(row=2, column=9).font = Font(bold=True)
+    ws.cell(row=8, column=2).font = Font(underline='single')
+    wb.save(chemin)
+
+    probleme = charger_classeur(chemin)
+    assert probleme.mdc == ['A', 'B']
+    assert probleme.D == 4
+    assert probleme.jours_gras['astreinte'] == [1]
+    assert not probleme.aucune_case_gras
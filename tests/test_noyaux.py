@@ -0,0 +1,42 @@
+import random
+import numpy as np
+import pytest
+
+from benchmark import generer_instance, gestionnaires
+
+"""
+Les noyaux vectorisés sur un lot de plannings (utilisés par le génétique) doivent donner
+exactement les mêmes résultats que les versions planning par planning.
+"""
+
+FAMILLES = [
+    dict(nb_mdc=8, nb_jours=60),
+    dict(nb_mdc=20, nb_jours=120, densite_attributs=0.3),
+    dict(nb_mdc=20, nb_jours=120, densite_gras=0.1, densite_soulignes=0.3),
+]
+
+@pytest.fixture(autouse=True)
+def graines():
+    random.seed(0)
+    np.random.seed(0)
+
+@pytest.mark.parametrize('famille', FAMILLES)
+def test_critere_et_contraintes_lot(famille):
+    gplan, = gestionnaires(generer_instance(graine=2, **famille))
+    population = np.random.randint(0, gplan.N, size=(64, 2 * gplan.D))
+
+    criteres = gplan.calcule_critere_lot(population)
+    assert np.allclose(criteres, [gplan.calcule_critere(planning) for planning in population])
+
+    violations = gplan.detecte_contrainte_lot(population)
+    assert np.array_equal(violations, [gplan.detecte_contrainte(planning) for planning in population])
+
+@pytest.mark.parametrize('famille', FAMILLES)
+def test_reparation_lot(famille):
+    gplan, = gestionnaires(generer_instance(graine=2, **famille))
+    population = np.random.randint(0, gplan.N, size=(64, 2 * gplan.D))
+
+    repares = gplan.forcer_contrainte_lot(population)
+    assert repares.shape == population.shape
+    assert not gplan.detecte_contrainte_lot(repares).any()
+    assert not any(gplan.detecte_contrainte(planning) for planning in repares)
@@ -0,0 +1,86 @@
+import random
+import numpy as np
+import pytest
+
+import solve
+from benchmark import generer_instance
+from definition import GestionnairePlanning
+from registre import RegistreMedecins
+from replanification import replanifier, creneaux_affectes
+
+@pytest.fixture(autouse=True)
+def graines():
+    random.seed(0)
+    np.random.seed(0)
+
+def _gestionnaire(probleme, preferences=None):
+    return GestionnairePlanning(probleme.N, probleme.D, probleme.preferences if preferences is None else preferences, None, probleme.attributs,
+                                probleme.implications, probleme.jours_gras, probleme.jours_soulignes, probleme.planning_initial)
+
+def _preference_baissee(probleme):
+    """
+    Préférences où seul le médecin de la garde d'un jour au milieu du planning passe de +2 à -3 ce jour-là.
+    Renvoie (préférences précédentes, nouvelles préférences, jour).
+    """
+
+    jour = probleme.D // 2
+    mdc = probleme.planning_initial[jour]
+    precedentes = np.array(probleme.preferences, dtype=float)
+    precedentes[mdc, jour] = 2
+    nouvelles = precedentes.copy()
+    nouvelles[mdc, jour] = -3
+    return precedentes, nouvelles, jour
+
+def test_rien_ne_change_hors_fenetre():
+    probleme, = generer_instance(nb_mdc=8, nb_jours=42, densite_gras=0.05, densite_soulignes=0.1, graine=3)
+    planning_initial = np.array(probleme.planning_initial)
+
+    resultat, critere, jours = replanifier(_gestionnaire(probleme), planning_initial, rayon=2)
+
+    dans_fenetre = np.zeros(probleme.D, dtype=bool)
+    dans_fenetre[jours] = True
+    hors_fenetre = np.concatenate((~dans_fenetre, ~dans_fenetre))
+    assert hors_fenetre.any()
+    assert np.array_equal(resultat[hors_fenetre], planning_initial[hors_fenetre])
+    for s, type_creneau in enumerate(['garde', 'astreinte']):
+        assert set(probleme.jours_gras[type_creneau]) <= set(jours)
+        for t in probleme.jours_soulignes[type_creneau]:
+            assert resultat[s * probleme.D + t] == planning_initial[s * probleme.D + t]
+
+def test_preference_baissee_seule():
+    # planning complet, sans case en gras (skip_optim) : seule une préférence a baissé
+    probleme, = generer_instance(nb_mdc=8, nb_jours=28, densite_soulignes=1e-9, graine=4)
+    assert probleme.skip_optim
+    precedentes, nouvelles, jour = _preference_baissee(probleme)
+    planning_initial = np.array(probleme.planning_initial)
+
+    assert creneaux_affectes(_gestionnaire(probleme, nouvelles), planning_initial) == []
+    assert (0, jour) in creneaux_affectes(_gestionnaire(probleme, nouvelles), planning_initial, precedentes)
+
+    arguments = (probleme.D, probleme.N, nouvelles, None, probleme.attributs, probleme.implications)
+    options = dict(planning_initial=probleme.planning_initial, jours_gras=probleme.jours_gras, jours_soulignes=probleme.jours_soulignes, skip_optim=True, afficher=False)
+
+    # sans fenêtre, un planning complet sans case en gras n'est pas réoptimisé
+    resultat, _ = solve.solve_mono(*arguments, **options)
+    assert np.array_equal(resultat, planning_initial)
+
+    # en re-planification, le créneau dont la préférence a baissé est réoptimisé, et rien d'autre ne change loin de lui
+    resultat, _ = solve.solve_mono(*arguments, fenetre=2, preferences_precedentes=precedentes, **options)
+    assert resultat[jour] != planning_initial[jour]
+    loin = np.abs(np.arange(probleme.D) - jour) > 2
+    assert np.array_equal(resultat[:probleme.D][loin], planning_initial[:probleme.D][loin])
+    assert np.array_equal(resultat[probleme.D:][loin], planning_initial[probleme.D:][loin])
+
+def test_preference_baissee_plusieurs_equipes():
+    # même chose avec solve_multi : une équipe complète n'est pas bloquée par son propre planning
+    problemes = generer_instance(nb_mdc=8, nb_jours=28, nb_equipes=2, densite_soulignes=1e-9, graine=4)
+    precedentes, nouvelles, jour = _preference_baissee(problemes[0])
+    registre = RegistreMedecins([p.mdc for p in problemes])
+
+    resultats, _ = solve.solve_multi([p.N for p in problemes], [p.D for p in problemes], [nouvelles, problemes[1].preferences],
+                                     [registre.reductions(eq) for eq in range(2)], [p.attributs for p in problemes], [p.implications for p in problemes], registre,
+                                     [p.planning_initial for p in problemes], [p.jours_gras for p in problemes], [p.jours_soulignes for p in problemes], [p.skip_optim for p in problemes],
+                                     afficher=False, fenetre=2, preferences_precedentes=[precedentes, problemes[1].preferences])
+
+    assert resultats[0][jour] != problemes[0].planning_initial[jour]
+    assert np.array_equal(resultats[1], problemes[1].planning_initial) # (rien n'a changé pour la deuxième équipe)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import solve
+from benchmark import generer_instance
+from registre import RegistreMedecins
+from definition import ErreurReparation
+
+def _arguments(problemes):
+    """
+    Arguments positionnels de solve_multi pour ces équipes (dans cet ordre).
+    """
+
+    registre = RegistreMedecins([p.mdc for p in problemes])
+    return ([p.N for p in problemes], [p.D for p in problemes], [p.preferences for p in problemes],
+            [registre.reductions(eq) for eq in range(len(problemes))], [p.attributs for p in problemes], [p.implications for p in problemes], registre,
+            [p.planning_initial for p in problemes], [p.jours_gras for p in problemes], [p.jours_soulignes for p in problemes], [p.skip_optim for p in problemes])
+
+@pytest.fixture
+def problemes():
+    return generer_instance(nb_mdc=8, nb_jours=14, nb_equipes=3, chevauchement=0.25, graine=5)
+
+def _solveur(appels, echec=None):
+    """
+    Remplace solve_mono : planning déterministe, et ErreurReparation pour l'équipe echec (numéro dans l'ordre de solve_multi).
+    appels: reçoit le numéro de chaque équipe optimisée.
+    """
+
+    def solve_mono(nombre_jours, nombre_mdc, preferences, *args, eq=None, **kwargs):
+        appels.append(eq)
+        if eq == echec:
+            raise ErreurReparation(3)
+        planning = np.arange(2 * nombre_jours) % nombre_mdc
+        return planning, float(np.asarray(preferences).sum())
+
+    return solve_mono
+
+def test_reprise_apres_interruption(problemes, tmp_path, monkeypatch):
+    chemin = str(tmp_path / 'reprise.npz')
+    monkeypatch.setattr(solve, 'NB_ESSAIS_EQUIPE', 1)
+
+    # première exécution : la deuxième équipe échoue, la première est enregistrée
+    appels = []
+    monkeypatch.setattr(solve, 'solve_mono', _solveur(appels, echec=2))
+    with pytest.raises(ErreurReparation) as erreur:
+        solve.solve_multi(*_arguments(problemes), afficher=False, reprise=chemin)
+    assert erreur.value.equipes_terminees == [0]
+    assert appels == [1, 2]
+
+    # deuxième exécution, équipes dans un autre ordre (gardien.py les mélange) : la première équipe n'est pas réoptimisée
+    ordre = [2, 0, 1]
+    appels = []
+    monkeypatch.setattr(solve, 'solve_mono', _solveur(appels))
+    resultats, scores = solve.solve_multi(*_arguments([problemes[k] for k in ordre]), afficher=False, reprise=chemin)
+    assert sorted(appels) == [1, 3] # (numéros d'équipe dans le nouvel ordre : problemes[0] est maintenant l'équipe 2)
+    assert len(resultats) == 3 and None not in scores
+    assert not (tmp_path / 'reprise.npz').exists() # supprimé une fois toutes les équipes terminées
+
+def test_reprise_ignoree_si_options_changent(problemes, tmp_path, monkeypatch):
+    chemin = str(tmp_path / 'reprise.npz')
+    monkeypatch.setattr(solve, 'NB_ESSAIS_EQUIPE', 1)
+
+    monkeypatch.setattr(solve, 'solve_mono', _solveur([], echec=3))
+    with pytest.raises(ErreurReparation):
+        solve.solve_multi(*_arguments(problemes), afficher=False, reprise=chemin)
+
+    appels = []
+    monkeypatch.setattr(solve, 'solve_mono', _solveur(appels))
+    solve.solve_multi(*_arguments(problemes), afficher=False, reprise=chemin, fenetre=2)
+    assert appels == [1, 2, 3]
@@ -0,0 +1,25 @@
+import numpy as np
+
+from statistiques import statistiques_planning
+
+def test_statistiques_lot():
+    rng = np.random.default_rng(0)
+    N, D = 6, 30
+    preferences = rng.integers(-3, 4, (N, D)).astype(float)
+    implications = {'gardes': rng.random(N) * 5, 'astreintes': rng.random(N) * 5}
+    plannings = rng.integers(-1, N, (5, 2 * D))
+
+    lot = statistiques_planning(plannings, preferences, implications)
+    for b, planning in enumerate(plannings):
+        seul = statistiques_planning(planning, preferences, implications)
+        for cle in seul:
+            assert np.allclose(seul[cle], lot[cle][b], equal_nan=True), cle
+
+        gardes = planning[:D]
+        for mdc in range(N):
+            assert seul['nb_gardes'][mdc] == np.sum(gardes == mdc)
+            assert seul['nb_astreintes'][mdc] == np.sum(planning[D:] == mdc)
+            assert seul['gardes_pref_neg'][mdc] == sum(1 for t in range(D) if gardes[t] == mdc and preferences[mdc, t] < 0)
+            jours = np.flatnonzero(gardes == mdc)
+            ecart = np.mean(np.diff(jours)) if len(jours) > 1 else np.nan
+            assert np.isclose(seul['ecart_moyen_gardes'][mdc], ecart, equal_nan=True)
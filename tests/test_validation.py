@@ -0,0 +1,35 @@
+import numpy as np
+
+from registre import RegistreMedecins
+from validation import valider
+
+def test_validation_toutes_equipes():
+    rng = np.random.default_rng(1)
+    noms = list('ABCDEFGHIJ')
+    for _ in range(50):
+        E = int(rng.integers(1, 4))
+        mdc_eqs = [list(rng.choice(noms, int(rng.integers(2, 7)), replace=False)) for _ in range(E)]
+        Ds = [int(rng.integers(3, 12)) for _ in range(E)]
+        registre = RegistreMedecins(mdc_eqs)
+        resultats = [rng.integers(0, len(mdc), 2 * D) for mdc, D in zip(mdc_eqs, Ds)]
+        preferences = [rng.integers(-3, 3, (len(mdc), D)).astype(float) for mdc, D in zip(mdc_eqs, Ds)]
+        attributs = [{'x': list(rng.random(len(mdc)) < 0.5)} for mdc in mdc_eqs]
+
+        validation = valider(resultats, Ds, registre, preferences, attributs)
+
+        # version planning par planning : un médecin pris deux fois le même jour (toutes équipes confondues)
+        occupations = {}
+        for eq, resultat in enumerate(resultats):
+            for s in (0, 1):
+                for t in range(Ds[eq]):
+                    g = registre.ids[mdc_eqs[eq][resultat[s * Ds[eq] + t]]]
+                    occupations[(g, t)] = occupations.get((g, t), 0) + 1
+        collisions = {cle for cle, n in occupations.items() if n > 1}
+        assert collisions == set(map(tuple, validation.collisions_globales().tolist()))
+
+        for eq, resultat in enumerate(resultats):
+            D = Ds[eq]
+            negatives = [t for t in range(D) if preferences[eq][resultat[t], t] < 0]
+            assert negatives == np.flatnonzero(validation.preferences_negatives[eq]).tolist()
+            sans_attribut = {t for t in range(D) if not (attributs[eq]['x'][resultat[t]] or attributs[eq]['x'][resultat[D + t]])}
+            assert sans_attribut == set(np.flatnonzero(validation.jours_attributs(eq)).tolist())
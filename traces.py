@@ -0,0 +1,67 @@
+import os
+import csv
+import time
+from collections import deque
+import numpy as np
+
+"""
+Traces de convergence des méthodes de recherche (ACO, tabou, recuit simulé, génétique).
+
+Chaque méthode accepte un paramètre trace : une fonction appelée à chaque itération avec
+    trace(methode, iteration, score, meilleur_score, taux_acceptation, evaluations)
+-methode: 'aco', 'tabou', 'recuit' ou 'genetique'
+-iteration: numéro de l'itération (génération pour le génétique, cycle de température pour le recuit)
+-score: score courant (meilleure fourmi de l'itération, solution courante, meilleur individu de la génération)
+-meilleur_score: meilleur score trouvé depuis le début de la recherche
+-taux_acceptation: part des candidats de l'itération qui ont été retenus
+    ACO: fourmis meilleures que le meilleur score avant l'itération
+    tabou: voisins évalués non tabous (ou acceptés par le critère d'aspiration)
+    recuit: voisins acceptés pendant le cycle
+    génétique: enfants meilleurs que la médiane de la génération précédente
+-evaluations: nombre d'appels à calcule_critere depuis le début de la recherche
+    (recuit : nombre de voisins tirés, évalués par variation du critère plutôt que par calcule_critere)
+
+La classe Trace ci-dessous est une telle fonction : elle garde les dernières lignes (tampon circulaire)
+en y ajoutant l'instant de l'appel, et les enregistre au format CSV ou NPZ.
+"""
+
+TAILLE_TRACE = 100_000 # nombre maximal de lignes gardées par trace (les plus anciennes sont oubliées)
+
+COLONNES_TRACE = ['temps', 'methode', 'iteration', 'score', 'meilleur_score', 'taux_acceptation', 'evaluations']
+
+class Trace:
+    def __init__(self, taille_max=TAILLE_TRACE):
+        self.lignes = deque(maxlen=taille_max)
+        self.debut = time.perf_counter()
+
+    def __call__(self, methode, iteration, score, meilleur_score, taux_acceptation, evaluations):
+        self.lignes.append((time.perf_counter() - self.debut, methode, int(iteration), float(score), float(meilleur_score), float(taux_acceptation), int(evaluations)))
+
+    def __len__(self):
+        return len(self.lignes)
+
+    def colonnes(self):
+        """
+        La trace sous forme d'un dictionnaire {colonne: tableau numpy} (cf COLONNES_TRACE), temps en secondes depuis la création.
+        """
+
+        types = [float, str, int, float, float, float, int]
+        valeurs = list(zip(*self.lignes)) if self.lignes else [()] * len(COLONNES_TRACE)
+        return {nom: np.array(colonne, dtype=type_) for nom, colonne, type_ in zip(COLONNES_TRACE, valeurs, types)}
+
+    def sauvegarder(self, chemin):
+        """
+        Enregistre la trace au format .npz (une entrée par colonne) ou .csv (une ligne par itération), selon l'extension.
+        """
+
+        extension = os.path.splitext(chemin)[1].lower()
+        if extension == '.npz':
+            np.savez(chemin, **self.colonnes())
+        elif extension == '.csv':
+            with open(chemin, 'w', newline='', encoding='utf-8') as f:
+                ecrivain = csv.writer(f)
+                ecrivain.writerow(COLONNES_TRACE)
+                ecrivain.writerows(self.lignes)
+        else:
+            raise Exception(f"\033[1m\033[31m[ERREUR]\033[0m Format de trace inconnu : \033[1m{extension}\033[0m (attendu : .csv ou .npz)")
+        return chemin
@@ -0,0 +1,104 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, List
+
+"""
+Vérification des plannings optimisés (toutes équipes confondues), en une seule passe vectorisée.
+
+On construit un tableau d'occupation (médecin global x jour) à partir des plannings de toutes les équipes,
+puis on en déduit pour chaque équipe les masques des jours problématiques :
+collisions, jour OFF après une garde non respecté, attributs manquants, gardes sur préférence négative, cases non attribuées.
+Le rapport affiché (check_coherence...) et la coloration des fichiers exportés lisent tous ce même résultat.
+"""
+
+@dataclass
+class Validation:
+    charge: np.ndarray # (G, D max) nombre de gardes + astreintes de chaque médecin chaque jour, toutes équipes confondues
+    gardes: np.ndarray # (G, D max) bool, le médecin est de garde ce jour-là (dans au moins une équipe)
+    collisions: List[np.ndarray] # par équipe, (D,) bool : un médecin de l'équipe est assigné plusieurs fois ce jour-là
+    jours_off: List[np.ndarray] # par équipe, (D,) bool : un médecin de l'équipe travaille le lendemain d'une garde
+    attributs_manquants: List[Dict[str, np.ndarray]] # par équipe, {nom_attribut: (D,) bool} : ni la garde ni l'astreinte n'ont l'attribut
+    preferences_negatives: List[np.ndarray] # par équipe, (D,) bool : garde assignée à un médecin de préférence négative
+    non_assignes: List[np.ndarray] # par équipe, (2, D) bool : garde (ligne 0) ou astreinte (ligne 1) non attribuée
+
+    def jours_attributs(self, eq):
+        """
+        (D,) bool : au moins un attribut manque ce jour-là dans l'équipe eq.
+        """
+
+        D = len(self.collisions[eq])
+        masque = np.zeros(D, dtype=bool)
+        for manquant in self.attributs_manquants[eq].values():
+            masque |= manquant
+        return masque
+
+    def collisions_globales(self):
+        """
+        Couples (médecin global, jour) des médecins assignés plusieurs fois le même jour.
+        """
+
+        return np.argwhere(self.charge >= 2)
+
+    def jours_off_globaux(self):
+        """
+        Couples (médecin global, jour de la garde) des médecins qui travaillent le lendemain d'une garde.
+        """
+
+        return np.argwhere(self.gardes[:, :-1] & (self.charge[:, 1:] > 0))
+
+def valider(resultat_eqs, Ds, registre, preferences_eqs, attributs_eqs):
+    """
+    Vérifie les plannings de toutes les équipes (cf Validation).
+
+    resultat_eqs: pour chaque équipe, le planning (gardes puis astreintes, indices locaux, -1 si case vide)
+    registre: RegistreMedecins (cf registre.py)
+    preferences_eqs: pour chaque équipe, les préférences (N, D)
+    attributs_eqs: pour chaque équipe, {nom_attribut: list[bool]} de taille N (éventuellement vide)
+    """
+
+    G = len(registre)
+    D_max = max(Ds)
+
+    plannings = [np.asarray(resultat_eq, dtype=int).reshape(2, D) for resultat_eq, D in zip(resultat_eqs, Ds)] # (2, D) : gardes, astreintes
+    plannings_globaux = [registre.vers_global(eq, planning) for eq, planning in enumerate(plannings)]
+
+    # tableau d'occupation (médecin global x jour)
+    charge = np.zeros((G, D_max), dtype=int)
+    gardes = np.zeros((G, D_max), dtype=bool)
+    for planning_global, D in zip(plannings_globaux, Ds):
+        jours = np.broadcast_to(np.arange(D), planning_global.shape)
+        assigne = planning_global != -1
+        np.add.at(charge, (planning_global[assigne], jours[assigne]), 1)
+        gardes[planning_global[0][assigne[0]], np.arange(D)[assigne[0]]] = True
+
+    # la veille de chaque jour, le médecin était-il de garde ? (pas de veille pour le premier jour)
+    gardes_veille = np.zeros_like(gardes)
+    gardes_veille[:, 1:] = gardes[:, :-1]
+
+    collisions = []
+    jours_off = []
+    attributs_manquants = []
+    preferences_negatives = []
+    non_assignes = []
+    for eq, (planning, planning_global, D) in enumerate(zip(plannings, plannings_globaux, Ds)):
+        jours = np.broadcast_to(np.arange(D), planning.shape)
+        assigne = planning != -1
+        mdc_global = np.where(assigne, planning_global, 0) # indice quelconque pour les cases vides (masquées ensuite)
+
+        collisions.append(np.any(assigne & (charge[mdc_global, jours] >= 2), axis=0))
+        jours_off.append(np.any(assigne & gardes_veille[mdc_global, jours], axis=0))
+        non_assignes.append(~assigne)
+
+        # garde sur préférence négative
+        preferences = np.asarray(preferences_eqs[eq])
+        mdc_garde = np.where(assigne[0], planning[0], 0)
+        preferences_negatives.append(assigne[0] & (preferences[mdc_garde, np.arange(D)] < 0))
+
+        # attributs : ni la garde ni l'astreinte ne l'ont (une case vide n'a aucun attribut)
+        manquants = {}
+        for nom_attribut, mdc_avec_attribut in (attributs_eqs[eq] or {}).items():
+            avec_attribut = np.append(np.asarray(mdc_avec_attribut, dtype=bool), False) # l'indice -1 tombe sur False
+            manquants[nom_attribut] = ~(avec_attribut[planning[0]] | avec_attribut[planning[1]])
+        attributs_manquants.append(manquants)
+
+    return Validation(charge, gardes, collisions, jours_off, attributs_manquants, preferences_negatives, non_assignes)